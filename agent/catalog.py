@@ -0,0 +1,333 @@
+# FILE: agent/catalog.py
+import os
+import time
+import select
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import psycopg2
+
+from .lexical import LexicalIndex, document_identifiers, document_text, hybrid_matches
+from .core.tracing import set_span_attributes
+from utils.database import get_db_connection
+from utils.embedding_storage import nearest_sql, search_session_sql
+from utils.profiling import profile_stage
+
+# Ricerca ibrida: BM25 su nomi, path e descrizioni fuso con la distanza vettoriale (RRF).
+# CATALOG_CANDIDATES è quanti risultati di ciascuna sorgente entrano nella fusione.
+CATALOG_HYBRID = os.getenv("CATALOG_HYBRID", "1") == "1"
+CATALOG_CANDIDATES = int(os.getenv("CATALOG_CANDIDATES", "20"))
+
+# Namespace ammessi di default per le sessioni (liste separate da virgola)
+AGENT_TENANTS = os.getenv("AGENT_TENANTS", "default")
+AGENT_ENVIRONMENTS = os.getenv("AGENT_ENVIRONMENTS", "default")
+AGENT_API_TYPES = os.getenv("AGENT_API_TYPES", "rest,grpc,graphql")
+# Namespace che POST /sessions può chiedere (default: quelli di default, che la sessione può solo restringere)
+AGENT_ALLOWED_TENANTS = os.getenv("AGENT_ALLOWED_TENANTS", AGENT_TENANTS)
+AGENT_ALLOWED_ENVIRONMENTS = os.getenv("AGENT_ALLOWED_ENVIRONMENTS", AGENT_ENVIRONMENTS)
+AGENT_ALLOWED_API_TYPES = os.getenv("AGENT_ALLOWED_API_TYPES", AGENT_API_TYPES)
+# Indici BM25 tenuti in memoria (uno per scope, i meno usati di recente vengono scartati)
+CATALOG_LEXICAL_CACHE_SIZE = int(os.getenv("CATALOG_LEXICAL_CACHE_SIZE", "16"))
+
+# Con CATALOG_LISTEN=1 la versione arriva via LISTEN/NOTIFY invece che da una query per ogni richiesta
+CATALOG_LISTEN = os.getenv("CATALOG_LISTEN", "1") == "1"
+CATALOG_CHANNEL = "catalog_changed"
+
+# Statement preparati lato server: il piano di esecuzione si calcola una volta per connessione
+_SEARCH_STATEMENT = "catalog_search"
+# Il filtro sui namespace usa l'indice composto (tenant, environment, api_type)
+_SEARCH_SQL = nearest_sql("metadata, source_contract", "$2",
+                          where="tenant = ANY($3) AND environment = ANY($4) AND api_type = ANY($5)")
+# I migliori per distanza più i candidati lessicali, tutti con la loro distanza
+_HYBRID_STATEMENT = "catalog_hybrid_search"
+_HYBRID_SQL = f"""
+    SELECT id, metadata, source_contract, distance, true AS vector_hit
+    FROM ({nearest_sql("id, metadata, source_contract", "$2",
+                       where="tenant = ANY($4) AND environment = ANY($5) AND api_type = ANY($6)")}) AS nearest
+    UNION ALL
+    SELECT id, metadata, source_contract, embedding <=> $1::vector, false
+    FROM api_functions
+    WHERE id = ANY($3)
+"""
+_DOCUMENTS_SQL = """
+    SELECT id, metadata, source_contract FROM api_functions
+    WHERE tenant = ANY(%s) AND environment = ANY(%s) AND api_type = ANY(%s)
+"""
+_METADATA_SQL = """
+    SELECT metadata FROM api_functions
+    WHERE tenant = ANY(%s) AND environment = ANY(%s) AND api_type = ANY(%s)
+"""
+_VERSION_STATEMENT = "catalog_version_get"
+_VERSION_SQL = "SELECT version FROM catalog_version WHERE id = 1"
+
+
+def _split(value):
+    return tuple(sorted({item.strip() for item in value.split(",") if item.strip()}))
+
+
+class CatalogScope:
+    """
+    I namespace del catalogo che una sessione può vedere: tenant, ambienti e tipi di API.
+    La ricerca restituisce solo funzioni che appartengono a tutti e tre.
+    """
+    __slots__ = ("tenants", "environments", "api_types")
+
+    def __init__(self, tenants, environments, api_types):
+        self.tenants = tuple(sorted(set(tenants)))
+        self.environments = tuple(sorted(set(environments)))
+        self.api_types = tuple(sorted(set(api_types)))
+
+    @classmethod
+    def from_env(cls):
+        return cls(_split(AGENT_TENANTS), _split(AGENT_ENVIRONMENTS), _split(AGENT_API_TYPES))
+
+    @classmethod
+    def from_request(cls, tenants=None, environments=None, api_types=None):
+        """
+        Scope di una nuova sessione: i campi non indicati prendono il valore di default.
+        Solleva ValueError se chiede namespace fuori dalle liste AGENT_ALLOWED_*.
+        """
+        default = DEFAULT_SCOPE
+        scope = cls(tenants or default.tenants, environments or default.environments, api_types or default.api_types)
+        for field, requested, allowed in (("tenants", scope.tenants, AGENT_ALLOWED_TENANTS),
+                                          ("environments", scope.environments, AGENT_ALLOWED_ENVIRONMENTS),
+                                          ("api_types", scope.api_types, AGENT_ALLOWED_API_TYPES)):
+            refused = sorted(set(requested) - set(_split(allowed)))
+            if refused:
+                raise ValueError(f"Namespace non consentiti in '{field}': {', '.join(refused)}")
+        return scope
+
+    def key(self):
+        return (self.tenants, self.environments, self.api_types)
+
+    def params(self):
+        return [list(self.tenants), list(self.environments), list(self.api_types)]
+
+    def to_dict(self):
+        return {"tenants": list(self.tenants), "environments": list(self.environments), "api_types": list(self.api_types)}
+
+
+DEFAULT_SCOPE = CatalogScope.from_env()
+
+
+def as_vector(embedding):
+    """
+    Converte un embedding nel formato che l'adattatore pgvector serializza direttamente:
+    float32 compatto invece di str(list) con la repr dei float64 e il cast ::vector lato SQL.
+    """
+    return np.asarray(embedding, dtype=np.float32)
+
+
+class PgCatalog:
+    """
+    Accesso al catalogo delle funzioni API su Postgres.
+
+    Ogni metodo prende una connessione dal pool solo per la durata della query:
+    le sessioni non tengono occupata una connessione mentre aspettano gli LLM.
+    """
+    def __init__(self, db_pool, listen=CATALOG_LISTEN, hybrid=CATALOG_HYBRID):
+        self.db_pool = db_pool
+        self.listen = listen
+        self.hybrid = hybrid
+        self._lexical = OrderedDict()  # scope -> (versione del catalogo, LexicalIndex), in ordine di uso
+        self._lexical_lock = threading.Lock()
+        self._lexical_build_lock = threading.Lock()
+        self._listener = None
+        self._listener_lock = threading.Lock()
+        self._notified_version = None  # None: listener non connesso, si legge dal DB
+
+    def search(self, embedding, top_k, text=None, scope=None):
+        """
+        Le `top_k` funzioni più rilevanti nei namespace di `scope` (default: DEFAULT_SCOPE):
+        lista di (metadata, source_contract, distance).
+        Con `text` (e CATALOG_HYBRID=1) l'ordine è quello della ricerca ibrida.
+        """
+        scope = scope or DEFAULT_SCOPE
+        if text and self.hybrid:
+            matches = self.hybrid_search(embedding, text, top_k, scope)
+            return [(match["metadata"], match["source_contract"], match["distance"]) for match in matches]
+        vector = as_vector(embedding)
+
+        def query(conn):
+            self._prepare_search(conn, _SEARCH_STATEMENT, _SEARCH_SQL)
+            with profile_stage("db.catalog_search"), conn.cursor() as cur:
+                cur.execute(f"EXECUTE {_SEARCH_STATEMENT} (%s, %s, %s, %s, %s)", (vector, top_k, *scope.params()))
+                return cur.fetchall()
+
+        return self.db_pool.run(query)
+
+    def hybrid_search(self, embedding, text, top_k, scope=None):
+        """
+        Fonde la classifica vettoriale, quella BM25 e le funzioni citate per nome o path
+        con la reciprocal rank fusion.
+        Ogni risultato è un dizionario con metadata, source_contract, distance e i punteggi
+        per sorgente in "scores" (rrf, exact_rank, vector_rank, lexical_rank, bm25, distance).
+        """
+        scope = scope or DEFAULT_SCOPE
+        with profile_stage("lexical_search"):
+            index = self._lexical_index(scope)
+            lexical_hits = index.search(text, CATALOG_CANDIDATES)
+            exact_ids = index.exact_matches(text)
+        vector = as_vector(embedding)
+        lexical_ids = list(dict.fromkeys(exact_ids + [doc_id for doc_id, _ in lexical_hits]))
+
+        def query(conn):
+            self._prepare_search(conn, _HYBRID_STATEMENT, _HYBRID_SQL)
+            with profile_stage("db.catalog_search"), conn.cursor() as cur:
+                cur.execute(f"EXECUTE {_HYBRID_STATEMENT} (%s, %s, %s, %s, %s, %s)",
+                            (vector, max(top_k, CATALOG_CANDIDATES), lexical_ids, *scope.params()))
+                return cur.fetchall()
+
+        candidates, vector_ranking = {}, []
+        for row_id, metadata, source_contract, distance, vector_hit in sorted(self.db_pool.run(query), key=lambda row: row[3]):
+            candidates[row_id] = (metadata, source_contract, distance)
+            if vector_hit:
+                vector_ranking.append(row_id)
+        # Una funzione trovata solo dal BM25 potrebbe essere stata cancellata dopo la costruzione dell'indice
+        lexical_hits = [(doc_id, score) for doc_id, score in lexical_hits if doc_id in candidates]
+        exact_ids = [doc_id for doc_id in exact_ids if doc_id in candidates]
+
+        matches = hybrid_matches(candidates, vector_ranking, lexical_hits, exact_ids, top_k)
+        set_span_attributes(retrieval_scores={match["metadata"].get("name"): match["scores"] for match in matches})
+        return matches
+
+    def warm_up(self, scope=None, connections=1):
+        """
+        Prepara il catalogo prima della prima richiesta: apre `connections` connessioni con gli
+        statement di ricerca già preparati e carica in memoria l'indice delle funzioni dello scope.
+        Restituisce i metadata delle funzioni, da cui il runtime ricava gli endpoint da scaldare.
+        """
+        scope = scope or DEFAULT_SCOPE
+
+        def prepare(conn):
+            self._prepare_search(conn, _SEARCH_STATEMENT, _SEARCH_SQL)
+            self._prepare_search(conn, _HYBRID_STATEMENT, _HYBRID_SQL)
+
+        prepared = self.db_pool.prefill(connections, init=prepare)
+        idle = self.db_pool.idle_connections()
+        if idle < prepared:
+            print(f"   ⚠️ Solo {idle} connessioni su {prepared} preparate sono rimaste libere nel pool.")
+        else:
+            print(f"   🔌 {idle} connessioni al database pronte con gli statement di ricerca preparati.")
+        self.version()
+        if self.hybrid:
+            self._lexical_index(scope)
+
+        def query(conn):
+            with conn.cursor() as cur:
+                cur.execute(_METADATA_SQL, scope.params())
+                return [row[0] for row in cur.fetchall()]
+        return self.db_pool.run(query)
+
+    def _prepare_search(self, conn, name, sql):
+        session_sql = search_session_sql()
+        if session_sql:
+            self.db_pool.ensure_session(conn, "search_settings", session_sql, commit=True)
+        self.db_pool.ensure_prepared(conn, name, sql)
+
+    def _lexical_index(self, scope):
+        """
+        Indice BM25 delle funzioni dello scope, ricostruito quando cambia la versione del catalogo.
+        Ne restano in memoria al più CATALOG_LEXICAL_CACHE_SIZE, tutti della versione corrente.
+        """
+        version = self.version()
+        lexical = self._cached_lexical(scope, version)
+        if lexical is None:
+            # Una costruzione alla volta; le ricerche sugli scope già in cache non aspettano
+            with self._lexical_build_lock:
+                lexical = self._cached_lexical(scope, version)
+                if lexical is None:
+                    def query(conn):
+                        with conn.cursor() as cur:
+                            cur.execute(_DOCUMENTS_SQL, scope.params())
+                            return cur.fetchall()
+                    rows = self.db_pool.run(query)
+                    lexical = LexicalIndex(
+                        (row_id, document_text(metadata, contract), document_identifiers(metadata))
+                        for row_id, metadata, contract in rows
+                    )
+                    with self._lexical_lock:
+                        for key in [key for key, (cached_version, _) in self._lexical.items() if cached_version != version]:
+                            del self._lexical[key]
+                        self._lexical[scope.key()] = (version, lexical)
+                        while len(self._lexical) > CATALOG_LEXICAL_CACHE_SIZE:
+                            self._lexical.popitem(last=False)
+                    print(f"🔤 Indice lessicale costruito per {scope.to_dict()}: {len(lexical)} funzioni (v{version}).")
+        return lexical
+
+    def _cached_lexical(self, scope, version):
+        with self._lexical_lock:
+            cached = self._lexical.get(scope.key())
+            if cached is None or cached[0] != version:
+                return None
+            self._lexical.move_to_end(scope.key())
+            return cached[1]
+
+    def version(self):
+        """Versione corrente del catalogo (0 se l'indexer non ha ancora creato la tabella)."""
+        if self.listen and self._listener is None:
+            self._start_listener()
+        if self._notified_version is not None:
+            return self._notified_version
+        return self._query_version()
+
+    def _query_version(self):
+        def query(conn):
+            self.db_pool.ensure_prepared(conn, _VERSION_STATEMENT, _VERSION_SQL)
+            with conn.cursor() as cur:
+                cur.execute(f"EXECUTE {_VERSION_STATEMENT}")
+                row = cur.fetchone()
+            return row[0] if row else 0
+
+        try:
+            return self.db_pool.run(query)
+        except psycopg2.errors.UndefinedTable:
+            return 0
+
+    def _start_listener(self):
+        with self._listener_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen_loop, name="catalog-listener", daemon=True)
+                self._listener.start()
+
+    def _listen_loop(self):
+        """
+        Connessione dedicata in LISTEN sul canale dell'indexer: ogni bump di versione arriva
+        subito a tutte le sessioni. Se la connessione cade si torna a leggere la versione dal DB
+        finché non ci si riconnette.
+        """
+        backoff = 1
+        while True:
+            conn = get_db_connection()
+            if conn is None:
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CATALOG_CHANNEL}")
+                # Letta dopo il LISTEN: un bump avvenuto nel frattempo non va perso
+                self._notified_version = self._query_version()
+                print(f"📣 In ascolto degli aggiornamenti del catalogo (v{self._notified_version}).")
+                backoff = 1
+                while True:
+                    if select.select([conn], [], [], 60) == ([], [], []):
+                        # Nessuna notifica: verifichiamo che la connessione sia ancora viva
+                        with conn.cursor() as cur:
+                            cur.execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._notified_version = int(notify.payload)
+                        print(f"📣 Catalogo aggiornato alla versione {self._notified_version}.")
+            except (psycopg2.Error, OSError, ValueError) as e:
+                print(f"   ♻️ Ascolto del catalogo interrotto ({e}), riprovo.")
+                self._notified_version = None
+                try:
+                    conn.close()
+                except psycopg2.Error:
+                    pass
+                time.sleep(backoff)
@@ -0,0 +1,142 @@
+# FILE: agent/core/circuit_breaker.py
+"""
+Circuit breaker per backend (base_url REST, endpoint GraphQL, target gRPC), condivisi da
+tutte le sessioni del processo.
+
+- chiuso: le chiamate passano; errori del backend (connessione, timeout, 5xx, UNAVAILABLE)
+  e chiamate più lente di BREAKER_SLOW_CALL_SECONDS contano come fallimenti;
+- aperto: superata la soglia di fallimenti nella finestra, le chiamate falliscono subito
+  per BREAKER_OPEN_SECONDS, senza rete, retry né analisi LLM;
+- semiaperto: passato il tempo, una sola chiamata di prova alla volta; se va bene il
+  breaker si richiude, altrimenti si riapre.
+Gli errori del client (4xx, payload non validi) non aprono il breaker: il backend risponde.
+"""
+import os
+import time
+import threading
+from collections import deque
+
+from .tracing import METRICS
+
+BREAKER_ENABLED = os.getenv("BREAKER_ENABLED", "1") == "1"
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "30"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv("BREAKER_SLOW_CALL_SECONDS", "10"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+# Permessi restituiti da allow(): una chiamata normale o la chiamata di prova del semiaperto
+CALL, PROBE = "call", "probe"
+
+
+class CircuitBreaker:
+    """Stato di un singolo backend: esiti recenti (finestra temporale) e fase del breaker."""
+    def __init__(self, key):
+        self.key = key
+        self.state = CLOSED
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.calls = deque()  # (istante, fallita, latenza)
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self.calls and now - self.calls[0][0] > BREAKER_WINDOW_SECONDS:
+            self.calls.popleft()
+
+    def _transition(self, state, now):
+        print(f"   🔌 [BREAKER] {self.key}: {self.state} -> {state}")
+        METRICS.inc("agent_breaker_transitions_total", backend=self.key, state=state)
+        self.state = state
+        self.opened_at = now if state == OPEN else self.opened_at
+        if state == CLOSED:
+            self.calls.clear()
+
+    def retry_in(self, now=None):
+        """Secondi che mancano alla prossima chiamata di prova (0 se non è aperto)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + BREAKER_OPEN_SECONDS - (now or time.monotonic()))
+
+    def allow(self):
+        """
+        Permesso per la chiamata: CALL, PROBE (in semiaperto, una sola prova alla volta) o None
+        se va rifiutata. Il permesso va ripassato a record() insieme all'esito.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if self.state == OPEN and self.retry_in(now) <= 0:
+                self._transition(HALF_OPEN, now)
+            if self.state == CLOSED:
+                return CALL
+            if self.state == HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                return PROBE
+            self.rejected += 1
+            METRICS.inc("agent_breaker_rejected_total", backend=self.key)
+            return None
+
+    def record(self, failed, latency, permit=CALL):
+        now = time.monotonic()
+        failed = failed or latency > BREAKER_SLOW_CALL_SECONDS
+        with self._lock:
+            if permit == PROBE:
+                self.probe_in_flight = False
+                if self.state == HALF_OPEN:
+                    self._transition(OPEN if failed else CLOSED, now)
+                return
+            if self.state == HALF_OPEN:
+                # Chiamata partita prima dell'apertura e finita in ritardo: non decide la prova
+                return
+            self.calls.append((now, failed, latency))
+            self._trim(now)
+            failures = sum(1 for _, call_failed, _ in self.calls if call_failed)
+            if (self.state == CLOSED and len(self.calls) >= BREAKER_MIN_CALLS
+                    and failures / len(self.calls) >= BREAKER_FAILURE_RATE):
+                self._transition(OPEN, now)
+
+    def available(self):
+        """False finché il breaker è aperto: il retrieval mette in fondo gli strumenti del backend."""
+        with self._lock:
+            return self.state != OPEN or self.retry_in() <= 0
+
+    def to_dict(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            latencies = sorted(latency for _, _, latency in self.calls)
+            failures = sum(1 for _, failed, _ in self.calls if failed)
+            return {
+                "state": self.state,
+                "calls": len(self.calls),
+                "failure_rate": failures / len(self.calls) if self.calls else 0.0,
+                "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+                "rejected": self.rejected,
+                "retry_in": round(self.retry_in(), 1),
+            }
+
+
+class BreakerRegistry:
+    """Un breaker per chiave di backend, creato alla prima chiamata."""
+    def __init__(self):
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(key, CircuitBreaker(key))
+        return breaker
+
+    def available(self, key):
+        breaker = self._breakers.get(key)
+        return not BREAKER_ENABLED or breaker is None or breaker.available()
+
+    def snapshot(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.key: breaker.to_dict() for breaker in breakers}
+
+
+BREAKERS = BreakerRegistry()
@@ -0,0 +1,53 @@
+# FILE: agent/core/deadline.py
+import os
+import time
+
+# Budget di una richiesta (secondi, 0 = nessun limite) e quota tenuta da parte per la sintesi:
+# pianificazione, operatore, strumenti e recovery possono usare solo budget - riserva
+AGENT_QUERY_BUDGET = float(os.getenv("AGENT_QUERY_BUDGET", "60"))
+AGENT_SYNTHESIS_RESERVE = float(os.getenv("AGENT_SYNTHESIS_RESERVE", "8"))
+# Timeout massimi per singola chiamata, usati anche quando non c'è una deadline
+LLM_CALL_TIMEOUT = float(os.getenv("LLM_CALL_TIMEOUT", "60"))
+TOOL_CALL_TIMEOUT = float(os.getenv("TOOL_CALL_TIMEOUT", "30"))
+
+# requests e grpc rifiutano timeout nulli: sotto questa soglia la chiamata fallisce subito
+_MIN_TIMEOUT = 0.05
+
+
+class Deadline:
+    """
+    Scadenza di una richiesta, passata a planner, operatore, executor, recovery e sintesi.
+    Ogni chiamata in uscita usa come timeout il budget rimasto (al più il suo massimo);
+    la riserva resta disponibile solo per la sintesi finale.
+    """
+    __slots__ = ("budget", "reserve", "expires_at")
+
+    def __init__(self, budget=AGENT_QUERY_BUDGET, reserve=AGENT_SYNTHESIS_RESERVE):
+        self.budget = budget
+        self.reserve = min(reserve, budget / 2)
+        self.expires_at = time.monotonic() + budget
+
+    @classmethod
+    def for_query(cls):
+        """Deadline di una nuova richiesta, o None se AGENT_QUERY_BUDGET=0."""
+        return cls() if AGENT_QUERY_BUDGET > 0 else None
+
+    def remaining(self, final=False):
+        """Secondi rimasti: per il lavoro ordinario, o per la sintesi se `final`."""
+        left = self.expires_at - time.monotonic()
+        return max(0.0, left if final else left - self.reserve)
+
+    def exhausted(self, final=False):
+        return self.remaining(final) <= 0
+
+    def timeout(self, cap, final=False):
+        return max(min(self.remaining(final), cap), _MIN_TIMEOUT)
+
+
+def call_timeout(deadline, cap, final=False):
+    """Timeout di una chiamata: il budget rimasto se c'è una deadline, altrimenti `cap`."""
+    return cap if deadline is None else deadline.timeout(cap, final)
+
+
+def budget_exhausted(deadline, final=False):
+    return deadline is not None and deadline.exhausted(final)
@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import time
+import threading
+
+from .plan_cache import extract_entity_literals
+
+# Oltre questa distanza il match del retrieval non è abbastanza sicuro per saltare l'LLM
+FAST_BIND_MAX_DISTANCE = float(os.getenv("FAST_BIND_MAX_DISTANCE", "0.35"))
+
+_REFERENCE_RE = re.compile(r"\$\{(step_\d+_result(?:\.[\w.]+)?)\}")
+_STEP_MENTION_RE = re.compile(r"\b[Ss]tep[ _]?\d+\b")
+_GRPC_CONTRACT_RE = re.compile(r"Contratto del messaggio di richiesta \([^)]*\):\s*(\{.*\})", re.DOTALL)
+
+_stats_lock = threading.Lock()
+BINDER_STATS = {
+    "attempts": 0,
+    "hits": 0,
+    "bind_seconds": 0.0,
+    "operator_calls": 0,
+    "operator_seconds": 0.0,
+}
+
+
+def _normalize_name(name):
+    return name.replace("_", "").replace("-", "").lower()
+
+
+def _required_parameters(metadata, source_contract):
+    """
+    Restituisce {nome_parametro: tipo} per i parametri obbligatori del tool,
+    oppure None se il contratto non è abbastanza semplice da legare senza LLM.
+    """
+    api_type = metadata.get("type")
+
+    if api_type == "rest":
+        if metadata.get("method", "GET").upper() not in ("GET", "DELETE"):
+            return None  # I body vanno costruiti dall'LLM
+        params = {name: "string" for name in re.findall(r"\{(\w+)\}", metadata.get("path_template", ""))}
+        try:
+            operations = json.loads(source_contract)
+            details = next(iter(next(iter(operations.values())).values()))
+        except Exception:
+            return params
+        for param in details.get("parameters", []):
+            if param.get("required") or param.get("in") == "path":
+                params[param.get("name")] = param.get("schema", {}).get("type", "string")
+        return params
+
+    if api_type == "grpc":
+        match = _GRPC_CONTRACT_RE.search(source_contract or "")
+        if not match:
+            return None
+        try:
+            contract = json.loads(match.group(1))
+        except json.JSONDecodeError:
+            return None
+        # Messaggi annidati, repeated ed enum li lasciamo all'LLM
+        if not all(isinstance(field_type, str) and not field_type.startswith("enum(") for field_type in contract.values()):
+            return None
+        return contract
+
+    # GraphQL richiede di scrivere la query con la selezione dei campi: serve l'LLM
+    return None
+
+
+def _coerce(value, param_type):
+    if param_type in ("integer", "int32", "int64") and isinstance(value, str) and value.isdigit():
+        return int(value)
+    return value
+
+
+def _candidate_values(task_description):
+    """Riferimenti ${step_N_result.x} e letterali di entità citati nel task."""
+    references = [f"${{{ref}}}" for ref in _REFERENCE_RE.findall(task_description)]
+    plain_text = _STEP_MENTION_RE.sub(" ", _REFERENCE_RE.sub(" ", task_description))
+    return references, extract_entity_literals(plain_text)
+
+
+def _find_in_chain_results(param_name, chain_results):
+    """Cerca un campo con lo stesso nome del parametro nei risultati precedenti (deve essere unico)."""
+    target = _normalize_name(param_name)
+    matches = []
+    for step_key, step_value in chain_results.items():
+        if not step_key.endswith("_result") or not isinstance(step_value, dict):
+            continue
+        for field in step_value:
+            if _normalize_name(field) == target:
+                matches.append(f"${{{step_key}.{field}}}")
+    return matches[0] if len(matches) == 1 else None
+
+
+def try_fast_bind(task_description, chain_results, relevant_functions, distance):
+    """
+    Prova a preparare la tool call senza LLM.
+
+    Funziona solo se il miglior tool ha distanza bassa e ogni parametro obbligatorio
+    si lega in modo univoco a un riferimento, a un letterale del task o a un campo dei
+    risultati precedenti. Restituisce la struttura "call_tool" oppure None.
+    """
+    start = time.perf_counter()
+    tool_call = None
+    try:
+        if relevant_functions and distance <= FAST_BIND_MAX_DISTANCE and not any("user_info" in key for key in chain_results):
+            metadata, source_contract = relevant_functions[0]
+            tool_call = _bind(task_description, chain_results, metadata, source_contract)
+    finally:
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            BINDER_STATS["attempts"] += 1
+            BINDER_STATS["bind_seconds"] += elapsed
+            if tool_call:
+                BINDER_STATS["hits"] += 1
+    return tool_call
+
+
+def _bind(task_description, chain_results, metadata, source_contract):
+    required = _required_parameters(metadata, source_contract)
+    if required is None:
+        return None
+
+    references, literals = _candidate_values(task_description)
+    candidates = references + literals
+    payload = {}
+
+    if not required:
+        # Senza parametri obbligatori, un letterale nel task è probabilmente un filtro opzionale
+        if candidates:
+            return None
+    elif len(required) == 1:
+        (name, param_type), = required.items()
+        if len(candidates) == 1:
+            payload[name] = _coerce(candidates[0], param_type)
+        elif not candidates:
+            reference = _find_in_chain_results(name, chain_results)
+            if reference is None:
+                return None
+            payload[name] = reference
+        else:
+            return None
+    else:
+        # Con più parametri leghiamo solo per nome, e solo se non avanzano candidati
+        if literals:
+            return None
+        for name, param_type in required.items():
+            named = [ref for ref in references if _normalize_name(ref[2:-1].split(".")[-1]) == _normalize_name(name)]
+            if len(named) != 1:
+                return None
+            payload[name] = named[0]
+        if len(payload) != len(references):
+            return None
+
+    return {"action": "call_tool", "tool_metadata": metadata, "payload": payload, "bound_by": "fast_binder"}
+
+
+def record_operator_latency(seconds):
+    """Registra la durata di una chiamata all'LLM operativo (serve a stimare il tempo risparmiato)."""
+    with _stats_lock:
+        BINDER_STATS["operator_calls"] += 1
+        BINDER_STATS["operator_seconds"] += seconds
+
+
+def binder_stats_summary():
+    """Frequenza del bypass e latenza risparmiata stimata rispetto alla media dell'operativo."""
+    with _stats_lock:
+        stats = dict(BINDER_STATS)
+    avg_operator = stats["operator_seconds"] / stats["operator_calls"] if stats["operator_calls"] else 0.0
+    avg_bind = stats["bind_seconds"] / stats["attempts"] if stats["attempts"] else 0.0
+    return {
+        "attempts": stats["attempts"],
+        "hits": stats["hits"],
+        "hit_rate": stats["hits"] / stats["attempts"] if stats["attempts"] else 0.0,
+        "avg_bind_ms": avg_bind * 1000,
+        "avg_operator_ms": avg_operator * 1000,
+        "estimated_saved_seconds": max(avg_operator - avg_bind, 0.0) * stats["hits"],
+    }
@@ -44,19 +44,25 @@ class FieldExtractor:
     @staticmethod
     def _get_nested_value(data: Dict, path: str) -> Any:
         """Naviga nel JSON seguendo il path."""
-        parts = path.replace('[].', '[*].').split('.')
+        # "items[]" in fondo al path (array di scalari) vale come "items[*]": tutta la lista
+        parts = path.replace('[]', '[*]').split('.')
         current = data
         
-        for part in parts:
+        for position, part in enumerate(parts):
             if '[' in part:
                 # Gestione array
                 field_name = part.split('[')[0]
                 if field_name:
-                    current = current.get(field_name, [])
+                    current = current.get(field_name, []) if isinstance(current, dict) else None
                 
                 if '[*]' in part:
+                    if not isinstance(current, list):
+                        return None
+                    # "matrix[][]": gli elementi degli array annidati
+                    for _ in range(part.count('[*]') - 1):
+                        current = [item for sub in current if isinstance(sub, list) for item in sub]
                     # Estrai da tutti gli elementi
-                    remaining_path = '.'.join(parts[parts.index(part)+1:])
+                    remaining_path = '.'.join(parts[position+1:])
                     if remaining_path:
                         return [FieldExtractor._get_nested_value(item, remaining_path) 
                                 for item in current if isinstance(item, dict)]
@@ -64,7 +70,7 @@ class FieldExtractor:
                 elif '[' in part and ']' in part:
                     # Indice specifico
                     idx = int(part.split('[')[1].split(']')[0])
-                    current = current[idx] if idx < len(current) else None
+                    current = current[idx] if isinstance(current, list) and idx < len(current) else None
             else:
                 current = current.get(part) if isinstance(current, dict) else None
                 
@@ -81,23 +87,30 @@ class FieldExtractor:
         result[clean_path] = value
 
     # Aggiungi una versione più smart che usa LLM
-    def smart_extract(data: Union[Dict, List], current_task: str, user_query: str = None, full_plan: list = None, llm_model: str = "gemini-2.5-flash") -> Union[Dict, List]:
+    def smart_extract(data: Union[Dict, List], current_task: str, user_query: str = None, full_plan: list = None, llm_model: str = None) -> Union[Dict, List]:
         """Usa un LLM per decidere quali campi estrarre basandosi sul task."""
         from ..core.llm_api import call_llm
+        from ..core.model_router import MODEL_ROUTER
+        from .tracing import span
+        from utils.profiling import profile_stage
+        llm_model = llm_model or MODEL_ROUTER.choose("smart_extract")
+        from .shape_summarizer import summarize_response_shape, format_shape_summary
         
-        data_sample = json.dumps(data, indent=2)
-        if len(data_sample) > 1500:
-            data_sample = data_sample[:1500] + "\n... (truncated)"
+        # Al posto del JSON troncato passiamo lo schema inferito: la dimensione dipende
+        # dallo schema e non dal payload, e l'LLM vede tutti i campi anche sulle liste lunghe
+        with profile_stage("shape_summary"):
+            data_shape = format_shape_summary(summarize_response_shape(data))
         
         prompt = f"""
         Query originale dell'utente: "{user_query or 'Non disponibile'}"
         Task corrente: "{current_task}"
         Piano completo: {json.dumps(full_plan) if full_plan else 'Non disponibile'}
         
-        Risposta API ricevuta:
-        {data_sample}
+        Struttura della risposta API ricevuta (field path: tipo, presenza, valori distinti, esempi):
+        {data_shape}
         
         Identifica SOLO i campi necessari per questo task specifico nel contesto del piano generale.
+        Usa esattamente i field path elencati sopra.
         Rispondi con un JSON array di field paths.
         
         Esempi:
@@ -108,10 +121,16 @@ class FieldExtractor:
         Sii MINIMALISTA: estrai solo i campi strettamente necessari per questo step.
         """
             
-        paths_str = call_llm(llm_model, prompt, is_json_output=True)
-        try:
-            paths = json.loads(paths_str)
-            return FieldExtractor.extract(data, paths)
-        except:
-            print("   ⚠️ Smart extract fallito, ritorno dati completi")
-            return data
\ No newline at end of file
+        with span("smart_extract", shape_bytes=len(data_shape.encode("utf-8"))) as extraction:
+            paths_str = call_llm(llm_model, prompt, is_json_output=True, call_site="smart_extract")
+            try:
+                paths = json.loads(paths_str)
+                extraction.set(paths=len(paths) if isinstance(paths, list) else 0)
+                with profile_stage("field_extractor.extract"):
+                    extracted = FieldExtractor.extract(data, paths)
+                # Un'estrazione vuota su dati non vuoti significa path sbagliati
+                MODEL_ROUTER.report_downstream("smart_extract", llm_model, bool(extracted) or not data)
+                return extracted
+            except:
+                print("   ⚠️ Smart extract fallito, ritorno dati completi")
+                return data
\ No newline at end of file
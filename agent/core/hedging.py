@@ -0,0 +1,102 @@
+# FILE: agent/core/hedging.py
+"""
+Politiche e statistiche delle richieste LLM "hedged".
+
+Se una chiamata non risponde entro il percentile di latenza del suo punto di chiamata
+(misurato dal router), call_llm lancia una seconda richiesta e usa la prima risposta valida.
+La copia parte subito anche quando la prima richiesta fallisce o restituisce JSON non valido
+prima della soglia. Le statistiche confrontano la coda di latenza delle richieste originali
+con quella vista dal chiamante, per capire se il traffico in più vale il p99 guadagnato.
+"""
+import os
+import threading
+from collections import deque, defaultdict
+
+from .model_router import MODEL_ROUTER, MODEL_COSTS, _percentile
+
+LLM_HEDGING = os.getenv("LLM_HEDGING", "0") == "1"
+# Campioni di latenza necessari prima di fidarsi del percentile, e soglia minima (secondi)
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "64"))
+
+# Punto di chiamata -> (percentile oltre cui parte la copia, modello della copia).
+# "same" ripete lo stesso modello, "cheaper" usa il candidato più economico del router.
+HEDGE_POLICIES = {
+    "planner": (95, "same"),
+    "operator": (95, "same"),
+    "smart_extract": (95, "same"),
+    "recovery": (90, "cheaper"),
+    "synthesis": (95, "cheaper"),
+}
+_enabled_sites = os.getenv("LLM_HEDGE_CALL_SITES")
+if _enabled_sites:
+    HEDGE_POLICIES = {site: policy for site, policy in HEDGE_POLICIES.items()
+                      if site in {s.strip() for s in _enabled_sites.split(",")}}
+
+LATENCY_WINDOW = 500
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {
+    "calls": 0,
+    "hedges": 0,
+    "hedges_after_failure": 0,
+    "hedge_wins": 0,
+    # Latenza delle richieste originali (anche quando hanno perso) e latenza vista dal chiamante
+    "primary_latencies": deque(maxlen=LATENCY_WINDOW),
+    "observed_latencies": deque(maxlen=LATENCY_WINDOW),
+})
+
+
+def _hedge_model(call_site, model_name, choice):
+    if choice == "same":
+        return model_name
+    cheaper = [m for m in MODEL_ROUTER.call_site_models.get(call_site, [])
+               if MODEL_COSTS.get(m, float("inf")) < MODEL_COSTS.get(model_name, float("inf"))]
+    return min(cheaper, key=lambda m: MODEL_COSTS[m]) if cheaper else model_name
+
+
+def hedge_plan(call_site, model_name):
+    """(modello della copia, secondi di attesa prima di lanciarla), o None se non va fatto hedging."""
+    if not LLM_HEDGING or call_site not in HEDGE_POLICIES:
+        return None
+    percentile, choice = HEDGE_POLICIES[call_site]
+    delay = MODEL_ROUTER.latency_percentile(call_site, model_name, percentile, min_samples=LLM_HEDGE_MIN_SAMPLES)
+    if delay is None:
+        return None
+    return _hedge_model(call_site, model_name, choice), max(delay, LLM_HEDGE_MIN_DELAY)
+
+
+def record_primary(call_site, latency):
+    with _stats_lock:
+        _stats[call_site]["primary_latencies"].append(latency)
+
+
+def record_call(call_site, latency, hedged=False, after_failure=False, hedge_won=False):
+    with _stats_lock:
+        stats = _stats[call_site]
+        stats["calls"] += 1
+        stats["hedges"] += hedged
+        stats["hedges_after_failure"] += after_failure
+        stats["hedge_wins"] += hedge_won
+        stats["observed_latencies"].append(latency)
+
+
+def hedging_summary():
+    """Per punto di chiamata: tasso di hedging, vittorie della copia e p99 con e senza hedging."""
+    summary = {}
+    with _stats_lock:
+        for call_site, stats in _stats.items():
+            primary = sorted(stats["primary_latencies"])
+            observed = sorted(stats["observed_latencies"])
+            p99_primary, p99_observed = _percentile(primary, 99), _percentile(observed, 99)
+            summary[call_site] = {
+                "calls": stats["calls"],
+                "hedge_rate": stats["hedges"] / stats["calls"] if stats["calls"] else 0.0,
+                "hedges_after_failure": stats["hedges_after_failure"],
+                "hedge_wins": stats["hedge_wins"],
+                "p99_primary": p99_primary,
+                "p99_observed": p99_observed,
+                "p99_saved": p99_primary - p99_observed if primary and observed else None,
+            }
+    return summary
@@ -1,35 +1,184 @@
 # FILE: agent/core/llm_api.py
-import openai
-import requests # Aggiungi questo import
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 
+from .deadline import LLM_CALL_TIMEOUT, budget_exhausted, call_timeout
+from .hedging import LLM_HEDGE_WORKERS, hedge_plan, record_call, record_primary
+from .model_router import MODEL_ROUTER
+from .tracing import METRICS, set_span_attributes
+from utils.http import get_http_session
+from utils.profiling import profile_stage
 
-def call_llm(model_name: str, prompt: str, is_json_output: bool = False):
+LLM_GATEWAY_URL = os.getenv("LLM_GATEWAY_URL", "http://llm_gateway:3001/generate")
+
+
+def call_llm(model_name: str, prompt: str, is_json_output: bool = False, call_site: str = None,
+             deadline=None, final: bool = False):
     """
     Funzione unificata per chiamare sia i modelli OpenAI che Gemini.
+    Se viene indicato il `call_site`, latenza ed esito finiscono nelle statistiche del router.
+    Con una `deadline` il timeout è il budget rimasto (anche la riserva della sintesi se `final`);
+    a budget esaurito il modello non viene chiamato.
+    Con LLM_HEDGING=1 una chiamata più lenta del percentile del suo punto di chiamata viene
+    duplicata (vedi core/hedging.py) e vince la prima risposta valida.
+    """
+    if budget_exhausted(deadline, final):
+        print(f"   ⏱️ Budget della richiesta esaurito: salto la chiamata a {model_name} ({call_site or 'altro'}).")
+        METRICS.inc("agent_deadline_skips_total", call_site=call_site or "altro")
+        return '{"error": "Tempo a disposizione esaurito"}'
+    timeout = call_timeout(deadline, LLM_CALL_TIMEOUT, final)
+    hedge = hedge_plan(call_site, model_name)
+    start = time.perf_counter()
+    with profile_stage("llm.attesa_rete"):
+        if hedge is None:
+            attempt = _attempt(model_name, prompt, is_json_output, call_site, timeout)
+        else:
+            attempt = _hedged_attempt(model_name, prompt, is_json_output, call_site, timeout, *hedge)
+    response_text = attempt["text"]
+    set_span_attributes(model=attempt["model"], prompt_bytes=len(prompt.encode("utf-8")),
+                        response_bytes=len(response_text.encode("utf-8")) if response_text is not None else 0,
+                        llm_seconds=time.perf_counter() - start, llm_ok=response_text is not None,
+                        llm_hedged=attempt.get("hedged", False))
+    return response_text if response_text is not None else '{"error": "Chiamata al modello fallita"}'
+
+
+def _attempt(model_name, prompt, is_json_output, call_site, timeout):
+    """Una singola richiesta al modello, registrata in metriche e router: {"text", "model", "valid"}."""
+    start = time.perf_counter()
+    response_text = _transport(model_name, prompt, is_json_output, call_site, timeout)
+    latency = time.perf_counter() - start
+
+    site = call_site or "altro"
+    response_bytes = len(response_text.encode("utf-8")) if response_text is not None else 0
+    METRICS.observe("agent_llm_seconds", latency, call_site=site, model=model_name)
+    METRICS.inc("agent_llm_prompt_bytes_total", len(prompt.encode("utf-8")), call_site=site, model=model_name)
+    METRICS.inc("agent_llm_response_bytes_total", response_bytes, call_site=site, model=model_name)
+
+    call_ok = response_text is not None
+    parse_ok = True
+    if call_ok and is_json_output:
+        try:
+            with profile_stage("llm.json_parse"):
+                json.loads(response_text)
+        except json.JSONDecodeError:
+            parse_ok = False
+    if call_site:
+        MODEL_ROUTER.record_call(call_site, model_name, latency, call_ok, parse_ok)
+    return {"text": response_text, "model": model_name, "valid": call_ok and parse_ok, "seconds": latency}
+
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _get_hedge_pool():
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+        return _hedge_pool
+
+
+def _record_primary(call_site, future):
+    if not future.cancelled() and future.exception() is None:
+        record_primary(call_site, future.result()["seconds"])
+
+
+def _hedged_attempt(model_name, prompt, is_json_output, call_site, timeout, hedge_model, delay):
     """
+    Lancia la richiesta originale e, se non ha una risposta valida entro `delay` secondi
+    (o fallisce prima), una copia su `hedge_model`. Restituisce la prima risposta valida;
+    l'altra viene annullata se non è ancora partita, altrimenti il suo risultato è scartato
+    (una richiesta HTTP bloccante non si può interrompere) ma la sua latenza resta nel router.
+    """
+    pool = _get_hedge_pool()
+    start = time.perf_counter()
+    primary = pool.submit(_attempt, model_name, prompt, is_json_output, call_site, timeout)
+    primary.add_done_callback(lambda future: _record_primary(call_site, future))
+
+    done, _ = wait([primary], timeout=min(delay, timeout))
+    if done and primary.result()["valid"]:
+        result = primary.result()
+        record_call(call_site, time.perf_counter() - start)
+        return result
+
+    remaining = timeout - (time.perf_counter() - start)
+    after_failure = bool(done)
+    if remaining <= delay / 10:
+        # Non c'è tempo per una copia utile: aspettiamo l'originale
+        result = primary.result()
+        record_call(call_site, time.perf_counter() - start)
+        return result
+
+    reason = "fallimento" if after_failure else "lentezza"
+    print(f"   🪁 [HEDGE] {call_site}: {model_name} {'ha fallito' if after_failure else f'oltre {delay:.2f}s'}, "
+          f"lancio una copia su {hedge_model}.")
+    METRICS.inc("agent_llm_hedges_total", call_site=call_site, reason=reason)
+    hedge = pool.submit(_attempt, hedge_model, prompt, is_json_output, call_site, remaining)
+
+    pending = {hedge} if after_failure else {primary, hedge}
+    result = primary.result() if after_failure else None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            attempt = future.result()
+            if attempt["valid"]:
+                for loser in pending:
+                    loser.cancel()
+                hedge_won = future is hedge
+                METRICS.inc("agent_llm_hedge_wins_total", call_site=call_site, winner="copia" if hedge_won else "originale")
+                record_call(call_site, time.perf_counter() - start, hedged=True, after_failure=after_failure,
+                            hedge_won=hedge_won)
+                return {**attempt, "hedged": True}
+            result = result or attempt
+    record_call(call_site, time.perf_counter() - start, hedged=True, after_failure=after_failure)
+    return {**result, "hedged": True}
+
+
+def _call_llm(model_name: str, prompt: str, is_json_output: bool, call_site: str = None, timeout: float = LLM_CALL_TIMEOUT):
+    """Esegue la chiamata vera e propria; restituisce None in caso di errore."""
     try:
         # Se è un modello Gemini, chiama il nostro microservizio
         if model_name.startswith("gemini"):
-            gateway_url = "http://llm_gateway:3001/generate"
+            gateway_url = LLM_GATEWAY_URL
             payload = {
                 "model_name": model_name,
                 "prompt": prompt,
                 "is_json_output": is_json_output
             }
-            response = requests.post(gateway_url, json=payload)
+            response = get_http_session().post(gateway_url, json=payload, timeout=timeout)
             response.raise_for_status() # Lancia un errore per status 4xx/5xx
             return response.text # Il gateway restituisce testo puro
 
         # Altrimenti, usa OpenAI come prima
         else:
+            import openai  # caricato alla prima chiamata OpenAI, non all'avvio
             messages = [{"role": "user", "content": prompt}]
             response = openai.chat.completions.create(
                 model=model_name,
                 messages=messages,
-                response_format={"type": "json_object"} if is_json_output else None
+                response_format={"type": "json_object"} if is_json_output else None,
+                timeout=timeout,
             )
             return response.choices[0].message.content
 
     except Exception as e:
         print(f"❌ Errore durante la chiamata al modello {model_name}: {e}")
-        return '{"error": "Chiamata al modello fallita"}'
\ No newline at end of file
+        return None
+
+
+_transport = _call_llm
+
+def set_llm_transport(transport):
+    """
+    Sostituisce il trasporto usato da call_llm (es. le cassette record/replay dei benchmark).
+    `transport(model_name, prompt, is_json_output, call_site, timeout)` restituisce il testo o None.
+    Restituisce il trasporto precedente; con None ripristina quello reale.
+    """
+    global _transport
+    previous = _transport
+    _transport = transport or _call_llm
+    return previous
@@ -0,0 +1,171 @@
+import os
+import json
+import random
+import threading
+from collections import deque, defaultdict
+
+# Costo indicativo per milione di token di input: serve solo a ordinare i candidati
+MODEL_COSTS = {
+    "gemini-2.5-flash-lite": 0.10,
+    "gemini-2.5-flash": 0.30,
+    "gemini-2.5-pro": 1.25,
+}
+
+# Modelli candidati per ogni punto di chiamata. L'ultimo è quello "sicuro",
+# usato finché non ci sono abbastanza dati per fidarsi dei più economici.
+CALL_SITE_MODELS = {
+    "planner": ["gemini-2.5-flash", "gemini-2.5-pro"],
+    "operator": ["gemini-2.5-flash", "gemini-2.5-pro"],
+    "smart_extract": ["gemini-2.5-flash-lite", "gemini-2.5-flash"],
+    "recovery": ["gemini-2.5-flash-lite", "gemini-2.5-flash"],
+    "synthesis": ["gemini-2.5-flash", "gemini-2.5-pro"],
+}
+
+MODEL_ROUTER_SUCCESS_TARGET = float(os.getenv("MODEL_ROUTER_SUCCESS_TARGET", "0.95"))
+MODEL_ROUTER_MIN_SAMPLES = int(os.getenv("MODEL_ROUTER_MIN_SAMPLES", "20"))
+MODEL_ROUTER_EXPLORATION = float(os.getenv("MODEL_ROUTER_EXPLORATION", "0.05"))
+MODEL_ROUTER_STATS_PATH = os.getenv("MODEL_ROUTER_STATS_PATH")
+LATENCY_WINDOW = 500
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    idx = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+class ModelStats:
+    """Latenze (finestra scorrevole) ed esiti di un modello su un punto di chiamata."""
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.call_errors = 0
+        self.parse_failures = 0
+        self.downstream_failures = 0
+
+    @property
+    def failures(self):
+        return self.call_errors + self.parse_failures + self.downstream_failures
+
+    @property
+    def success_rate(self):
+        if not self.calls:
+            return None
+        return max(self.calls - self.failures, 0) / self.calls
+
+    def latency_percentile(self, pct):
+        return _percentile(sorted(self.latencies), pct)
+
+    def to_dict(self):
+        ordered = sorted(self.latencies)
+        return {
+            "calls": self.calls,
+            "call_errors": self.call_errors,
+            "parse_failures": self.parse_failures,
+            "downstream_failures": self.downstream_failures,
+            "success_rate": self.success_rate,
+            "latency_p50": _percentile(ordered, 50),
+            "latency_p95": _percentile(ordered, 95),
+            "latency_p99": _percentile(ordered, 99),
+        }
+
+
+class ModelRouter:
+    """
+    Sceglie, per ogni punto di chiamata (planner, operator, smart_extract, recovery, synthesis),
+    il modello più economico che raggiunge il tasso di successo richiesto sulle chiamate reali.
+    Con probabilità `exploration` prova un altro candidato per continuare a raccogliere dati.
+    """
+    def __init__(self, call_site_models=None, success_target=MODEL_ROUTER_SUCCESS_TARGET,
+                 min_samples=MODEL_ROUTER_MIN_SAMPLES, exploration=MODEL_ROUTER_EXPLORATION):
+        self.call_site_models = call_site_models or CALL_SITE_MODELS
+        self.success_target = success_target
+        self.min_samples = min_samples
+        self.exploration = exploration
+        self._stats = defaultdict(ModelStats)
+        self._decisions = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _candidates(self, call_site):
+        models = self.call_site_models.get(call_site, [])
+        return sorted(models, key=lambda m: MODEL_COSTS.get(m, float("inf")))
+
+    def default_model(self, call_site):
+        models = self.call_site_models.get(call_site)
+        return models[-1] if models else "gemini-2.5-pro"
+
+    def choose(self, call_site):
+        """Restituisce il modello da usare per questo punto di chiamata."""
+        candidates = self._candidates(call_site)
+        if not candidates:
+            return self.default_model(call_site)
+
+        with self._lock:
+            chosen, reason = self.default_model(call_site), "default"
+            for model in candidates:
+                stats = self._stats[(call_site, model)]
+                if stats.calls >= self.min_samples and stats.success_rate >= self.success_target:
+                    chosen, reason = model, "target_raggiunto"
+                    break
+
+            others = [m for m in candidates if m != chosen]
+            if others and random.random() < self.exploration:
+                # Esploriamo il candidato con meno campioni
+                chosen = min(others, key=lambda m: self._stats[(call_site, m)].calls)
+                reason = "esplorazione"
+
+            self._decisions[(call_site, chosen, reason)] += 1
+        return chosen
+
+    def record_call(self, call_site, model, latency, call_ok=True, parse_ok=True):
+        """Registra una chiamata LLM reale (latenza, errori di rete/gateway, JSON non valido)."""
+        with self._lock:
+            stats = self._stats[(call_site, model)]
+            stats.calls += 1
+            stats.latencies.append(latency)
+            if not call_ok:
+                stats.call_errors += 1
+            elif not parse_ok:
+                stats.parse_failures += 1
+
+    def report_downstream(self, call_site, model, success):
+        """Segnala l'esito a valle di una chiamata (es. il tool preparato dall'operativo è fallito)."""
+        if success:
+            return
+        with self._lock:
+            self._stats[(call_site, model)].downstream_failures += 1
+
+    def latency_percentile(self, call_site, model, pct, min_samples=0):
+        """Percentile di latenza, o None se ci sono meno di `min_samples` chiamate registrate."""
+        with self._lock:
+            stats = self._stats[(call_site, model)]
+            if not stats.latencies or len(stats.latencies) < min_samples:
+                return None
+            return stats.latency_percentile(pct)
+
+    def export(self):
+        """Statistiche e decisioni correnti, per l'ispezione."""
+        with self._lock:
+            stats = {f"{site}/{model}": s.to_dict() for (site, model), s in self._stats.items()}
+            decisions = [
+                {"call_site": site, "model": model, "reason": reason, "count": count}
+                for (site, model, reason), count in self._decisions.items()
+            ]
+        return {
+            "success_target": self.success_target,
+            "min_samples": self.min_samples,
+            "exploration": self.exploration,
+            "stats": stats,
+            "decisions": decisions,
+        }
+
+    def export_to_file(self, path=MODEL_ROUTER_STATS_PATH):
+        if not path:
+            return
+        with open(path, "w") as f:
+            json.dump(self.export(), f, indent=2)
+        print(f"📊 Statistiche del router salvate in {path}")
+
+
+MODEL_ROUTER = ModelRouter()
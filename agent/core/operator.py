@@ -1,12 +1,9 @@
 import json
 from .llm_api import call_llm
+from utils.profiling import profile_stage
 
-def execute_task_and_prepare_call(task_description, context_results, relevant_functions, model_to_use):
+def execute_task_and_prepare_call(task_description, context_results, relevant_functions, model_to_use, deadline=None):
     """LLM Operativo: sceglie un tool per un singolo task, usando i risultati precedenti."""
-    
-    tools_prompt_string = "" # ... (codice identico a choose_and_prepare...)
-    for metadata, contract in relevant_functions:
-        tools_prompt_string += f"--- Strumento ---\nMetadati: {json.dumps(metadata)}\nContratto: {contract.strip()}\n-----------------\n"
 
     print(f"   📊 Dati disponibili per questo step: {list(context_results.keys())}")
 
@@ -67,6 +64,11 @@ def execute_task_and_prepare_call(task_description, context_results, relevant_fu
         "extract_fields": ["campo1", "campo2.sottocampo", "array[].campo"]
     }
 
+    Se lo strumento ha "pagination" nei metadati restituisce una lista paginata, letta pagina per pagina.
+    Quando al task servono solo i primi N elementi nell'ordine restituito dall'API (es. "i primi 5 ordini" -> 5,
+    "una recensione qualsiasi del prodotto" -> 1), aggiungi "max_items": N accanto al payload: la lettura si ferma lì.
+    Se invece servono tutti gli elementi (conteggi, medie, "il più recente" senza un parametro di ordinamento), omettilo.
+
     **Per chiamate GraphQL, DEVI usare questo formato specifico:**
     {
         "action": "call_tool",
@@ -78,7 +80,12 @@ def execute_task_and_prepare_call(task_description, context_results, relevant_fu
     }
     """
     
-    human_prompt = f"""
+    with profile_stage("prompt.operator"):
+        tools_prompt_string = "" # ... (codice identico a choose_and_prepare...)
+        for metadata, contract in relevant_functions:
+            tools_prompt_string += f"--- Strumento ---\nMetadati: {json.dumps(metadata)}\nContratto: {contract.strip()}\n-----------------\n"
+
+        human_prompt = f"""
 **Obiettivo da Eseguire:** 
 "{task_description}"
 
@@ -92,7 +99,8 @@ Analizza l'obiettivo, prendi i dati che ti servono e scegli UN solo strumento pe
 """
     print("🤖 Chiedo all'LLM operativo di scegliere lo strumento...")
     try:
-        response_str = call_llm(model_to_use, f"{system_prompt}\n\n---\n\n{human_prompt}", is_json_output=True)
+        response_str = call_llm(model_to_use, f"{system_prompt}\n\n---\n\n{human_prompt}", is_json_output=True, call_site="operator",
+                                deadline=deadline)
         
         print("   -> LLM ha risposto.")
         return json.loads(response_str) # Converti la stringa JSON in un dizionario Python
@@ -0,0 +1,169 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE_ENABLED", "1") == "1"
+PLAN_CACHE_SIMILARITY = float(os.getenv("PLAN_CACHE_SIMILARITY", "0.93"))
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "256"))
+
+# Letterali di entità: stringhe tra virgolette, email e token che contengono cifre (ord-002, 5, prod-123)
+# (gli apostrofi italiani come in "dell'ordine" non aprono una stringa tra apici)
+_LITERAL_RE = re.compile(r"\"([^\"]+)\"|(?<!\w)'([^']+)'(?!\w)|([\w.+-]+@[\w-]+\.[\w.]+)|\b([A-Za-z_-]*\d[\w-]*)\b")
+_SLOT_RE = re.compile(r"\{slot_\d+\}")
+# Riferimenti agli step: contengono cifre ma non sono entità della query
+_STEP_REF_RE = re.compile(r"\$\{[^}]*\}|[Ss]tep[ _]\d+")
+# Nomi propri senza cifre né virgolette ("Piazza Duomo", "Milano"): parola maiuscola non a inizio frase
+_PROPER_NOUN_RE = re.compile(r"(?<=[\s,(])[A-ZÀ-Ý][\w'-]*")
+
+
+def extract_entity_literals(text):
+    """Restituisce i letterali di entità presenti nel testo, nell'ordine in cui compaiono."""
+    literals = []
+    for match in _LITERAL_RE.finditer(text):
+        literal = next(group for group in match.groups() if group)
+        if literal not in literals:
+            literals.append(literal)
+    return literals
+
+
+def history_key(conversation_history, user_query):
+    """
+    Impronta dei turni precedenti alla query corrente (None se è il primo): un piano pensato
+    per un seguito ("e il suo ultimo ordine?") non vale in una conversazione diversa.
+    """
+    previous = list(conversation_history or [])
+    if previous and previous[-1].get("role") == "user" and previous[-1].get("content") == user_query:
+        previous.pop()
+    if not previous:
+        return None
+    return hashlib.sha256(json.dumps(previous, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _literal_pattern(literal):
+    # Non tocchiamo i riferimenti agli step ("step 1", "${step_1_result...}")
+    return re.compile(r"(?<![Ss]tep[ _])(?<![\w-])" + re.escape(literal) + r"(?![\w-])")
+
+
+class PlanCache:
+    """
+    Cache semantica dei piani strategici.
+
+    Una entry è indicizzata dall'embedding della query, dall'insieme degli strumenti
+    recuperati e dalla conversazione precedente; il piano viene salvato con i letterali di entità sostituiti da slot
+    ({slot_0}, {slot_1}, ...) così che una query quasi identica ("dettagli ordine ord-003"
+    invece di "dettagli ordine ord-002") possa riusarlo dopo la sostituzione. I piani in cui
+    resta scritta un'entità della query (letterale non sostituito, nome proprio) non si salvano.
+    """
+    def __init__(self, similarity_threshold=PLAN_CACHE_SIMILARITY, max_entries=PLAN_CACHE_MAX_ENTRIES):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.catalog_version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def ensure_catalog_version(self, catalog_version):
+        """Svuota la cache se il catalogo è cambiato dall'ultima query."""
+        with self._lock:
+            if self.catalog_version != catalog_version:
+                if self._entries:
+                    print(f"   🗑️ [PLAN CACHE] Catalogo cambiato (v{self.catalog_version} → v{catalog_version}), cache invalidata.")
+                self._entries.clear()
+                self.catalog_version = catalog_version
+
+    def lookup(self, user_query, query_embedding, tool_names, history=None):
+        """Cerca un piano riutilizzabile. Restituisce la lista di step già istanziata o None."""
+        literals = extract_entity_literals(user_query)
+        tool_key = frozenset(tool_names)
+        query_vector = self._normalize(query_embedding)
+
+        with self._lock:
+            best_key, best_similarity = None, self.similarity_threshold
+            for key, entry in self._entries.items():
+                if (entry["tool_key"] != tool_key or entry["history"] != history
+                        or entry["slot_count"] != len(literals)):
+                    continue
+                similarity = float(np.dot(entry["embedding"], query_vector))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+
+            if best_key is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            self.hits += 1
+
+        plan = [self._fill_slots(step, literals) for step in entry["plan_template"]]
+        print(f"   ⚡ [PLAN CACHE] Hit (similarità {best_similarity:.3f}) su: \"{entry['query_template']}\"")
+        return plan
+
+    def store(self, user_query, query_embedding, tool_names, plan, history=None):
+        """Salva un piano con i letterali della query parametrizzati."""
+        if not plan or not all(isinstance(step, str) for step in plan):
+            return
+        literals = extract_entity_literals(user_query)
+        query_template = user_query
+        plan_template = list(plan)
+        for idx, literal in enumerate(literals):
+            slot = f"{{slot_{idx}}}"
+            pattern = _literal_pattern(literal)
+            query_template = pattern.sub(slot, query_template)
+            substituted = [pattern.subn(slot, step) for step in plan_template]
+            if not any(count for _, count in substituted):
+                # Il piano riporta l'entità in un'altra forma (es. ORD-002): riusato, la conserverebbe
+                print(f"   ⏭️ [PLAN CACHE] Piano non salvato: '{literal}' non compare nel piano così com'è.")
+                return
+            plan_template = [step for step, _ in substituted]
+        leftovers = self._leftover_entities(query_template, plan_template)
+        if leftovers:
+            print(f"   ⏭️ [PLAN CACHE] Piano non salvato: entità non parametrizzabili {leftovers}.")
+            return
+
+        entry = {
+            "embedding": self._normalize(query_embedding),
+            "tool_key": frozenset(tool_names),
+            "history": history,
+            "slot_count": len(literals),
+            "query_template": query_template,
+            "plan_template": plan_template,
+        }
+        with self._lock:
+            key = (query_template, entry["tool_key"], history)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @staticmethod
+    def _leftover_entities(query_template, plan_template):
+        """Entità rimaste scritte nel piano: letterali fuori dagli slot e nomi propri della query."""
+        leftovers = []
+        for step in plan_template:
+            for literal in extract_entity_literals(_STEP_REF_RE.sub("", _SLOT_RE.sub("", step))):
+                if literal not in leftovers:
+                    leftovers.append(literal)
+        plan_text = " ".join(plan_template)
+        for word in _PROPER_NOUN_RE.findall(_SLOT_RE.sub("", query_template)):
+            if word not in leftovers and re.search(r"(?<!\w)" + re.escape(word) + r"(?!\w)", plan_text):
+                leftovers.append(word)
+        return leftovers
+
+    @staticmethod
+    def _fill_slots(step, literals):
+        for idx, literal in enumerate(literals):
+            step = step.replace(f"{{slot_{idx}}}", literal)
+        return step
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -1,16 +1,40 @@
 import json
 from .llm_api import call_llm
+from .model_router import MODEL_ROUTER
+from .plan_cache import history_key
+from utils.profiling import profile_stage
 
-LLM_STRATEGIST = "gemini-2.5-pro"
+# Aggiunta al prompt solo quando qualche backend ha il circuit breaker aperto
+_UNAVAILABLE_RULE = ('Gli strumenti con "available": false hanno il servizio momentaneamente fuori uso: '
+                     'usali solo se non esiste un\'alternativa tra gli altri strumenti.')
 
 class StrategicPlanner:
-    def create_strategic_plan(self, user_query, available_tools_summary, context):
-        prompt = f"""
+    def __init__(self, plan_cache=None):
+        self.plan_cache = plan_cache
+
+    def create_strategic_plan(self, user_query, available_tools_summary, context, query_embedding=None, deadline=None):
+        tool_names = [tool.get("name") for tool in available_tools_summary]
+        if self.plan_cache is not None and query_embedding is not None:
+            cached_plan = self.plan_cache.lookup(user_query, query_embedding, tool_names,
+                                                 history_key(context, user_query))
+            if cached_plan is not None:
+                return {"plan": cached_plan, "from_cache": True}
+
+        with profile_stage("prompt.planner"):
+            prompt = self._build_prompt(user_query, available_tools_summary)
+        response_str = call_llm(MODEL_ROUTER.choose("planner"), prompt, is_json_output=True, call_site="planner",
+                                deadline=deadline)
+        return json.loads(response_str)
+
+    @staticmethod
+    def _build_prompt(user_query, available_tools_summary):
+        return f"""
         Sei un **Architetto di Soluzioni AI iper-efficiente**. Il tuo unico compito è tradurre una richiesta utente in un piano d'azione JSON **logico, diretto e senza passaggi inutili**.
 
         **Richiesta Utente:** "{user_query}"
         **Strumenti Disponibili (Nome e Descrizione):** 
         {json.dumps(available_tools_summary, indent=2)}
+        {_UNAVAILABLE_RULE if any(tool.get("available") is False for tool in available_tools_summary) else ""}
 
         ---
         **REGOLE DI PENSIERO CRITICO (SEGUILE ALLA LETTERA):**
@@ -38,5 +62,10 @@ class StrategicPlanner:
             ]
         }}
         """
-        response_str = call_llm(LLM_STRATEGIST,prompt,is_json_output=True)
-        return json.loads(response_str)
\ No newline at end of file
+
+    def remember_plan(self, user_query, available_tools_summary, query_embedding, plan, context=None):
+        """Salva in cache un piano eseguito con successo, per le query quasi identiche successive."""
+        if self.plan_cache is None or query_embedding is None:
+            return
+        tool_names = [tool.get("name") for tool in available_tools_summary]
+        self.plan_cache.store(user_query, query_embedding, tool_names, plan, history_key(context, user_query))
\ No newline at end of file
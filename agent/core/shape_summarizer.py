@@ -0,0 +1,147 @@
+from typing import Any, Dict, List, Union
+
+# Limiti che rendono il riassunto proporzionale allo schema e non al payload
+MAX_PATHS = 150
+MAX_EXAMPLES = 2
+MAX_EXAMPLE_LEN = 60
+MAX_DISTINCT_TRACKED = 20
+
+
+def _type_name(value: Any) -> str:
+    if value is None: return "null"
+    if isinstance(value, bool): return "boolean"
+    if isinstance(value, (int, float)): return "number"
+    if isinstance(value, str): return "string"
+    if isinstance(value, list): return "array"
+    if isinstance(value, dict): return "object"
+    return type(value).__name__
+
+
+def _short_example(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > MAX_EXAMPLE_LEN:
+        return value[:MAX_EXAMPLE_LEN] + "…"
+    return value
+
+
+def summarize_response_shape(data: Union[Dict, List, Any]) -> Dict[str, Any]:
+    """
+    Inferisce in un solo passaggio lo schema di una risposta API.
+
+    Per ogni field path (stessa notazione di FieldExtractor, es. "items[].name")
+    raccoglie tipi, presenza rispetto agli oggetti padre, valori distinti,
+    alcuni esempi e, per gli array, la lunghezza minima/massima.
+    Se la radice è una lista, i path sono relativi al singolo elemento,
+    esattamente come si aspetta FieldExtractor.extract.
+    """
+    fields: Dict[str, Dict[str, Any]] = {}
+    root_item_types = set()
+    truncated = False
+
+    root_is_list = isinstance(data, list)
+    # Stack esplicito: (path, valore). Evita la ricorsione sui payload profondi.
+    stack = [("", item) for item in reversed(data)] if root_is_list else [("", data)]
+
+    while stack:
+        path, value = stack.pop()
+        type_name = _type_name(value)
+
+        if not path and root_is_list:
+            root_item_types.add(type_name)
+        if path:
+            entry = fields.get(path)
+            if entry is None:
+                if len(fields) >= MAX_PATHS:
+                    truncated = True
+                    continue
+                entry = fields[path] = {"types": set(), "count": 0, "examples": [], "distinct": set(), "distinct_overflow": False}
+            entry["count"] += 1
+            entry["types"].add(type_name)
+
+        if type_name == "object":
+            prefix = f"{path}." if path else ""
+            for key, child in reversed(value.items()):
+                stack.append((f"{prefix}{key}", child))
+        elif type_name == "array":
+            length = len(value)
+            if path:
+                entry["min_len"] = min(entry.get("min_len", length), length)
+                entry["max_len"] = max(entry.get("max_len", length), length)
+                entry["total_items"] = entry.get("total_items", 0) + length
+            child_path = f"{path}[]"
+            for item in reversed(value):
+                # Gli elementi oggetto espongono direttamente i loro campi come "path[].campo"
+                if isinstance(item, dict):
+                    for key, child in reversed(item.items()):
+                        stack.append((f"{child_path}.{key}", child))
+                else:
+                    stack.append((child_path, item))
+        elif path:
+            if len(entry["examples"]) < MAX_EXAMPLES and value not in entry["examples"]:
+                entry["examples"].append(value)
+            if not entry["distinct_overflow"]:
+                entry["distinct"].add(value)
+                if len(entry["distinct"]) > MAX_DISTINCT_TRACKED:
+                    entry["distinct_overflow"] = True
+                    entry["distinct"] = set()
+
+    # Presenza: quante volte il campo compare rispetto ai contenitori che potrebbero averlo
+    root_items = len(data) if root_is_list else 1
+
+    def container_total(path: str) -> int:
+        if path.endswith("[]"):
+            return fields.get(path[:-2], {}).get("total_items", 0)
+        parent = path.rsplit(".", 1)[0] if "." in path else ""
+        if not parent:
+            return root_items
+        if parent.endswith("[]"):
+            return fields.get(parent[:-2], {}).get("total_items", 0)
+        return fields[parent]["count"] if parent in fields else 0
+
+    summary_fields = []
+    for path, entry in fields.items():
+        field_summary = {
+            "path": path,
+            "types": sorted(entry["types"]),
+            "presence": f"{entry['count']}/{container_total(path)}",
+        }
+        if "max_len" in entry:
+            field_summary["length"] = [entry["min_len"], entry["max_len"]]
+        if entry["examples"]:
+            field_summary["examples"] = [_short_example(v) for v in entry["examples"]]
+            field_summary["distinct"] = f">{MAX_DISTINCT_TRACKED}" if entry["distinct_overflow"] else len(entry["distinct"])
+        summary_fields.append(field_summary)
+
+    summary = {
+        "root": {"type": _type_name(data)},
+        "fields": summary_fields,
+    }
+    if root_is_list:
+        summary["root"]["length"] = len(data)
+        summary["root"]["item_types"] = sorted(root_item_types)
+    if truncated:
+        summary["truncated_paths"] = True
+    return summary
+
+
+def format_shape_summary(summary: Dict[str, Any]) -> str:
+    """Rende il riassunto come testo compatto, una riga per field path."""
+    root = summary["root"]
+    if root["type"] == "array":
+        lines = [f"Radice: lista di {root['length']} elementi di tipo {'|'.join(root['item_types']) or 'n/d'} (i path sono relativi al singolo elemento)"]
+    else:
+        lines = [f"Radice: {root['type']}"]
+
+    for field in summary["fields"]:
+        line = f"- {field['path']}: {'|'.join(field['types'])} (presenza {field['presence']}"
+        if "length" in field:
+            line += f", lunghezza {field['length'][0]}-{field['length'][1]}"
+        if "distinct" in field:
+            line += f", distinti {field['distinct']}"
+        line += ")"
+        if "examples" in field:
+            line += " es. " + ", ".join(repr(v) for v in field["examples"])
+        lines.append(line)
+
+    if summary.get("truncated_paths"):
+        lines.append(f"... (altri campi omessi, mostrati i primi {MAX_PATHS})")
+    return "\n".join(lines)
@@ -0,0 +1,121 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from ..utils import get_nested_value
+
+_REFERENCE_RE = re.compile(r"\$\{(step_\d+_result(?:\.[\w.]+)?)\}")
+# Frasi con cui il planner rimanda ai dati precedenti in linguaggio naturale:
+# in quel caso l'operativo deve vedere il risultato vero, non possiamo anticiparlo
+_NATURAL_BACKREFERENCE_RE = re.compile(
+    r"\bstep\b|precedent|ottenut|dai dati|dal risultato|dall'|dallo stesso|stess[oaie]\b|quell[oaie]\b|su[oaie]\b|suoi\b",
+    re.IGNORECASE,
+)
+
+
+def is_speculatable(task_description):
+    """
+    Uno step si può preparare in anticipo se dipende dai risultati precedenti solo tramite
+    riferimenti espliciti ${step_N_result.campo}, oppure se non ne dipende affatto.
+    """
+    if not isinstance(task_description, str):
+        return False
+    without_references = _REFERENCE_RE.sub(" ", task_description)
+    return not _NATURAL_BACKREFERENCE_RE.search(without_references)
+
+
+def speculative_context(chain_results, running_step_number):
+    """Copia dei risultati con un segnaposto per lo step ancora in esecuzione."""
+    context = dict(chain_results)
+    key = f"step_{running_step_number}_result"
+    context[key] = f"(in esecuzione: non ancora disponibile, riferisciti ai suoi campi con ${{{key}.<campo>}})"
+    return context
+
+
+def _payload_references(payload):
+    if isinstance(payload, dict):
+        for value in payload.values():
+            yield from _payload_references(value)
+    elif isinstance(payload, list):
+        for value in payload:
+            yield from _payload_references(value)
+    elif isinstance(payload, str) and payload.startswith("${") and payload.endswith("}"):
+        yield payload[2:-1]
+
+
+def is_speculation_usable(prepared_tool_call, chain_results):
+    """Accetta la preparazione speculativa solo se è una call_tool con riferimenti tutti risolvibili."""
+    if not isinstance(prepared_tool_call, dict) or prepared_tool_call.get("action") != "call_tool":
+        return False
+    payload = prepared_tool_call.get("payload", {})
+    if "(in esecuzione:" in str(payload):
+        return False
+    return all(get_nested_value(path, chain_results) is not None for path in _payload_references(payload))
+
+
+class SpeculativePreparer:
+    """
+    Prepara la tool call dello step successivo mentre lo strumento corrente è in esecuzione.
+
+    Ogni speculazione è legata a (indice dello step, testo del task, versione del piano):
+    se il piano viene modificato (suggest_additional_step, ask_user) la speculazione non
+    corrisponde più e viene scartata.
+    """
+    def __init__(self, executor=None, max_workers=2):
+        # Con un executor condiviso (modalità server) non siamo noi a doverlo chiudere
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculation")
+        self._lock = threading.Lock()
+        self._pending = None
+        self.stats = {"launched": 0, "used": 0, "discarded": 0}
+
+    def launch(self, step_index, task_description, plan_version, prepare_fn, *args):
+        self.discard()
+        future = self._executor.submit(prepare_fn, *args)
+        with self._lock:
+            self._pending = (step_index, task_description, plan_version, future)
+            self.stats["launched"] += 1
+        print(f"   🔮 [SPECULAZIONE] Preparo in anticipo lo step {step_index + 1}: {task_description}")
+
+    def take(self, step_index, task_description, plan_version, chain_results):
+        """Restituisce la tool call speculativa se è ancora valida, altrimenti None."""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return None
+
+        pending_index, pending_task, pending_version, future = pending
+        if (pending_index, pending_task, pending_version) != (step_index, task_description, plan_version):
+            self._drop(future, "il piano è cambiato")
+            return None
+
+        try:
+            prepared_tool_call = future.result()
+        except Exception as e:
+            self._drop(future, f"errore durante la preparazione: {e}")
+            return None
+
+        if not is_speculation_usable(prepared_tool_call, chain_results):
+            self._drop(future, "la tool call non è legabile ai risultati reali")
+            return None
+
+        with self._lock:
+            self.stats["used"] += 1
+        return prepared_tool_call
+
+    def discard(self, reason="piano modificato"):
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is not None:
+            self._drop(pending[3], reason)
+
+    def _drop(self, future, reason):
+        future.cancel()
+        with self._lock:
+            self.stats["discarded"] += 1
+        print(f"   🗑️ [SPECULAZIONE] Scartata: {reason}")
+
+    def shutdown(self):
+        self.discard("chiusura")
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
@@ -0,0 +1,209 @@
+# FILE: agent/core/tracing.py
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from collections import defaultdict
+
+from utils.profiling import profile_stage
+
+# Dump verbosi (chain_results, tool call, risultati): disattivati non costano nulla
+AGENT_TRACE_VERBOSE = os.getenv("AGENT_TRACE_VERBOSE", "0") == "1"
+# Se impostato, ogni span concluso viene aggiunto a questo file in formato JSONL
+AGENT_TRACE_FILE = os.getenv("AGENT_TRACE_FILE")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+# --- Log pigri ---
+
+class LazyJson:
+    """Serializza l'oggetto solo quando viene effettivamente stampato."""
+    __slots__ = ("obj",)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return json.dumps(self.obj, indent=2, ensure_ascii=False, default=str)
+
+
+def log_verbose(message, *args):
+    """
+    Stampa solo con AGENT_TRACE_VERBOSE=1. Gli argomenti vengono formattati con
+    str.format solo in quel caso: passare LazyJson(obj) invece di json.dumps(obj).
+    """
+    if AGENT_TRACE_VERBOSE:
+        print(message.format(*args) if args else message)
+
+
+# --- Metriche ---
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in items) + "}"
+
+
+class MetricsRegistry:
+    """Istogrammi e contatori in memoria, esportabili nel formato testuale di Prometheus."""
+    def __init__(self):
+        self._histograms = defaultdict(dict)
+        self._counters = defaultdict(lambda: defaultdict(float))
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self._histograms[name].get(key)
+            if histogram is None:
+                histogram = self._histograms[name][key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._counters[name][key] += value
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def export_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(h.buckets, h.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels_text(labels, ('le', bound))} {cumulative}")
+                    lines.append(f"{name}_bucket{_labels_text(labels, ('le', '+Inf'))} {h.total}")
+                    lines.append(f"{name}_sum{_labels_text(labels)} {h.sum}")
+                    lines.append(f"{name}_count{_labels_text(labels)} {h.total}")
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels_text(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+METRICS.describe("agent_stage_seconds", "Durata degli span dell'agente per fase.")
+METRICS.describe("agent_llm_seconds", "Latenza delle chiamate LLM per punto di chiamata e modello.")
+METRICS.describe("agent_llm_prompt_bytes_total", "Byte di prompt inviati agli LLM.")
+METRICS.describe("agent_llm_response_bytes_total", "Byte di risposta ricevuti dagli LLM.")
+
+
+# --- Span ---
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "attributes", "start", "end", "_t0")
+
+    def __init__(self, name, trace_id, parent_id, attributes):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.end = None
+        self._t0 = time.perf_counter()
+
+    @property
+    def duration(self):
+        return (self.end or time.perf_counter()) - self._t0
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+        }
+
+
+_local = threading.local()
+_export_lock = threading.Lock()
+
+
+def current_span():
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else None
+
+
+def set_span_attributes(**attributes):
+    """Aggiunge attributi allo span attivo nel thread corrente, se c'è."""
+    active = current_span()
+    if active is not None:
+        active.set(**attributes)
+
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Misura un blocco come span figlio di quello attivo nel thread corrente.
+    La durata finisce nell'istogramma agent_stage_seconds{stage=name}.
+    """
+    parent = current_span()
+    trace_id = parent.trace_id if parent else uuid.uuid4().hex
+    active = Span(name, trace_id, parent.span_id if parent else None, attributes)
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(active)
+    stage = profile_stage(name)
+    stage.__enter__()
+    try:
+        yield active
+    except Exception as e:
+        active.set(error=type(e).__name__)
+        raise
+    finally:
+        stage.__exit__(None, None, None)
+        active.end = time.perf_counter()
+        stack.pop()
+        METRICS.observe("agent_stage_seconds", active.duration, stage=name)
+        if AGENT_TRACE_FILE:
+            _export(active)
+
+
+def _export(finished):
+    line = json.dumps(finished.to_dict(), ensure_ascii=False, default=str)
+    with _export_lock:
+        with open(AGENT_TRACE_FILE, "a") as f:
+            f.write(line + "\n")
@@ -0,0 +1,160 @@
+# FILE: agent/lexical.py
+import os
+import re
+import math
+import heapq
+from operator import itemgetter
+from collections import Counter, defaultdict
+
+# Costante k della reciprocal rank fusion: più è alta, meno pesa la differenza tra i primi posti
+CATALOG_RRF_K = int(os.getenv("CATALOG_RRF_K", "60"))
+
+# Identificatori interi (GetUser, get_order_details, ord-002) e loro parti (camelCase, snake_case)
+_WORD_RE = re.compile(r"[A-Za-z0-9]+(?:[_-][A-Za-z0-9]+)*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_NAME_BOOST = 3
+# Un identificatore citato nel testo è delimitato da caratteri fuori da questa classe:
+# "/orders" non combacia col prefisso di "/orders/{order_id}", "GetUser" non con "GetUserById"
+_RUN_RE = re.compile(r"[\w/{}]+")
+
+
+def tokenize(text):
+    """
+    Token in minuscolo: ogni identificatore compare intero ("getuser") e spezzato
+    nelle sue parti ("get", "user"), così un nome citato alla lettera pesa di più.
+    """
+    tokens = []
+    for word in _WORD_RE.findall(text or ""):
+        tokens.append(word.lower())
+        parts = [part.lower() for chunk in re.split(r"[_-]", word) for part in _CAMEL_RE.findall(chunk)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return [token for token in tokens if len(token) > 1]
+
+
+def document_identifiers(metadata):
+    """Nomi e path che, citati alla lettera in un task, identificano la funzione."""
+    keys = ("name", "path_template", "rpc", "operation_name")
+    return {metadata[key] for key in keys if isinstance(metadata.get(key), str) and metadata[key]}
+
+
+def document_text(metadata, source_contract):
+    """Testo indicizzato per una funzione: nome (con più peso), path/servizio/operazione e contratto."""
+    name = metadata.get("name") or ""
+    fields = [metadata.get(key) for key in ("path_template", "service", "rpc", "operation_name", "method")]
+    return " ".join([name] * _NAME_BOOST + [field for field in fields if isinstance(field, str)] + [source_contract or ""])
+
+
+class LexicalIndex:
+    """
+    Indice invertito BM25 in memoria sulle funzioni del catalogo, più gli identificatori
+    esatti (nomi e path) di ciascuna. `documents`: (doc_id, testo, identificatori).
+    """
+    def __init__(self, documents, k1=1.2, b=0.75):
+        self.k1 = k1
+        self._ids = []
+        self._postings = defaultdict(list)
+        # Identificatori fatti di un solo run: basta cercarli tra i run del testo. Gli altri
+        # ("get-user", "Service.Method") si indicizzano per il primo run e si verificano con la regex
+        self._identifiers = defaultdict(list)
+        self._compound_identifiers = defaultdict(dict)
+        lengths = []
+        for doc_id, text, identifiers in documents:
+            counts = Counter(tokenize(text))
+            position = len(self._ids)
+            self._ids.append(doc_id)
+            for identifier in identifiers:
+                self._add_identifier(identifier.lower(), doc_id)
+            lengths.append(sum(counts.values()))
+            for token, frequency in counts.items():
+                self._postings[token].append((position, frequency))
+
+        total = len(self._ids)
+        average_length = (sum(lengths) / total) if total else 1.0
+        self._idf = {
+            token: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for token, postings in self._postings.items()
+        }
+        self._norms = [k1 * (1 - b + b * length / (average_length or 1.0)) for length in lengths]
+
+    def _add_identifier(self, identifier, doc_id):
+        runs = _RUN_RE.findall(identifier)
+        if runs == [identifier]:
+            self._identifiers[identifier].append(doc_id)
+        else:
+            first = runs[0] if runs and identifier.startswith(runs[0]) else ""
+            self._compound_identifiers[first].setdefault(identifier, []).append(doc_id)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def search(self, query, limit):
+        """I `limit` documenti con punteggio BM25 più alto: lista di (doc_id, punteggio)."""
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            idf = self._idf.get(token)
+            if not idf:
+                continue
+            for position, frequency in self._postings[token]:
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + self._norms[position])
+        top = heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+        return [(self._ids[position], score) for position, score in top]
+
+    def exact_matches(self, query):
+        """Documenti il cui nome o path compare alla lettera nel testo ("GetUser", "/reviews/{review_id}")."""
+        lowered = (query or "").lower()
+        matches, seen = [], set()
+
+        def add(doc_ids):
+            for doc_id in doc_ids:
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    matches.append(doc_id)
+
+        runs = list(dict.fromkeys(_RUN_RE.findall(lowered)))
+        for run in runs:
+            add(self._identifiers.get(run, ()))
+        if self._compound_identifiers:
+            # "" raccoglie i pochi identificatori che non iniziano con un run: si verificano sempre
+            for first in [""] + runs:
+                for identifier, doc_ids in self._compound_identifiers.get(first, {}).items():
+                    if identifier in lowered and re.search(r"(?<![\w/{}])" + re.escape(identifier) + r"(?![\w/{}])", lowered):
+                        add(doc_ids)
+        return matches
+
+
+def reciprocal_rank_fusion(rankings, k=CATALOG_RRF_K):
+    """
+    Fonde più classifiche ({nome sorgente: [doc_id in ordine]}) sommando 1 / (k + rank).
+    Restituisce [(doc_id, punteggi)] in ordine di punteggio fuso; `punteggi` contiene
+    "rrf" e la posizione in ciascuna sorgente ("<sorgente>_rank", assente se il documento non c'è).
+    """
+    fused = {}
+    for source, ranked_ids in rankings.items():
+        for rank, doc_id in enumerate(ranked_ids, start=1):
+            scores = fused.setdefault(doc_id, {"rrf": 0.0})
+            scores["rrf"] += 1.0 / (k + rank)
+            scores[f"{source}_rank"] = rank
+    return sorted(fused.items(), key=lambda item: item[1]["rrf"], reverse=True)
+
+
+def hybrid_matches(candidates, vector_ranking, lexical_hits, exact_ids, top_k):
+    """
+    Risultati della ricerca ibrida a partire dai candidati ({doc_id: (metadata, source_contract, distance)}),
+    dalla classifica vettoriale, da quella BM25 e dalle funzioni citate per nome o path.
+    Ogni risultato riporta i punteggi per sorgente.
+    """
+    lexical_scores = dict(lexical_hits)
+    fused = reciprocal_rank_fusion({
+        "exact": exact_ids,
+        "vector": vector_ranking,
+        "lexical": [doc_id for doc_id, _ in lexical_hits],
+    })
+    matches = []
+    for doc_id, scores in fused[:top_k]:
+        metadata, source_contract, distance = candidates[doc_id]
+        scores["distance"] = distance
+        if doc_id in lexical_scores:
+            scores["bm25"] = lexical_scores[doc_id]
+        matches.append({"metadata": metadata, "source_contract": source_contract, "distance": distance, "scores": scores})
+    return matches
@@ -1,172 +1,78 @@
 # FILE: agent/main.py
 import json
-from psycopg2.extras import RealDictCursor
+import argparse
+import importlib
+import threading
+
+from dotenv import load_dotenv
+
+# Prima degli import dei moduli, che leggono le variabili d'ambiente al caricamento
+load_dotenv()
 
 # --- Import moduli ---
-from .core.planner import StrategicPlanner
-from .core.operator import execute_task_and_prepare_call
-from .recovery_agent import RecoveryAgent
-from .utils import find_most_relevant_functions, resolve_payload_variables
-from .core.llm_api import call_llm
+from .session import AgentRuntime
+from .warmup import AGENT_WARMUP
 
 # --- Import utility condivise ---
-from utils.database import get_db_connection
-from utils.embeddings import get_embedding
+from utils.database import DatabasePool
+from utils.profiling import enable_profiling, print_profile_summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Agente AgentifyApi da riga di comando.")
+    parser.add_argument("--profile", action="store_true", help="Profila ogni query (equivale ad AGENT_PROFILE=1)")
+    parser.add_argument("--cprofile", action="store_true", help="Con --profile, salva anche un profilo cProfile per query")
+    parser.add_argument("--tracemalloc", action="store_true", help="Con --profile, traccia anche le allocazioni di memoria")
+    return parser.parse_args()
+
+
+def preload_in_background(*modules):
+    """
+    Importa `modules` in un thread daemon: serviranno alla prima richiesta, e così il loro
+    caricamento si sovrappone alla connessione al database e all'input dell'utente.
+    """
+    def load():
+        for name in modules:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass
+    threading.Thread(target=load, name="preload", daemon=True).start()
 
-# --- Costanti dei Modelli ---
-LLM_ADVANCED_OPERATOR = "gemini-2.5-pro"
-LLM_SIMPLE_OPERATOR = "gemini-2.5-pro"
-LLM_SYNTHESIZER = "gemini-2.5-pro"
 
 def main():
     """Il loop principale che orchestra l'agente."""
+    args = parse_args()
+    if args.profile:
+        enable_profiling(cprofile=args.cprofile or None, tracemalloc_enabled=args.tracemalloc or None)
     print("🤖 Salve! Sono un Agente Ibrido V2. Come posso aiutarti?")
-    conn = get_db_connection()
-    conversation_history = []
+    runtime = AgentRuntime(DatabasePool(maxconn=2))
+    if AGENT_WARMUP:
+        # Catalogo, connessioni ed embedding si scaldano mentre l'utente scrive la prima domanda
+        runtime.warm_up()
+    else:
+        # Embedding e gateway LLM servono a ogni richiesta; grpc e protobuf restano pigri finché non servono
+        preload_in_background("openai", "requests")
+    session = runtime.new_session()
 
     while True:
-        chain_results = {}
         user_query = input("\n> ")
         if not user_query.strip(): continue
-        if user_query.lower() == 'esci': break
-        conversation_history.append({"role": "user", "content": user_query})
-        
-        # 1. PIANIFICAZIONE STRATEGICA
-        print("\n\033[95m🧠 [STRATEGA]\033[0m Creando un piano con GPT-4 Turbo...")
-        query_embedding = get_embedding(user_query)
-        with conn.cursor(cursor_factory=RealDictCursor) as cur:
-            cur.execute("SELECT metadata, source_contract FROM api_functions ORDER BY embedding <=> %s::vector LIMIT 7", (str(query_embedding),))
-            relevant_functions_raw = cur.fetchall()
-
-        tools_summary = [{"name": r['metadata'].get("name"), "description": r['source_contract'][:150]} for r in relevant_functions_raw]
-
-        planner = StrategicPlanner()
-        strategic_plan_json = planner.create_strategic_plan(user_query, tools_summary, conversation_history)
-        plan = strategic_plan_json.get("plan", [])
-        
-        print("\033[95m🗺️  [STRATEGA]\033[0m Piano strategico generato:")
-        print(json.dumps(plan, indent=2, ensure_ascii=False))
-
-        # 2. ESECUZIONE DEL PIANO
-        execution_success = True
-        recovery_agent = RecoveryAgent(user_query=user_query, full_plan=plan)
-        i = 0
-        while i < len(plan):
-            task = plan[i]
-            task_description = task
-            print(f"\n\033[94m📍 [ESECUTORE]\033[0m Step {i+1}/{len(plan)}: {task_description}")
-
-            task_embedding = get_embedding(task_description)
-            with conn.cursor() as cur:
-                cur.execute("SELECT metadata, embedding <=> %s::vector AS distance FROM api_functions ORDER BY distance LIMIT 1", (str(task_embedding),))
-                best_match = cur.fetchone()
-            
-            is_complex_context_task = i > 0
-            distance = best_match[1] if best_match else 1.0
-
-            if is_complex_context_task or distance > 0.45:
-                model_for_operator = LLM_ADVANCED_OPERATOR
-                print(f"   - 🧠 Routing a: {LLM_ADVANCED_OPERATOR} (Task complesso o distanza alta)")
-            else:
-                model_for_operator = LLM_SIMPLE_OPERATOR
-                print(f"   - 🧠 Routing a: {LLM_SIMPLE_OPERATOR} (Task semplice e diretto)")
-
-            task_relevant_functions = find_most_relevant_functions(task_embedding, conn, top_k=3)
-            
-             # --- LOGGING AGGRESSIVO PER L'OPERATIVO ---
-            print(f"\033[94m   🤖 [OPERATIVO]\033[0m Chiamata a {model_for_operator} con i seguenti dati:")
-            print("\033[90m      --- INIZIO CONTESTO PER OPERATIVO ---")
-            print(f"      OBIETTIVO: {task_description}")
-            print(f"      DATI DISPONIBILI: {json.dumps(chain_results, indent=2, ensure_ascii=False)}")
-            print(f"      STRUMENTI RILEVANTI: {[func[0].get('name') for func in task_relevant_functions]}")
-            print("      --- FINE CONTESTO PER OPERATIVO ---\033[0m")
-            # ---------------------------------------------
-            
-            prepared_tool_call = execute_task_and_prepare_call(
-                task_description, chain_results, task_relevant_functions, model_for_operator
-            )
-            print(f"   🔍 Tool call preparata: {json.dumps(prepared_tool_call, indent=2)}")
-            
-            action = prepared_tool_call.get("action")
-            if action == "call_tool":
-                prepared_tool_call["payload"] = resolve_payload_variables(prepared_tool_call.get("payload", {}), chain_results)
-                result = recovery_agent.run(
-                    tool_call=prepared_tool_call,
-                    chain_results=chain_results,
-                    current_task=task_description
-                )
-                
-                if result.get("success"):
-                    step_output_name = f"step_{i+1}_result"
-                    chain_results[step_output_name] = result.get("data")
-                    # Rimettiamo il log del risultato per il debug
-                    print(f"\033[92m   ✅ Step completato. Risultato salvato: {json.dumps(result.get('data'), ensure_ascii=False, indent=2)}\033[0m")
-                else:
-                    if result.get("is_final_error"):
-                        explanation = result.get("explanation")
-                        print(f"   ❌ Step fallito in modo definitivo. Spiegazione: {explanation}")
-                        chain_results[f"step_{i+1}_error"] = explanation
-                    else:
-                        print(f"   ❌ Step fallito dopo i tentativi di recupero: {result.get('error')}")
-                    execution_success = False
-                    break
-            
-            elif action == "ask_user":
-                user_answer = input(f"🤖 {prepared_tool_call.get('question')} \n> ")
-                chain_results[f"step_{i+1}_user_info"] = user_answer
-                print("   ✅ Informazione acquisita dall'utente.")
-                # NON incrementare i, così rifà lo stesso task
-                continue
-
-            elif action == "provide_answer":
-                # L'operatore ha già la risposta
-                chain_results[f"step_{i+1}_result"] = prepared_tool_call.get("answer")
-                print(f"   ✅ L'operatore ha fornito direttamente la risposta: {prepared_tool_call.get('answer')}")
-                # Qui potresti anche settare un flag per saltare direttamente al synth
-
-            # Nel main.py, dopo elif action == "ask_user", AGGIUNGI:
-
-            elif action == "suggest_additional_step":
-                reasoning = prepared_tool_call.get("reasoning")
-                new_step = prepared_tool_call.get("new_step")
-                
-                print(f"   💡 L'operatore suggerisce uno step intermedio:")
-                print(f"      Motivo: {reasoning}")
-                print(f"      Nuovo step: {new_step}")
-                
-                new_step = new_step.replace("${step_1_result.userId}", str(chain_results.get("step_1_result", {}).get("userId", "")))
-                
-                plan.insert(i, new_step)
-                print(f"   ✅ Step intermedio aggiunto al piano. Il piano ora ha {len(plan)} step.")
-                
-                continue
-
-            i += 1
-        
-        # 3. SINTESI FINALE
-        if chain_results:
-            print("\n\033[96m✍️  [SINTETIZZATORE]\033[0m Formulando la risposta finale...")
-            
-            synthesis_prompt = f"""
-            Sei un assistente AI che comunica i risultati finali all'utente.
-            La richiesta originale dell'utente era: "{user_query}"
-
-            Il contesto completo dei risultati (e degli errori) ottenuti è:
-            {json.dumps(chain_results, indent=2, ensure_ascii=False)}
-
-            Tuo Compito: Formula una risposta finale.
-            - Se l'esecuzione è andata a buon fine, riassumi il risultato finale per l'utente.
-            - Se c'è stato un errore (cerca una chiave '..._error' in `chain_results`), spiega gentilmente all'utente cosa non ha funzionato, usando la spiegazione fornita.
-            - Sii sempre conciso, amichevole e NON inventare MAI informazioni.
-            - La tua risposta deve essere una singola stringa di testo puro. NON PRODURRE JSON.
-            """
-            response_str = call_llm(LLM_SYNTHESIZER, synthesis_prompt, is_json_output=False)
-            print(f"\n\033[1m🤖 RISPOSTA FINALE:\033[0m {response_str}")
-            conversation_history.append({"role": "assistant", "content": response_str})
-        elif not execution_success:
-            print("\n--- ⚠️ La Catena è stata interrotta ---")
-
-    conn.close()
+        if user_query.lower() == 'esci' and session.pending_question is None:
+            print(f"📊 Statistiche binder: {json.dumps(runtime.stats()['binder'])}")
+            print(f"📊 Statistiche speculazione: {json.dumps(session.speculator.stats)}")
+            if runtime.stats()["hedging"]:
+                print(f"📊 Statistiche hedging LLM: {json.dumps(runtime.stats()['hedging'])}")
+            print_profile_summary()
+            runtime.close()
+            break
+
+        reply = session.handle_message(user_query)
+        if reply["type"] == "question":
+            # La prossima riga digitata è la risposta alla domanda dell'agente
+            print(f"🤖 {reply['text']}")
+        else:
+            print(f"\n\033[1m🤖 RISPOSTA FINALE:\033[0m {reply['text']}")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
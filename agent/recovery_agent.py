@@ -2,11 +2,13 @@
 import time
 import json
 
+from .core.deadline import budget_exhausted
 from .core.llm_api import call_llm
+from .core.model_router import MODEL_ROUTER
+from .core.tracing import span
+from utils.profiling import profile_stage
 from .tools.executors import execute_tool  # Assumendo che execute_tool sia qui
 
-LLM_ERROR_ANALYZER = "gemini-1.5-flash-latest"  # Veloce ed economico per l'analisi
-
 class RecoveryAgent:
     """
     Un agente specializzato che implementa un ciclo ReAct per gestire
@@ -15,6 +17,7 @@ class RecoveryAgent:
     def __init__(self, user_query: str, full_plan: list):
         self.user_query = user_query
         self.full_plan = full_plan
+        self.tool_calls = 0
 
     def _classify_error_type(self, error_result: dict) -> str:
         """Classifica l'errore in modo agnostico rispetto al protocollo."""
@@ -40,11 +43,30 @@ class RecoveryAgent:
         
         return "unknown_error"
 
-    def _analyze_error_with_llm(self, tool_call: dict, error_result: dict, chain_results: dict, attempt: int, current_task: str) -> dict:
+    def _analyze_error_with_llm(self, tool_call: dict, error_result: dict, chain_results: dict, attempt: int, current_task: str,
+                                deadline=None, can_wait: bool = True) -> dict:
         """Invoca un LLM per analizzare l'errore e scegliere una strategia di recupero."""
         error_type = self._classify_error_type(error_result)
-        
-        prompt = f"""
+        with profile_stage("prompt.recovery"):
+            prompt = self._build_prompt(tool_call, error_result, chain_results, attempt, current_task, error_type)
+            if not can_wait:
+                prompt += '\n        **VINCOLO DI TEMPO:** il budget della richiesta non basta per attendere: "wait_and_retry" NON è disponibile.\n'
+
+        analyzer_model = MODEL_ROUTER.choose("recovery")
+        with span("recovery", attempt=attempt + 1, error_type=error_type) as recovery:
+            analysis_str = call_llm(analyzer_model, prompt, is_json_output=True, call_site="recovery", deadline=deadline)
+            try:
+                analysis = json.loads(analysis_str)
+                recovery.set(strategy=analysis.get("strategy"))
+                if analysis.get("strategy") not in ("retry_with_fix", "wait_and_retry", "explain_to_user", "give_up"):
+                    MODEL_ROUTER.report_downstream("recovery", analyzer_model, False)
+                return analysis
+            except json.JSONDecodeError:
+                print("   - 💥 L'analizzatore di errori ha prodotto un output non JSON. Fallimento.")
+                return {"strategy": "give_up", "reasoning": "L'analizzatore di errori ha prodotto un output non valido."}
+
+    def _build_prompt(self, tool_call, error_result, chain_results, attempt, current_task, error_type):
+        return f"""
         Sei un Dottore di Sistemi AI, un esperto di diagnosi e recupero da errori API.
         
         **CONTESTO DELLA MISSIONE:**
@@ -88,18 +110,12 @@ class RecoveryAgent:
         - Per un 404: {{"strategy": "explain_to_user", "reasoning": "L'ID richiesto non esiste, non ha senso riprovare.", "explanation": "Mi dispiace, ma sembra che l'elemento che stai cercando non esista. Forse c'è un errore di battitura nell'ID?"}}
         - Per un 503: {{"strategy": "wait_and_retry", "reasoning": "Il server remoto è temporaneamente sovraccarico."}}
         """
-        
-        analysis_str = call_llm(LLM_ERROR_ANALYZER, prompt, is_json_output=True)
-        try:
-            return json.loads(analysis_str)
-        except json.JSONDecodeError:
-            print("   - 💥 L'analizzatore di errori ha prodotto un output non JSON. Fallimento.")
-            return {"strategy": "give_up", "reasoning": "L'analizzatore di errori ha prodotto un output non valido."}
-
-    def run(self, tool_call: dict, chain_results: dict, current_task: str, max_retries=3):
+
+    def run(self, tool_call: dict, chain_results: dict, current_task: str, max_retries=3, deadline=None):
         """
         Esegue uno strumento e, in caso di fallimento, orchestra il ciclo ReAct
-        di analisi e recupero.
+        di analisi e recupero. Con una `deadline` le strategie che non stanno nel budget
+        rimasto vengono scartate e, a budget esaurito, il recupero si interrompe.
         """
 
         context = {
@@ -111,17 +127,35 @@ class RecoveryAgent:
         
         for attempt in range(max_retries):
             # AZIONE (Act)
-            result = execute_tool(tool_call, context)
+            result = execute_tool(tool_call, context, deadline)
+            self.tool_calls += 1
 
             if result.get("success"):
                 return result  # Successo al primo (o successivo) tentativo!
 
+            # Backend con il circuit breaker aperto: riprovare o chiedere all'LLM non serve
+            if result.get("backend_unavailable"):
+                print(f"   - 🔌 {result.get('error')}: nessun tentativo di recupero.")
+                return {"success": False, "is_final_error": True, "backend_unavailable": True,
+                        "error": result.get("error"),
+                        "explanation": "Il servizio che gestisce questi dati non è al momento disponibile. Riprova tra poco."}
+
+            # Senza budget non ha senso nemmeno chiedere all'LLM come recuperare
+            if result.get("deadline_exceeded") or budget_exhausted(deadline):
+                print("   - ⏱️ Budget della richiesta esaurito: nessun tentativo di recupero.")
+                result["deadline_exceeded"] = True
+                return result
+
             # OSSERVAZIONE (Observe)
             print(f"⚠️ Errore rilevato al tentativo {attempt + 1}. Avvio analisi ReAct...")
-            
+
             # PENSIERO (Reason)
-            error_analysis = self._analyze_error_with_llm(tool_call, result, chain_results, attempt, current_task)
-            strategy = error_analysis.get("strategy")
+            wait_time = 2 ** attempt
+            can_wait = deadline is None or deadline.remaining() > wait_time
+            error_analysis = self._analyze_error_with_llm(tool_call, result, chain_results, attempt, current_task,
+                                                          deadline, can_wait)
+            # Una chiamata fallita (o saltata per mancanza di budget) non ha strategia
+            strategy = error_analysis.get("strategy") or "give_up"
             reasoning = error_analysis.get('reasoning', 'Nessun ragionamento fornito.')
             
             print(f"   - 🧠 [{strategy.upper()}] {reasoning}")
@@ -138,7 +172,10 @@ class RecoveryAgent:
                     break
             
             elif strategy == "wait_and_retry":
-                wait_time = 2 ** attempt
+                if deadline is not None and deadline.remaining() <= wait_time:
+                    print(f"   - ⏱️ Attendere {wait_time}s supererebbe il budget della richiesta. Interruzione.")
+                    result["deadline_exceeded"] = True
+                    break
                 print(f"   - ⏳ Attendo {wait_time}s prima del prossimo tentativo...")
                 time.sleep(wait_time)
                 continue
@@ -150,5 +187,7 @@ class RecoveryAgent:
                 print("   - 🛑 Strategia di recupero non valida o 'give_up'. Interruzione.")
                 break
 
+        if budget_exhausted(deadline):
+            result["deadline_exceeded"] = True
         print("❌ Tutti i tentativi di recupero sono falliti.")
         return result
\ No newline at end of file
@@ -0,0 +1,239 @@
+# FILE: agent/server.py
+import os
+import time
+import uuid
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+# Prima degli import dei moduli, che leggono le variabili d'ambiente al caricamento
+load_dotenv()
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from .session import AgentRuntime
+from .catalog import CatalogScope
+from .warmup import AGENT_WARMUP
+from .core.tracing import METRICS
+from .core.circuit_breaker import BREAKERS
+from utils.database import DatabasePool
+from utils.profiling import print_profile_summary
+
+AGENT_MAX_SESSIONS = int(os.getenv("AGENT_MAX_SESSIONS", "500"))
+AGENT_WORKERS = int(os.getenv("AGENT_WORKERS", "32"))
+AGENT_MAX_QUEUED = int(os.getenv("AGENT_MAX_QUEUED", "64"))
+AGENT_SESSION_IDLE_TTL = int(os.getenv("AGENT_SESSION_IDLE_TTL", "1800"))
+AGENT_SERVER_PORT = int(os.getenv("AGENT_SERVER_PORT", "8080"))
+
+
+class MessageRequest(BaseModel):
+    message: str
+
+
+class SessionRequest(BaseModel):
+    """Namespace del catalogo visibili alla sessione; i campi omessi usano AGENT_TENANTS/ENVIRONMENTS/API_TYPES."""
+    tenants: Optional[List[str]] = None
+    environments: Optional[List[str]] = None
+    api_types: Optional[List[str]] = None
+
+
+class SessionManager:
+    """
+    Tiene le sessioni attive ed esegue i loro messaggi su un pool di worker condiviso.
+
+    Controllo di ammissione:
+    - al massimo AGENT_MAX_SESSIONS sessioni aperte (le inattive scadono dopo AGENT_SESSION_IDLE_TTL);
+    - al massimo AGENT_WORKERS richieste in esecuzione più AGENT_MAX_QUEUED in coda,
+      oltre le quali il server risponde subito 429 invece di accumulare latenza;
+    - un solo messaggio alla volta per sessione.
+    """
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.sessions = {}
+        self.workers = ThreadPoolExecutor(max_workers=AGENT_WORKERS, thread_name_prefix="agent-worker")
+        self._admitted = 0
+        self._lock = threading.Lock()
+
+    def ensure_ready(self):
+        if not self.runtime.is_ready():
+            raise HTTPException(status_code=503, detail="Agente in riscaldamento, riprova tra poco.",
+                                headers={"Retry-After": "1"})
+
+    def create(self, scope=None):
+        self.ensure_ready()
+        self.expire_idle()
+        with self._lock:
+            if len(self.sessions) >= AGENT_MAX_SESSIONS:
+                raise HTTPException(status_code=503, detail="Numero massimo di sessioni raggiunto.")
+            session_id = uuid.uuid4().hex
+            self.sessions[session_id] = self.runtime.new_session(session_id, scope)
+        return session_id
+
+    def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Sessione non trovata.")
+        return session
+
+    def close(self, session_id):
+        with self._lock:
+            session = self.sessions.pop(session_id, None)
+        if session is not None:
+            session.close()
+
+    def expire_idle(self):
+        now = time.monotonic()
+        expired = [sid for sid, s in list(self.sessions.items())
+                   if now - s.last_activity > AGENT_SESSION_IDLE_TTL and not s.lock.locked()]
+        for session_id in expired:
+            self.close(session_id)
+
+    async def submit(self, session_id, message):
+        self.ensure_ready()
+        session = self.get(session_id)
+        with self._lock:
+            if self._admitted >= AGENT_WORKERS + AGENT_MAX_QUEUED:
+                raise HTTPException(status_code=429, detail="Server sovraccarico, riprova più tardi.")
+            if not session.lock.acquire(blocking=False):
+                raise HTTPException(status_code=409, detail="La sessione sta già elaborando un messaggio.")
+            self._admitted += 1
+        try:
+            future = self.workers.submit(session.handle_message, message)
+        except BaseException:
+            self._release(session)
+            raise
+        # Lock e posto si liberano quando il worker ha finito (o il job in coda viene annullato), non quando
+        # la richiesta HTTP si chiude: un client che si disconnette non deve far partire un secondo messaggio
+        # sulla stessa sessione mentre il primo è ancora in esecuzione
+        future.add_done_callback(lambda _: self._release(session))
+        return await asyncio.wrap_future(future)
+
+    def _release(self, session):
+        with self._lock:
+            self._admitted -= 1
+        session.lock.release()
+
+    def stats(self):
+        return {
+            "sessions": len(self.sessions),
+            "max_sessions": AGENT_MAX_SESSIONS,
+            "in_flight": self._admitted,
+            "workers": AGENT_WORKERS,
+            "max_queued": AGENT_MAX_QUEUED,
+        }
+
+    def shutdown(self):
+        self.workers.shutdown(wait=False)
+        self.runtime.close()
+
+
+manager = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global manager
+    # Le connessioni si prendono solo per la durata delle query di catalogo
+    manager = SessionManager(AgentRuntime(DatabasePool()))
+    # Il traffico è accettato (/ready 200) solo a riscaldamento concluso
+    if AGENT_WARMUP:
+        manager.runtime.warm_up()
+    yield
+    manager.shutdown()
+    print_profile_summary()
+
+
+app = FastAPI(title="AgentifyApi Agent Server", lifespan=lifespan)
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", **manager.stats(), "backends": BREAKERS.snapshot()}
+
+
+@app.get("/ready")
+def ready():
+    """Readiness: 200 a riscaldamento concluso, 503 prima; riporta l'esito di ogni fase."""
+    warmup = manager.runtime.warmup
+    report = warmup.report() if warmup is not None else {"ready": True, "stages": {}}
+    report["ready"] = manager.runtime.is_ready()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Istogrammi di latenza e contatori nel formato testuale di Prometheus."""
+    stats = manager.stats()
+    gauges = [
+        "# TYPE agent_sessions gauge",
+        f"agent_sessions {stats['sessions']}",
+        "# TYPE agent_in_flight_requests gauge",
+        f"agent_in_flight_requests {stats['in_flight']}",
+        "# TYPE agent_breaker_open gauge",
+    ]
+    gauges += [f'agent_breaker_open{{backend="{backend}"}} {int(breaker["state"] != "closed")}'
+               for backend, breaker in BREAKERS.snapshot().items()]
+    return METRICS.export_prometheus() + "\n".join(gauges) + "\n"
+
+
+@app.post("/sessions")
+def create_session(request: Optional[SessionRequest] = None):
+    request = request or SessionRequest()
+    try:
+        scope = CatalogScope.from_request(request.tenants, request.environments, request.api_types)
+    except ValueError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    return {"session_id": manager.create(scope), "scope": scope.to_dict()}
+
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    session = manager.get(session_id)
+    return {
+        "session_id": session_id,
+        "scope": session.scope.to_dict(),
+        "pending_question": session.pending_question,
+        "history": session.conversation_history,
+    }
+
+
+@app.post("/sessions/{session_id}/messages")
+async def post_message(session_id: str, request: MessageRequest):
+    """Invia un messaggio. Se la risposta è di tipo 'question', il messaggio successivo ne è la risposta."""
+    return await manager.submit(session_id, request.message)
+
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    manager.close(session_id)
+    return {"closed": session_id}
+
+
+@app.websocket("/sessions/{session_id}/ws")
+async def session_socket(websocket: WebSocket, session_id: str):
+    if session_id not in manager.sessions:
+        await websocket.close(code=4404)
+        return
+    await websocket.accept()
+    try:
+        while True:
+            message = await websocket.receive_text()
+            try:
+                reply = await manager.submit(session_id, message)
+            except HTTPException as e:
+                reply = {"type": "error", "status": e.status_code, "text": e.detail}
+            await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=AGENT_SERVER_PORT)
@@ -0,0 +1,445 @@
+# FILE: agent/session.py
+import json
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Import moduli ---
+from .core.planner import StrategicPlanner
+from .core.plan_cache import PlanCache, PLAN_CACHE_ENABLED
+from .core.operator import execute_task_and_prepare_call
+from .core.speculation import SpeculativePreparer, is_speculatable, speculative_context
+from .core.fast_binder import try_fast_bind, record_operator_latency, binder_stats_summary
+from .recovery_agent import RecoveryAgent
+from .tools.executors import backend_key
+from .catalog import PgCatalog, DEFAULT_SCOPE
+from .warmup import Warmup
+from .utils import resolve_payload_variables
+from .core.llm_api import call_llm
+from .core.model_router import MODEL_ROUTER
+from .core.hedging import hedging_summary
+from .core.circuit_breaker import BREAKERS
+from .core.tracing import span, log_verbose, LazyJson, METRICS
+from .core.deadline import Deadline, budget_exhausted
+from utils.profiling import profile_query, profile_stage
+
+# --- Import utility condivise ---
+from utils.embeddings import get_embedding
+
+
+def prefer_available(matches):
+    """Mette in fondo (in ordine stabile) gli strumenti il cui backend ha il circuit breaker aperto."""
+    return sorted(matches, key=lambda match: not BREAKERS.available(backend_key(match[0])))
+
+
+def prepare_step_call(task_description, step_index, chain_results, catalog, scope=None, deadline=None):
+    """Routing, retrieval (nei namespace di `scope`) e preparazione della tool call per un singolo step del piano."""
+    with span("embedding", text_bytes=len(task_description.encode("utf-8"))):
+        task_embedding = get_embedding(task_description)
+    # Una sola query restituisce sia i candidati sia la distanza del migliore
+    with span("retrieval", top_k=3) as retrieval:
+        matches = prefer_available(catalog.search(task_embedding, top_k=3, text=task_description, scope=scope))
+        distance = matches[0][2] if matches else 1.0
+        retrieval.set(best_distance=distance, results=len(matches))
+    task_relevant_functions = [(metadata, contract) for metadata, contract, _ in matches]
+
+    with span("operator", step=step_index + 1) as operator:
+        prepared_tool_call = try_fast_bind(task_description, chain_results, task_relevant_functions, distance)
+        if prepared_tool_call:
+            operator.set(bound_by="fast_binder", cache_hit=True)
+            print(f"   ⚡ [BINDER] Tool '{prepared_tool_call['tool_metadata'].get('name')}' legato senza LLM (distanza {distance:.3f})")
+        else:
+            model_for_operator = MODEL_ROUTER.choose("operator")
+            print(f"   - 🧠 Routing a: {model_for_operator}")
+            print(f"\033[94m   🤖 [OPERATIVO]\033[0m Chiamata a {model_for_operator}")
+            # --- LOGGING AGGRESSIVO PER L'OPERATIVO (solo con AGENT_TRACE_VERBOSE=1) ---
+            log_verbose("\033[90m      --- INIZIO CONTESTO PER OPERATIVO ---")
+            log_verbose("      OBIETTIVO: {}", task_description)
+            log_verbose("      DATI DISPONIBILI: {}", LazyJson(chain_results))
+            log_verbose("      STRUMENTI RILEVANTI: {}", [func[0].get('name') for func in task_relevant_functions])
+            log_verbose("      --- FINE CONTESTO PER OPERATIVO ---\033[0m")
+            # ---------------------------------------------
+
+            operator_start = time.perf_counter()
+            prepared_tool_call = execute_task_and_prepare_call(
+                task_description, chain_results, task_relevant_functions, model_for_operator, deadline
+            )
+            record_operator_latency(time.perf_counter() - operator_start)
+            operator.set(bound_by="llm", cache_hit=False, action=prepared_tool_call.get("action"))
+            # Serve al router per attribuire l'esito del tool al modello che l'ha preparato
+            prepared_tool_call["operator_model"] = model_for_operator
+    return prepared_tool_call
+
+
+class AgentRuntime:
+    """
+    Risorse condivise da tutte le sessioni di un processo: pool del database,
+    planner con la sua cache e il pool di thread per le speculazioni.
+    """
+    def __init__(self, db_pool=None, speculation_workers=4, catalog=None):
+        self.db_pool = db_pool
+        self.catalog = catalog or PgCatalog(db_pool)
+        self.planner = StrategicPlanner(plan_cache=PlanCache() if PLAN_CACHE_ENABLED else None)
+        self.speculation_executor = ThreadPoolExecutor(max_workers=speculation_workers, thread_name_prefix="speculation")
+        self.warmup = None
+
+    def warm_up(self, scope=None):
+        """Avvia il riscaldamento in background; `is_ready()` diventa vero quando termina."""
+        self.warmup = Warmup(self, scope).start()
+        return self.warmup
+
+    def is_ready(self):
+        return self.warmup is None or self.warmup.ready.is_set()
+
+    def new_session(self, session_id=None, scope=None):
+        return AgentSession(self, session_id, scope)
+
+    def stats(self):
+        return {"binder": binder_stats_summary(), "router": MODEL_ROUTER.export(), "hedging": hedging_summary(),
+                "breakers": BREAKERS.snapshot()}
+
+    def close(self):
+        MODEL_ROUTER.export_to_file()
+        self.speculation_executor.shutdown(wait=False)
+        if self.db_pool is not None:
+            self.db_pool.close()
+
+
+class QueryState:
+    """Stato di una richiesta in corso: sopravvive tra un turno e l'altro quando l'agente fa una domanda."""
+    def __init__(self, user_query, query_embedding, tools_summary, strategic_plan_json):
+        self.user_query = user_query
+        self.query_embedding = query_embedding
+        self.tools_summary = tools_summary
+        self.strategic_plan_json = strategic_plan_json
+        self.plan = strategic_plan_json.get("plan", [])
+        self.original_plan = list(self.plan)
+        self.chain_results = {}
+        self.recovery_agent = RecoveryAgent(user_query=user_query, full_plan=self.plan)
+        self.plan_version = 0
+        self.step_index = 0
+        self.execution_success = True
+        self.pending_question = None
+        # Scadenza del turno corrente (rinnovata quando l'utente risponde a una domanda)
+        self.deadline = None
+        self.deadline_hit = False
+        # Secondi spesi per fase (planning, preparation, tool_execution, synthesis)
+        self.stage_seconds = defaultdict(float)
+
+
+class AgentSession:
+    """
+    Una conversazione con l'agente. Tiene lo stato isolato dalle altre sessioni:
+    storia della conversazione, risultati della richiesta in corso e l'eventuale
+    domanda (ask_user) in attesa di risposta. Lo `scope` limita il catalogo ai
+    tenant, ambienti e tipi di API visibili alla sessione.
+    """
+    def __init__(self, runtime, session_id=None, scope=None):
+        self.runtime = runtime
+        self.session_id = session_id
+        self.scope = scope or DEFAULT_SCOPE
+        self.conversation_history = []
+        self.pending = None
+        self.speculator = SpeculativePreparer(executor=runtime.speculation_executor)
+        self.last_query_stats = None
+        self.last_activity = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def pending_question(self):
+        return self.pending.pending_question if self.pending else None
+
+    def handle_message(self, text):
+        """
+        Elabora un messaggio dell'utente. Restituisce {"type": "answer", "text": ...}
+        oppure {"type": "question", "text": ...} se l'agente ha bisogno di un'informazione:
+        in quel caso il messaggio successivo viene usato come risposta.
+        Ogni messaggio ha una deadline (AGENT_QUERY_BUDGET): se scade, la risposta è
+        parziale ({"partial": True}) e costruita con i soli risultati già ottenuti.
+        """
+        self.last_activity = time.monotonic()
+        deadline = Deadline.for_query()
+        with profile_query(f"{self.session_id or 'cli'}-{text[:30]}"), \
+                span("query", session=self.session_id, resumed=self.pending is not None) as query:
+            if self.pending is not None:
+                state, self.pending = self.pending, None
+                state.chain_results[f"step_{state.step_index + 1}_user_info"] = text
+                state.pending_question = None
+                state.plan_version += 1
+                state.deadline = deadline
+                print("   ✅ Informazione acquisita dall'utente.")
+            else:
+                self.conversation_history.append({"role": "user", "content": text})
+                with span("planning") as planning:
+                    state = self._plan(text, deadline)
+                    planning.set(cache_hit=bool(state.strategic_plan_json.get("from_cache")), steps=len(state.plan))
+            reply = self._run_plan(state)
+            query.set(reply_type=reply["type"], success=state.execution_success, deadline_hit=state.deadline_hit)
+        self.last_activity = time.monotonic()
+        return reply
+
+    def _plan(self, user_query, deadline=None):
+        # 1. PIANIFICAZIONE STRATEGICA
+        print("\n\033[95m🧠 [STRATEGA]\033[0m Creando un piano strategico...")
+        planning_start = time.perf_counter()
+        catalog = self.runtime.catalog
+        with span("embedding", text_bytes=len(user_query.encode("utf-8"))):
+            query_embedding = get_embedding(user_query)
+        with span("retrieval", top_k=7):
+            relevant_functions_raw = prefer_available(catalog.search(query_embedding, top_k=7, text=user_query, scope=self.scope))
+
+        tools_summary = [{"name": metadata.get("name"), "description": contract[:150]} for metadata, contract, _ in relevant_functions_raw]
+        # Il planner vede quali strumenti sono su un backend fuori servizio
+        for tool, (metadata, _, _) in zip(tools_summary, relevant_functions_raw):
+            if not BREAKERS.available(backend_key(metadata)):
+                tool["available"] = False
+
+        planner = self.runtime.planner
+        if planner.plan_cache is not None:
+            planner.plan_cache.ensure_catalog_version(catalog.version())
+        strategic_plan_json = planner.create_strategic_plan(user_query, tools_summary, self.conversation_history, query_embedding,
+                                                            deadline)
+        state = QueryState(user_query, query_embedding, tools_summary, strategic_plan_json)
+        state.deadline = deadline
+        state.stage_seconds["planning"] += time.perf_counter() - planning_start
+
+        print("\033[95m🗺️  [STRATEGA]\033[0m Piano strategico generato:")
+        for number, step in enumerate(state.plan, start=1):
+            print(f"   {number}. {step}")
+        return state
+
+    def _run_plan(self, state):
+        # 2. ESECUZIONE DEL PIANO
+        plan = state.plan
+        chain_results = state.chain_results
+        speculator = self.speculator
+        while state.step_index < len(plan):
+            i = state.step_index
+            task_description = plan[i]
+            if budget_exhausted(state.deadline):
+                print(f"\n\033[93m⏱️  [DEADLINE]\033[0m Budget di {state.deadline.budget:.0f}s esaurito: "
+                      f"salto gli step {i+1}-{len(plan)} e rispondo con i risultati parziali.")
+                state.deadline_hit = True
+                state.execution_success = False
+                break
+            print(f"\n\033[94m📍 [ESECUTORE]\033[0m Step {i+1}/{len(plan)}: {task_description}")
+
+            preparation_start = time.perf_counter()
+            with span("preparation", step=i + 1) as preparation:
+                speculative_call = speculator.take(i, task_description, state.plan_version, chain_results)
+                if speculative_call is not None:
+                    print("   ⚡ [SPECULAZIONE] Uso la tool call preparata durante lo step precedente.")
+                    prepared_tool_call = speculative_call
+                else:
+                    prepared_tool_call = prepare_step_call(task_description, i, chain_results, self.runtime.catalog, self.scope,
+                                                           state.deadline)
+                preparation.set(speculative_hit=speculative_call is not None, action=prepared_tool_call.get("action"))
+            state.stage_seconds["preparation"] += time.perf_counter() - preparation_start
+            log_verbose("   🔍 Tool call preparata: {}", LazyJson(prepared_tool_call))
+
+            action = prepared_tool_call.get("action")
+            if action == "call_tool":
+                prepared_tool_call["payload"] = resolve_payload_variables(prepared_tool_call.get("payload", {}), chain_results)
+
+                # Mentre lo strumento gira, prepariamo lo step successivo se dipende solo da ${step_N_result.x}
+                next_index = i + 1
+                if next_index < len(plan) and is_speculatable(plan[next_index]):
+                    speculator.launch(
+                        next_index, plan[next_index], state.plan_version, prepare_step_call,
+                        plan[next_index], next_index, speculative_context(chain_results, i + 1), self.runtime.catalog, self.scope,
+                        state.deadline
+                    )
+
+                execution_start = time.perf_counter()
+                calls_before = state.recovery_agent.tool_calls
+                tool_name = (prepared_tool_call.get("tool_metadata") or {}).get("name")
+                with span("tool_execution", step=i + 1, tool=tool_name) as execution:
+                    result = state.recovery_agent.run(
+                        tool_call=prepared_tool_call,
+                        chain_results=chain_results,
+                        current_task=task_description,
+                        deadline=state.deadline
+                    )
+                    attempts = state.recovery_agent.tool_calls - calls_before
+                    execution.set(success=bool(result.get("success")), attempts=attempts, retries=max(attempts - 1, 0))
+                state.stage_seconds["tool_execution"] += time.perf_counter() - execution_start
+                if prepared_tool_call.get("operator_model"):
+                    MODEL_ROUTER.report_downstream("operator", prepared_tool_call["operator_model"], result.get("success"))
+
+                if result.get("success"):
+                    step_output_name = f"step_{i+1}_result"
+                    chain_results[step_output_name] = result.get("data")
+                    if result.get("pagination") and not result["pagination"]["complete"]:
+                        # La lista è parziale: la sintesi deve dirlo invece di presentarla come completa
+                        chain_results[f"step_{i+1}_pagination"] = result["pagination"]
+                    print(f"\033[92m   ✅ Step completato. Risultato salvato in {step_output_name}.\033[0m")
+                    log_verbose("\033[90m{}\033[0m", LazyJson(result.get("data")))
+                else:
+                    if result.get("is_final_error"):
+                        explanation = result.get("explanation")
+                        print(f"   ❌ Step fallito in modo definitivo. Spiegazione: {explanation}")
+                        chain_results[f"step_{i+1}_error"] = explanation
+                    else:
+                        print(f"   ❌ Step fallito dopo i tentativi di recupero: {result.get('error')}")
+                    state.deadline_hit = state.deadline_hit or bool(result.get("deadline_exceeded"))
+                    state.execution_success = False
+                    speculator.discard("lo step corrente è fallito")
+                    break
+
+            elif action == "ask_user":
+                # Sospendiamo la richiesta: il prossimo messaggio della sessione è la risposta.
+                # NON incrementiamo lo step, così al ritorno rifà lo stesso task.
+                speculator.discard("in attesa di una risposta dall'utente")
+                state.pending_question = prepared_tool_call.get("question")
+                self.pending = state
+                return {"type": "question", "text": state.pending_question}
+
+            elif action == "provide_answer":
+                # L'operatore ha già la risposta
+                chain_results[f"step_{i+1}_result"] = prepared_tool_call.get("answer")
+                print(f"   ✅ L'operatore ha fornito direttamente la risposta: {prepared_tool_call.get('answer')}")
+                # Qui potresti anche settare un flag per saltare direttamente al synth
+
+            elif action == "suggest_additional_step":
+                reasoning = prepared_tool_call.get("reasoning")
+                new_step = prepared_tool_call.get("new_step")
+
+                print(f"   💡 L'operatore suggerisce uno step intermedio:")
+                print(f"      Motivo: {reasoning}")
+                print(f"      Nuovo step: {new_step}")
+
+                new_step = new_step.replace("${step_1_result.userId}", str(chain_results.get("step_1_result", {}).get("userId", "")))
+
+                plan.insert(i, new_step)
+                state.plan_version += 1
+                speculator.discard("il piano è stato modificato da suggest_additional_step")
+                print(f"   ✅ Step intermedio aggiunto al piano. Il piano ora ha {len(plan)} step.")
+
+                continue
+
+            state.step_index += 1
+
+        speculator.discard("fine del piano")
+
+        # Solo i piani arrivati in fondo senza errori vengono riutilizzati
+        if state.execution_success and not state.strategic_plan_json.get("from_cache"):
+            self.runtime.planner.remember_plan(state.user_query, state.tools_summary, state.query_embedding, state.original_plan,
+                                               self.conversation_history)
+
+        synthesis_start = time.perf_counter()
+        with span("synthesis"):
+            reply = self._synthesize(state)
+        state.stage_seconds["synthesis"] += time.perf_counter() - synthesis_start
+        self.last_query_stats = {
+            "stages": dict(state.stage_seconds),
+            "steps": len(plan),
+            "tool_calls": state.recovery_agent.tool_calls,
+            "success": state.execution_success,
+            "plan_from_cache": bool(state.strategic_plan_json.get("from_cache")),
+            "deadline_hit": state.deadline_hit,
+        }
+        return reply
+
+    def _synthesize(self, state):
+        # 3. SINTESI FINALE
+        chain_results = state.chain_results
+        if state.deadline_hit:
+            return self._synthesize_partial(state)
+        if not chain_results:
+            print("\n--- ⚠️ La Catena è stata interrotta ---")
+            return {"type": "answer", "text": "Mi dispiace, non sono riuscito a completare la richiesta."}
+
+        print("\n\033[96m✍️  [SINTETIZZATORE]\033[0m Formulando la risposta finale...")
+
+        with profile_stage("prompt.synthesis"):
+            synthesis_prompt = self._build_synthesis_prompt(state)
+        response_str = call_llm(MODEL_ROUTER.choose("synthesis"), synthesis_prompt, is_json_output=False, call_site="synthesis",
+                                deadline=state.deadline, final=True)
+        self.conversation_history.append({"role": "assistant", "content": response_str})
+        return {"type": "answer", "text": response_str}
+
+    def _synthesize_partial(self, state):
+        """
+        Risposta a deadline scaduta: usa la riserva di sintesi per riassumere i risultati già
+        ottenuti e dire cosa manca; se anche la riserva è esaurita (o l'LLM fallisce) la
+        risposta è costruita senza LLM.
+        """
+        METRICS.inc("agent_deadline_hits_total")
+        completed, missing = self._plan_progress(state)
+        print(f"\n\033[96m✍️  [SINTETIZZATORE]\033[0m Risposta parziale: {len(completed)} step completati, {len(missing)} mancanti.")
+        text = None
+        if not budget_exhausted(state.deadline, final=True):
+            with profile_stage("prompt.synthesis"):
+                prompt = self._build_partial_synthesis_prompt(state, missing)
+            response_str = call_llm(MODEL_ROUTER.choose("synthesis"), prompt, is_json_output=False, call_site="synthesis",
+                                    deadline=state.deadline, final=True)
+            if response_str and not response_str.lstrip().startswith('{"error"'):
+                text = response_str
+        if text is None:
+            text = self._fallback_partial_text(state, completed, missing)
+        self.conversation_history.append({"role": "assistant", "content": text})
+        return {"type": "answer", "text": text, "partial": True}
+
+    @staticmethod
+    def _plan_progress(state):
+        """(step completati, step non eseguiti) del piano corrente."""
+        plan = state.plan or []
+        completed = [task for i, task in enumerate(plan) if f"step_{i+1}_result" in state.chain_results]
+        missing = [task for i, task in enumerate(plan) if f"step_{i+1}_result" not in state.chain_results]
+        return completed, missing
+
+    @staticmethod
+    def _build_partial_synthesis_prompt(state, missing):
+        return f"""
+        Sei un assistente AI che comunica i risultati all'utente.
+        La richiesta originale dell'utente era: "{state.user_query}"
+
+        Il tempo a disposizione per la richiesta è scaduto prima di completare il piano.
+        Risultati ottenuti finora:
+        {json.dumps(state.chain_results, indent=2, ensure_ascii=False)}
+
+        Step non completati:
+        {json.dumps(missing, indent=2, ensure_ascii=False)}
+
+        Tuo Compito: Formula una risposta PARZIALE.
+        - Riassumi solo quello che risulta dai dati ottenuti, senza inventare MAI informazioni.
+        - Una chiave 'step_N_pagination' indica che la lista di 'step_N_result' è parziale: dillo.
+        - Dì chiaramente quali parti della richiesta non sono state completate per mancanza di tempo.
+        - Sii breve: la tua risposta deve essere una singola stringa di testo puro. NON PRODURRE JSON.
+        """
+
+    @staticmethod
+    def _fallback_partial_text(state, completed, missing):
+        lines = ["Non sono riuscito a completare la richiesta nel tempo a disposizione."]
+        results = {key: value for key, value in state.chain_results.items() if key.endswith("_result")}
+        if results:
+            lines.append("Ecco i risultati ottenuti finora:")
+            lines.extend(f"- {task}: {json.dumps(results[f'step_{i+1}_result'], ensure_ascii=False)[:500]}"
+                         for i, task in enumerate(state.plan or []) if f"step_{i+1}_result" in results)
+        if missing:
+            lines.append("Non completato:")
+            lines.extend(f"- {task}" for task in missing)
+        return "\n".join(lines)
+
+    @staticmethod
+    def _build_synthesis_prompt(state):
+        return f"""
+        Sei un assistente AI che comunica i risultati finali all'utente.
+        La richiesta originale dell'utente era: "{state.user_query}"
+
+        Il contesto completo dei risultati (e degli errori) ottenuti è:
+        {json.dumps(state.chain_results, indent=2, ensure_ascii=False)}
+
+        Tuo Compito: Formula una risposta finale.
+        - Se l'esecuzione è andata a buon fine, riassumi il risultato finale per l'utente.
+        - Se c'è stato un errore (cerca una chiave '..._error' in `chain_results`), spiega gentilmente all'utente cosa non ha funzionato, usando la spiegazione fornita.
+        - Se c'è una chiave 'step_N_pagination', la lista di 'step_N_result' è parziale: ne sono stati letti solo "items" elementi
+          ("total", se presente, è il numero complessivo). Dillo all'utente e non presentare conteggi, medie o massimi come definitivi.
+        - Sii sempre conciso, amichevole e NON inventare MAI informazioni.
+        - La tua risposta deve essere una singola stringa di testo puro. NON PRODURRE JSON.
+        """
+
+    def close(self):
+        self.speculator.discard("sessione chiusa")
+        self.pending = None
@@ -0,0 +1,290 @@
+# FILE: agent/tools/batching.py
+"""
+Batching delle chiamate lato executor, sul modello di DataLoader.
+
+Quando il catalogo dichiara la variante batch di un lookup singolo (metadata["batch"]:
+x-batch nella specifica OpenAPI, `@batch` nel commento della rpc, direttiva @batch in GraphQL),
+i lookup concorrenti sullo stesso backend vengono raccolti per TOOL_BATCH_WINDOW_MS e
+inviati come una sola chiamata batch (es. N GetUser -> un BatchGetUsers). Il primo
+chiamante attende la finestra ed esegue la chiamata, gli altri ricevono la loro parte.
+
+- con una sola chiave raccolta parte la chiamata singola originale: nessun cambio di semantica;
+- le chiavi assenti dalla risposta batch vengono richieste con la chiamata singola, così
+  gli errori (404, NOT_FOUND, null) restano quelli del lookup originale;
+- se la chiamata batch fallisce per un errore del backend l'errore vale per tutti, altrimenti
+  (es. variante batch non supportata) si torna alle chiamate singole, in parallelo;
+- la chiamata batch ha il timeout del lookup più stretto e ogni chiamata singola quello del suo
+  lookup; chi aspetta la risposta batch oltre il proprio timeout fa la sua chiamata singola.
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agent.core.deadline import _MIN_TIMEOUT
+from agent.core.tracing import METRICS
+
+TOOL_BATCHING = os.getenv("TOOL_BATCHING", "0") == "1"
+TOOL_BATCH_WINDOW_MS = float(os.getenv("TOOL_BATCH_WINDOW_MS", "5"))
+TOOL_BATCH_MAX_SIZE = int(os.getenv("TOOL_BATCH_MAX_SIZE", "50"))
+
+
+def _single_key(payload, key_param):
+    """Valore della chiave se il payload è un lookup con il solo parametro `key_param`."""
+    if not isinstance(payload, dict) or set(payload) != {key_param}:
+        return None
+    value = payload[key_param]
+    return value if isinstance(value, (str, int)) and not isinstance(value, bool) else None
+
+
+class _RestAdapter:
+    """GET /orders/{order_id} -> GET /orders?ids=...&ids=..."""
+    @staticmethod
+    def lookup(tool_call, batch):
+        key = _single_key(tool_call.get("payload"), batch["key_param"])
+        return None if key is None else (key, "", None)
+
+    @staticmethod
+    def batch_call(metadata, batch, keys, extra):
+        return {
+            "tool_metadata": {**metadata, "name": batch["operation"], "path_template": batch["path_template"],
+                              "method": batch["method"]},
+            "payload": {batch["param"]: keys},
+        }
+
+    @staticmethod
+    def items(data, batch):
+        return data if isinstance(data, list) else []
+
+    @staticmethod
+    def result(item, info, batch):
+        return item
+
+
+class _GrpcAdapter:
+    """GetUser(id) -> BatchGetUsers(ids), risultati nel campo repeated `results`."""
+    @staticmethod
+    def lookup(tool_call, batch):
+        key = _single_key(tool_call.get("payload"), batch["key_param"])
+        return None if key is None else (key, "", None)
+
+    @staticmethod
+    def batch_call(metadata, batch, keys, extra):
+        return {
+            "tool_metadata": {**metadata, "name": batch["operation"], "rpc": batch["rpc"]},
+            "payload": {batch["param"]: keys},
+        }
+
+    @staticmethod
+    def items(data, batch):
+        return (data or {}).get(batch["results"], []) if isinstance(data, dict) else []
+
+    @staticmethod
+    def result(item, info, batch):
+        return item
+
+
+class _GraphqlAdapter:
+    """
+    query { getProduct(productId: "101") { ... } } -> query { getProducts(productIds: [...]) { ... } }.
+    Solo query con un unico campo e il solo argomento chiave (letterale o variabile); il
+    gruppo è la selezione, a cui si aggiunge il campo chiave per ricomporre i risultati.
+    """
+    @staticmethod
+    def lookup(tool_call, batch):
+        payload = tool_call.get("payload") or {}
+        query, variables = payload.get("query"), payload.get("variables") or {}
+        if not isinstance(query, str):
+            return None
+        from graphql import parse, print_ast, GraphQLError
+        try:
+            document = parse(query)
+        except GraphQLError:
+            return None
+        if len(document.definitions) != 1 or getattr(document.definitions[0], "operation", None) is None:
+            return None
+        operation = document.definitions[0]
+        selections = operation.selection_set.selections
+        if operation.operation.value != "query" or len(selections) != 1:
+            return None
+        field = selections[0]
+        if (field.kind != "field" or field.name.value != tool_call["tool_metadata"].get("operation_name")
+                or field.selection_set is None or len(field.arguments) != 1
+                or field.arguments[0].name.value != batch["key_param"]):
+            return None
+        value = field.arguments[0].value
+        key = variables.get(value.name.value) if value.kind == "variable" else getattr(value, "value", None)
+        if not isinstance(key, (str, int)) or isinstance(key, bool):
+            return None
+        selected = {selection.name.value for selection in field.selection_set.selections if selection.kind == "field"}
+        response_key = field.alias.value if field.alias else field.name.value
+        return key, print_ast(field.selection_set), (response_key, batch["key_field"] in selected)
+
+    @staticmethod
+    def batch_call(metadata, batch, keys, extra):
+        # Il campo chiave può comparire due volte nella selezione: GraphQL unisce i campi uguali
+        selection = "{ %s %s }" % (batch["key_field"], extra.strip()[1:-1].strip())
+        query = f"query {{ {batch['operation_name']}({batch['param']}: {json.dumps(keys)}) {selection} }}"
+        return {"tool_metadata": {**metadata, "name": batch["operation"]}, "payload": {"query": query, "variables": {}}}
+
+    @staticmethod
+    def items(data, batch):
+        return (data or {}).get(batch["operation_name"], []) if isinstance(data, dict) else []
+
+    @staticmethod
+    def result(item, info, batch):
+        response_key, key_selected = info
+        if not key_selected:
+            item = {name: value for name, value in item.items() if name != batch["key_field"]}
+        return {response_key: item}
+
+
+_ADAPTERS = {"rest": _RestAdapter, "grpc": _GrpcAdapter, "graphql": _GraphqlAdapter}
+
+
+class _Lookup:
+    __slots__ = ("tool_call", "key", "info", "expires_at")
+
+    def __init__(self, tool_call, key, info, expires_at):
+        self.tool_call = tool_call
+        self.key = key
+        self.info = info
+        self.expires_at = expires_at
+
+
+def _remaining(expires_at):
+    return max(expires_at - time.monotonic(), _MIN_TIMEOUT)
+
+
+_fallback_pool = None
+_fallback_pool_lock = threading.Lock()
+
+
+def _get_fallback_pool():
+    global _fallback_pool
+    with _fallback_pool_lock:
+        if _fallback_pool is None:
+            _fallback_pool = ThreadPoolExecutor(max_workers=TOOL_BATCH_MAX_SIZE, thread_name_prefix="batch-fallback")
+        return _fallback_pool
+
+
+class _Batch:
+    """Lookup raccolti per una chiamata batch; `results` è {chiave: ("item", dato) o ("result", esito)}."""
+    def __init__(self, adapter, metadata, batch, extra):
+        self.adapter = adapter
+        self.metadata = {name: value for name, value in metadata.items() if name != "batch"}
+        self.batch = batch
+        self.extra = extra
+        self.lookups = []
+        self.results = {}
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+    def result_for(self, lookup):
+        kind, value = self.results.get(str(lookup.key), ("result", {"success": False, "error": "Chiamata batch non eseguita"}))
+        if kind == "item":
+            return {"success": True, "data": self.adapter.result(value, lookup.info, self.batch)}
+        # Copia: execute_tool riscrive result["data"] con i campi estratti
+        return dict(value)
+
+
+class RequestBatcher:
+    """Raccoglie i lookup concorrenti per variante batch e li esegue con una sola chiamata."""
+    def __init__(self, window_ms=TOOL_BATCH_WINDOW_MS, max_size=TOOL_BATCH_MAX_SIZE):
+        self.window = window_ms / 1000
+        self.max_size = max_size
+        self._open = {}
+        self._lock = threading.Lock()
+
+    def execute(self, tool_call, timeout, call):
+        """Esegue `tool_call` con `call(tool_call, timeout)`, unendolo ai lookup concorrenti se possibile."""
+        metadata = tool_call.get("tool_metadata", {})
+        batch = metadata.get("batch")
+        adapter = _ADAPTERS.get(metadata.get("type"))
+        request = adapter.lookup(tool_call, batch) if batch and adapter else None
+        if request is None:
+            return call(tool_call, timeout)
+        key, extra, info = request
+        lookup = _Lookup(tool_call, key, info, time.monotonic() + timeout)
+        group = json.dumps([metadata.get("type"), metadata.get("base_url") or metadata.get("service"),
+                            batch.get("operation"), extra])
+
+        with self._lock:
+            pending = self._open.get(group)
+            leader = pending is None
+            if leader:
+                pending = self._open[group] = _Batch(adapter, metadata, batch, extra)
+            pending.lookups.append(lookup)
+            if len(pending.lookups) >= self.max_size:
+                self._open.pop(group, None)
+                pending.full.set()
+
+        if not leader:
+            if pending.done.wait(timeout + self.window):
+                return pending.result_for(lookup)
+            # Il leader non ha finito in tempo: la chiamata singola, con il tempo che resta
+            print(f"   ⚠️ Chiamata batch {batch.get('operation')} in ritardo: lookup singolo per {key}.")
+            return call(tool_call, _remaining(lookup.expires_at))
+
+        pending.full.wait(self.window)
+        with self._lock:
+            if self._open.get(group) is pending:
+                del self._open[group]
+        try:
+            self._run(pending, call)
+        finally:
+            pending.done.set()
+        return pending.result_for(lookup)
+
+    @staticmethod
+    def _run(pending, call):
+        first_call, expires_at = {}, {}
+        for lookup in pending.lookups:
+            key = str(lookup.key)
+            first_call.setdefault(key, lookup)
+            expires_at[key] = min(expires_at.get(key, lookup.expires_at), lookup.expires_at)
+        if len(first_call) == 1:
+            # Una sola chiave (anche se richiesta più volte): la chiamata singola originale
+            key, lookup = next(iter(first_call.items()))
+            pending.results[key] = ("result", call(lookup.tool_call, _remaining(expires_at[key])))
+            return
+
+        batch = pending.batch
+        operation = batch.get("operation")
+        keys = [lookup.key for lookup in first_call.values()]
+        print(f"   📦 [BATCH] {len(pending.lookups)} lookup uniti in una chiamata {operation} ({len(keys)} chiavi).")
+        METRICS.inc("agent_tool_batches_total", operation=operation)
+        METRICS.inc("agent_tool_batched_lookups_total", len(pending.lookups), operation=operation)
+        # La chiamata batch deve rispondere entro il timeout del lookup più stretto
+        result = call(pending.adapter.batch_call(pending.metadata, batch, keys, pending.extra),
+                      _remaining(min(expires_at.values())))
+
+        if result.get("success"):
+            for item in pending.adapter.items(result.get("data"), batch):
+                if isinstance(item, dict) and str(item.get(batch["key_field"])) in first_call:
+                    pending.results.setdefault(str(item.get(batch["key_field"])), ("item", item))
+        elif result.get("backend_error"):
+            for key in first_call:
+                pending.results[key] = ("result", result)
+            return
+        else:
+            print(f"   ⚠️ Chiamata batch {operation} fallita ({result.get('error')}): torno ai lookup singoli.")
+
+        # Chiavi senza risultato: il lookup singolo restituisce l'errore (o il null) originale.
+        # Le chiamate partono insieme, ognuna con il timeout del suo lookup.
+        missing = [(key, lookup) for key, lookup in first_call.items() if key not in pending.results]
+        if len(missing) == 1:
+            key, lookup = missing[0]
+            pending.results[key] = ("result", call(lookup.tool_call, _remaining(expires_at[key])))
+            return
+        pool = _get_fallback_pool()
+        futures = {key: pool.submit(call, lookup.tool_call, _remaining(expires_at[key])) for key, lookup in missing}
+        for key, future in futures.items():
+            try:
+                pending.results[key] = ("result", future.result())
+            except Exception as e:
+                pending.results[key] = ("result", {"success": False, "error": f"Errore del lookup singolo: {e}"})
+
+
+BATCHER = RequestBatcher()
@@ -1,41 +1,72 @@
-import grpc
-import agent.tools.user_service_pb2 as user_service_pb2
-import agent.tools.user_service_pb2_grpc as user_service_pb2_grpc
-import requests
+import os
 import json
-from google.protobuf.json_format import MessageToDict
+import time
+from urllib.parse import urlsplit
 
+from agent.core.circuit_breaker import BREAKERS, BREAKER_ENABLED
+from agent.core.deadline import TOOL_CALL_TIMEOUT, budget_exhausted, call_timeout
 from agent.core.field_extractor import FieldExtractor
+from agent.tools.batching import BATCHER, TOOL_BATCHING
+from agent.tools.pagination import plan_pagination
+from agent.core.tracing import span, AGENT_TRACE_VERBOSE
+from utils.profiling import profile_stage
+from utils.http import get_http_session
 
-GRPC_REGISTRY = {
-    # Chiave: (nome_servizio, nome_rpc)
-    ("UserService", "GetUser"): {
-        "stub": user_service_pb2_grpc.UserServiceStub,
-        "request_message": user_service_pb2.GetUserRequest,
-    }
-    # Esempio: se avessi un OrderService, aggiungeresti una nuova voce qui
-    # ("OrderService", "GetOrder"): {
-    #     "stub": order_service_pb2_grpc.OrderServiceStub,
-    #     "request_message": order_service_pb2.GetOrderRequest,
-    # }
-}
-
-def execute_tool(tool_call, context=None):
+GRAPHQL_URL = os.getenv("GRAPHQL_URL", "http://graphql_server:8000/graphql")
+GRPC_TARGET = os.getenv("GRPC_TARGET", "grpc_server:50051")
+
+
+def backend_key(metadata):
+    """Backend raggiunto da uno strumento: origine del base_url REST, endpoint GraphQL o target gRPC."""
+    api_type = metadata.get("type")
+    if api_type == "grpc":
+        return f"grpc://{GRPC_TARGET}"
+    url = GRAPHQL_URL if api_type == "graphql" else metadata.get("base_url") or ""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}" if parts.netloc else url or "sconosciuto"
+
+
+def _is_backend_status(status_code):
+    """Risposte che indicano un backend in difficoltà (non un errore della richiesta)."""
+    return status_code >= 500 or status_code == 429
+
+
+def execute_tool(tool_call, context=None, deadline=None):
     metadata = tool_call.get("tool_metadata", {})
     api_type = metadata.get("type")
 
     if not api_type:
         return {"success": False, "error": f"Tipo di API mancante nei metadati: {metadata}"}
+    if budget_exhausted(deadline):
+        return {"success": False, "error": "Tempo a disposizione esaurito prima della chiamata.", "deadline_exceeded": True}
+    # Il timeout della chiamata è il budget rimasto alla richiesta
+    timeout = call_timeout(deadline, TOOL_CALL_TIMEOUT)
 
-    print(f"⚙️ Esecuzione dello strumento di tipo '{api_type}'...")
-    if api_type == "grpc": 
-        result = execute_grpc_call(tool_call)
-    elif api_type == "graphql": 
-        result = execute_graphql_call(tool_call)
-    elif api_type == "rest": 
-        result = execute_rest_call(tool_call)
-    else: 
+    if api_type not in ("grpc", "graphql", "rest"):
         return {"success": False, "error": f"Tipo di API sconosciuto: {api_type}"}
+
+    # Backend fuori servizio: falliamo subito, senza rete né tentativi di recupero
+    backend = backend_key(metadata)
+    breaker = BREAKERS.get(backend) if BREAKER_ENABLED else None
+    permit = breaker.allow() if breaker is not None else None
+    if breaker is not None and permit is None:
+        return {"success": False, "backend_unavailable": True,
+                "error": f"Backend {backend} non disponibile (circuit breaker aperto, "
+                         f"nuova prova tra {breaker.retry_in():.1f}s)"}
+
+    print(f"⚙️ Esecuzione dello strumento di tipo '{api_type}'...")
+    start = time.perf_counter()
+    result = None
+    with span("tool_call", api_type=api_type, tool=metadata.get("name"), backend=backend) as call:
+        try:
+            # I lookup singoli con una variante batch nel catalogo possono essere uniti a quelli concorrenti
+            result = BATCHER.execute(tool_call, timeout, _call_api) if TOOL_BATCHING else _call_api(tool_call, timeout)
+        finally:
+            if breaker is not None:
+                # Contano solo gli errori del backend: un 4xx vuol dire che il server risponde
+                failed = result is None or (not result.get("success") and bool(result.get("backend_error")))
+                breaker.record(failed, time.perf_counter() - start, permit)
+        call.set(success=bool(result.get("success")))
     
     # NUOVA PARTE: Applica field extraction se richiesta
     if result.get("success") and tool_call.get("extract_fields"):
@@ -43,10 +74,11 @@ def execute_tool(tool_call, context=None):
         try:
             filtered_data = FieldExtractor.extract(original_data, tool_call["extract_fields"])
             
-            # Log per debug
-            original_size = len(json.dumps(original_data))
-            filtered_size = len(json.dumps(filtered_data))
-            print(f"   📉 Dati filtrati: {original_size} → {filtered_size} bytes ({filtered_size/original_size*100:.1f}%)")
+            # Log per debug: serializzare i payload costa, lo facciamo solo in modalità verbosa
+            if AGENT_TRACE_VERBOSE:
+                original_size = len(json.dumps(original_data))
+                filtered_size = len(json.dumps(filtered_data))
+                print(f"   📉 Dati filtrati: {original_size} → {filtered_size} bytes ({filtered_size/original_size*100:.1f}%)")
             
             result["data"] = filtered_data
         except Exception as e:
@@ -57,52 +89,27 @@ def execute_tool(tool_call, context=None):
         result["data"], 
         context.get("current_task"),
         context.get("user_query"),
-        context.get("full_plan"),
-        "gemini-2.5-flash"
+        context.get("full_plan")
     )
     
     return result
 
-def execute_grpc_call(tool_call):
-    """Esegue una chiamata a un server gRPC in modo generico usando il registro."""
-    metadata = tool_call.get("tool_metadata", {})
-    payload = tool_call.get("payload", {})
-    service_name = metadata.get("service")
-    rpc_name = metadata.get("rpc")
-    
-    key = (service_name, rpc_name)
-    if key not in GRPC_REGISTRY:
-        return {"success": False, "error": f"Chiamata gRPC non registrata: {service_name}.{rpc_name}"}
-
-    config = GRPC_REGISTRY[key]
-    StubClass = config["stub"]
-    RequestMessageClass = config["request_message"]
+def _call_api(tool_call, timeout):
+    api_type = tool_call["tool_metadata"]["type"]
+    if api_type == "grpc":
+        return execute_grpc_call(tool_call, timeout)
+    if api_type == "graphql":
+        return execute_graphql_call(tool_call, timeout)
+    return execute_rest_call(tool_call, timeout)
 
-    channel = grpc.insecure_channel('grpc_server:50051')
-    
-    try:
-        stub_instance = StubClass(channel)
-        request_instance = RequestMessageClass(**payload)
-        rpc_method_to_call = getattr(stub_instance, rpc_name)
 
-        print(f"  -> Esecuzione gRPC: {service_name}.{rpc_name}")
-        print(f"     Request: {request_instance}")
+def execute_grpc_call(tool_call, timeout=TOOL_CALL_TIMEOUT):
+    # grpc e protobuf si caricano alla prima chiamata gRPC, non all'avvio dell'agente
+    from .grpc_executor import execute_grpc_call as grpc_call
+    return grpc_call(tool_call, timeout)
 
-        response = rpc_method_to_call(request_instance)
-        
-        response_dict = MessageToDict(response, preserving_proto_field_name=True)
-        
-        return {"success": True, "data": response_dict}
 
-    except grpc.RpcError as e:
-        return {"success": False, "error": f"Errore gRPC: {e.details()}"}
-    except TypeError as e:
-        return {"success": False, "error": f"Errore nel payload della richiesta: {e}"}
-    except Exception as e:
-        return {"success": False, "error": f"Errore imprevisto gRPC: {str(e)}"}
-
-
-def execute_graphql_call(tool_call):
+def execute_graphql_call(tool_call, timeout=TOOL_CALL_TIMEOUT):
     """
     Esegue una chiamata GraphQL generica.
     Si aspetta che il payload contenga 'query' e 'variables'.
@@ -116,29 +123,39 @@ def execute_graphql_call(tool_call):
     if not query_string:
         return {"success": False, "error": "Payload per GraphQL non conteneva una 'query'."}
 
+    import requests
+
     # L'URL del nostro server GraphQL in Docker
-    url = "http://graphql_server:8000/graphql"
+    url = GRAPHQL_URL
     print(f"  -> Esecuzione GraphQL su {url}")
     print(f"     Query: {query_string.strip()}")
     print(f"     Variables: {variables}")
 
     try:
         json_payload = {"query": query_string, "variables": variables}
-        response = requests.post(url, json=json_payload)
+        with profile_stage("rete.graphql"):
+            response = get_http_session().post(url, json=json_payload, timeout=timeout)
         response.raise_for_status()
 
-        response_data = response.json()
+        with profile_stage("decodifica.json"):
+            response_data = response.json()
         if "errors" in response_data:
             return {"success": False, "error": f"Errore GraphQL: {response_data['errors']}"}
         else:
             return {"success": True, "data": response_data.get("data")}
 
+    except requests.exceptions.HTTPError as e:
+        return {"success": False, "error": f"Errore di connessione HTTP: {e}",
+                "backend_error": _is_backend_status(e.response.status_code)}
+    except requests.exceptions.Timeout:
+        return {"success": False, "error": f"Timeout della chiamata GraphQL dopo {timeout:.1f}s",
+                "backend_error": timeout >= TOOL_CALL_TIMEOUT}
     except requests.exceptions.RequestException as e:
-        return {"success": False, "error": f"Errore di connessione HTTP: {e}"}
+        return {"success": False, "error": f"Errore di connessione HTTP: {e}", "backend_error": True}
     except Exception as e:
         return {"success": False, "error": f"Errore imprevisto: {str(e)}"}
 
-def execute_rest_call(tool_call):
+def execute_rest_call(tool_call, timeout=TOOL_CALL_TIMEOUT):
     """
     Esegue una chiamata a un'API REST, gestendo correttamente 
     i parametri nel path, nella query string e nel body.
@@ -174,6 +191,7 @@ def execute_rest_call(tool_call):
         print(f"  ❌ Payload completo ricevuto: {payload}")
         return {"success": False, "error": f"Parametro mancante nel payload per il path: {e}"}
 
+    import requests
     url = f"{base_url}{final_path}"
     print(f"  -> Esecuzione {method} su URL: {url}")
     if query_params:
@@ -181,20 +199,36 @@ def execute_rest_call(tool_call):
     if body_payload:
         print(f"     Body: {body_payload}")
 
+    # Liste paginate: pagine lette una alla volta finché servono elementi
+    pagination = plan_pagination(metadata, method, query_params, tool_call.get("max_items"))
+
     try:
-        response = requests.request(
-            method, 
-            url, 
-            params=query_params or None,
-            json=body_payload or None
-        )
+        if pagination is not None:
+            return pagination.read(get_http_session(), url, timeout)
+
+        with profile_stage("rete.rest"):
+            response = get_http_session().request(
+                method, 
+                url, 
+                params=query_params or None,
+                json=body_payload or None,
+                timeout=timeout,
+            )
         response.raise_for_status()
         
         if response.status_code == 204:
             return {"success": True, "data": "Operazione completata con successo (No Content)."}
         
-        return {"success": True, "data": response.json()}
+        with profile_stage("decodifica.json"):
+            data = response.json()
+        return {"success": True, "data": data}
     except requests.exceptions.HTTPError as e:
-        return {"success": False, "error": f"Errore HTTP: {e.response.status_code}", "data": e.response.text}
+        return {"success": False, "error": f"Errore HTTP: {e.response.status_code}", "data": e.response.text,
+                "backend_error": _is_backend_status(e.response.status_code)}
+    except requests.exceptions.Timeout:
+        return {"success": False, "error": f"Timeout della chiamata REST dopo {timeout:.1f}s",
+                "backend_error": timeout >= TOOL_CALL_TIMEOUT}
+    except requests.exceptions.ConnectionError as e:
+        return {"success": False, "error": f"Errore imprevisto durante la chiamata REST: {str(e)}", "backend_error": True}
     except Exception as e:
         return {"success": False, "error": f"Errore imprevisto durante la chiamata REST: {str(e)}"}
\ No newline at end of file
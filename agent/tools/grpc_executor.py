@@ -0,0 +1,123 @@
+# FILE: agent/tools/grpc_executor.py
+# Macchinario gRPC degli executor: importato solo alla prima chiamata di uno strumento gRPC,
+# così grpc e protobuf non pesano sull'avvio dell'agente.
+import os
+import threading
+
+import grpc
+from google.protobuf import json_format
+from google.protobuf.json_format import MessageToDict
+
+from agent.core.deadline import TOOL_CALL_TIMEOUT
+from agent.tools.executors import GRPC_TARGET
+from utils.profiling import profile_stage
+from utils.proto_descriptors import ProtoRegistry, GRPC_CONTRACTS_DIR
+
+# 1 = descrittori dalla server reflection di GRPC_TARGET invece che da contracts/*.proto
+GRPC_USE_REFLECTION = os.getenv("GRPC_USE_REFLECTION", "0") == "1"
+
+# Codici che indicano un server in difficoltà, contati dal circuit breaker del target
+_BACKEND_ERROR_CODES = {grpc.StatusCode.UNAVAILABLE, grpc.StatusCode.RESOURCE_EXHAUSTED, grpc.StatusCode.INTERNAL}
+
+_grpc_channels = {}
+_grpc_channels_lock = threading.Lock()
+
+def get_grpc_channel(target):
+    """Canale gRPC condiviso per target: i canali sono thread-safe e multiplexano le chiamate."""
+    channel = _grpc_channels.get(target)
+    if channel is None:
+        with _grpc_channels_lock:
+            channel = _grpc_channels.get(target)
+            if channel is None:
+                channel = _grpc_channels[target] = grpc.insecure_channel(target)
+    return channel
+
+_proto_registry = None
+_proto_registry_lock = threading.Lock()
+_grpc_methods = {}
+
+def get_proto_registry():
+    """Descrittori dei servizi gRPC, caricati una sola volta per processo."""
+    global _proto_registry
+    if _proto_registry is None:
+        with _proto_registry_lock:
+            if _proto_registry is None:
+                if GRPC_USE_REFLECTION:
+                    _proto_registry = ProtoRegistry.from_reflection(get_grpc_channel(GRPC_TARGET))
+                else:
+                    _proto_registry = ProtoRegistry.from_directory(GRPC_CONTRACTS_DIR)
+    return _proto_registry
+
+def get_grpc_method(target, service_name, rpc_name):
+    """
+    (callable unary, classe del messaggio di richiesta) per un metodo, o None se non esiste.
+    Il callable è creato una volta sola e riusato: nessun costo di lookup per chiamata.
+    """
+    key = (target, service_name, rpc_name)
+    handle = _grpc_methods.get(key)
+    if handle is None:
+        registry = get_proto_registry()
+        method = registry.find_method(service_name, rpc_name)
+        if method is None or getattr(method, "client_streaming", False) or getattr(method, "server_streaming", False):
+            return None
+        request_class = registry.message_class(method.input_type)
+        response_class = registry.message_class(method.output_type)
+        callable_ = get_grpc_channel(target).unary_unary(
+            f"/{method.containing_service.full_name}/{method.name}",
+            request_serializer=request_class.SerializeToString,
+            response_deserializer=response_class.FromString,
+        )
+        handle = _grpc_methods[key] = (callable_, request_class)
+    return handle
+
+def execute_grpc_call(tool_call, timeout=TOOL_CALL_TIMEOUT):
+    """Esegue una chiamata unaria a un server gRPC usando i descrittori caricati a runtime."""
+    metadata = tool_call.get("tool_metadata", {})
+    payload = tool_call.get("payload", {})
+    service_name = metadata.get("service")
+    rpc_name = metadata.get("rpc")
+    
+    try:
+        handle = get_grpc_method(GRPC_TARGET, service_name, rpc_name)
+    except Exception as e:
+        return {"success": False, "error": f"Impossibile caricare i descrittori gRPC: {e}"}
+    if handle is None:
+        return {"success": False, "error": f"Metodo gRPC unario non trovato nei contratti: {service_name}.{rpc_name}"}
+    rpc_method_to_call, RequestMessageClass = handle
+    
+    try:
+        # ParseDict converte i tipi come il mapping JSON di protobuf (es. "1" -> int32)
+        request_instance = json_format.ParseDict(payload, RequestMessageClass())
+
+        print(f"  -> Esecuzione gRPC: {service_name}.{rpc_name}")
+        print(f"     Request: {request_instance}")
+
+        with profile_stage("rete.grpc"):
+            response = rpc_method_to_call(request_instance, timeout=timeout)
+        
+        with profile_stage("decodifica.grpc"):
+            response_dict = MessageToDict(response, preserving_proto_field_name=True)
+        
+        return {"success": True, "data": response_dict}
+
+    except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.DEADLINE_EXCEEDED:
+            return {"success": False, "error": f"Timeout della chiamata gRPC dopo {timeout:.1f}s",
+                "backend_error": timeout >= TOOL_CALL_TIMEOUT}
+        return {"success": False, "error": f"Errore gRPC: {e.details()}", "backend_error": e.code() in _BACKEND_ERROR_CODES}
+    except (json_format.ParseError, TypeError) as e:
+        return {"success": False, "error": f"Errore nel payload della richiesta: {e}"}
+    except Exception as e:
+        return {"success": False, "error": f"Errore imprevisto gRPC: {str(e)}"}
+
+
+def warm_up(methods=(), timeout=5.0):
+    """
+    Carica i descrittori, apre il canale verso GRPC_TARGET e attende che sia connesso;
+    crea in anticipo i callable dei metodi `methods` (coppie servizio, rpc).
+    """
+    get_proto_registry()
+    grpc.channel_ready_future(get_grpc_channel(GRPC_TARGET)).result(timeout=timeout)
+    for service_name, rpc_name in methods:
+        get_grpc_method(GRPC_TARGET, service_name, rpc_name)
+    return GRPC_TARGET
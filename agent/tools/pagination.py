@@ -0,0 +1,221 @@
+# FILE: agent/tools/pagination.py
+"""
+Lettura paginata delle liste REST, con prefetch della pagina successiva e arresto anticipato.
+
+Il catalogo dichiara la paginazione di un'operazione GET in metadata["pagination"]
+(estensione x-pagination della specifica OpenAPI, oppure parametri riconosciuti dall'indexer:
+limit/offset, page/per_page, cursor). L'header Link rel="next", se c'è, ha la precedenza.
+
+- appena arrivano gli header della pagina k parte la richiesta della k+1, mentre il corpo
+  della k viene scaricato e decodificato (per i cursori nel corpo, subito dopo la decodifica);
+- la lettura si ferma appena ha gli elementi che servono allo step (max_items della chiamata,
+  o il limit del payload: "i 5 ordini più recenti" non scarica il resto della collezione);
+- senza un limite si leggono al più REST_MAX_ITEMS elementi e il risultato lo segnala;
+- se il payload chiede già una pagina precisa (offset, cursor, page) la chiamata resta singola.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from agent.core.tracing import METRICS
+from utils.profiling import profile_stage
+
+REST_PAGINATION = os.getenv("REST_PAGINATION", "1") == "1"
+REST_PAGE_SIZE = int(os.getenv("REST_PAGE_SIZE", "100"))
+REST_MAX_ITEMS = int(os.getenv("REST_MAX_ITEMS", "1000"))
+REST_MAX_PAGES = int(os.getenv("REST_MAX_PAGES", "50"))
+REST_PREFETCH_WORKERS = int(os.getenv("REST_PREFETCH_WORKERS", "16"))
+
+# Campi che di solito contengono gli elementi (o il cursore) nelle risposte "a busta"
+_ITEM_FIELDS = ("items", "data", "results")
+_CURSOR_FIELDS = ("next_cursor", "nextCursor", "next_page_token", "nextPageToken", "cursor")
+# Il cursore della pagina successiva si conosce solo dopo aver decodificato il corpo
+_FROM_BODY = object()
+
+_prefetch_pool = None
+_prefetch_pool_lock = threading.Lock()
+
+
+def _get_prefetch_pool():
+    global _prefetch_pool
+    with _prefetch_pool_lock:
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=REST_PREFETCH_WORKERS, thread_name_prefix="rest-prefetch")
+        return _prefetch_pool
+
+
+def _positive_int(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value > 0 else None
+
+
+def _dotted(body, path):
+    for part in path.split("."):
+        body = body.get(part) if isinstance(body, dict) else None
+    return body
+
+
+def _fetch(session, request, expires_at):
+    """GET di una pagina con il tempo rimasto; il corpo si scarica solo alla decodifica."""
+    import requests
+    url, params = request
+    remaining = expires_at - time.monotonic()
+    if remaining <= 0:
+        raise requests.exceptions.Timeout("Tempo esaurito prima della pagina successiva")
+    response = session.get(url, params=params, timeout=remaining, stream=True)
+    response.raise_for_status()
+    return response
+
+
+def _discard(future):
+    """Prefetch non più necessario: lo annulla o, se è già partito, chiude la risposta."""
+    if not future.cancel():
+        future.add_done_callback(lambda done: done.exception() is None and done.result().close())
+
+
+class PaginatedRead:
+    """Piano di lettura di una lista paginata: convenzione, dimensione delle pagine, elementi da leggere."""
+    def __init__(self, spec, params, wanted, page_size):
+        self.spec = spec
+        self.style = spec.get("style", "offset")
+        self.params = params
+        self.wanted = wanted
+        self.page_size = page_size
+        self.limit = wanted or REST_MAX_ITEMS
+
+    def first_request(self, url):
+        params = dict(self.params)
+        if self.spec.get("limit_param"):
+            params[self.spec["limit_param"]] = self.page_size
+        if self.style == "page":
+            params[self.spec["page_param"]] = self.spec.get("first_page", 1)
+        return url, params
+
+    def _next_from_headers(self, response, request):
+        link = response.links.get("next", {}).get("url")
+        if link:
+            return link, None
+        url, params = request
+        if params is None:
+            # Stiamo seguendo i Link: una pagina senza rel="next" è l'ultima
+            return None
+        if self.style == "cursor":
+            return _FROM_BODY
+        position = self.spec["offset_param"] if self.style == "offset" else self.spec["page_param"]
+        step = self.page_size if self.style == "offset" else 1
+        total = _positive_int(response.headers.get(self.spec.get("total_header", "X-Total-Count")))
+        next_position = int(params.get(position, 0)) + step
+        if self.style == "offset" and total is not None and next_position >= total:
+            return None
+        return url, {**params, position: next_position}
+
+    def _next_from_body(self, body, request):
+        field = self.spec.get("next_cursor_field")
+        fields = [field] if field else _CURSOR_FIELDS
+        cursor = next((_dotted(body, name) for name in fields if _dotted(body, name)), None)
+        if not cursor:
+            return None
+        url, params = request
+        return url, {**params, self.spec["cursor_param"]: cursor}
+
+    def _items(self, body):
+        field = self.spec.get("items_field")
+        if field:
+            items = _dotted(body, field)
+            return items if isinstance(items, list) else None
+        if isinstance(body, list):
+            return body
+        if isinstance(body, dict):
+            return next((body[name] for name in _ITEM_FIELDS if isinstance(body.get(name), list)), None)
+        return None
+
+    def read(self, session, url, timeout):
+        """
+        Legge le pagine finché servono elementi, prefetchando la successiva. Gli errori della
+        prima pagina si propagano come per una chiamata singola; quelli delle successive
+        chiudono la lettura con gli elementi già raccolti.
+        """
+        expires_at = time.monotonic() + timeout
+        request, prefetched = self.first_request(url), None
+        items, pages, error, next_request, total = [], 0, None, None, None
+        while request is not None:
+            try:
+                with profile_stage("rete.rest"):
+                    response = prefetched.result() if prefetched is not None else _fetch(session, request, expires_at)
+            except Exception as e:
+                if not pages:
+                    raise
+                error = str(e)
+                break
+            prefetched = None
+            pages += 1
+            total = _positive_int(response.headers.get(self.spec.get("total_header", "X-Total-Count"))) or total
+
+            next_request = self._next_from_headers(response, request)
+            # Se questa pagina (piena) non basta, la successiva parte mentre decodifichiamo questa
+            if (next_request not in (None, _FROM_BODY) and len(items) + self.page_size < self.limit
+                    and pages < REST_MAX_PAGES):
+                prefetched = _get_prefetch_pool().submit(_fetch, session, next_request, expires_at)
+
+            with profile_stage("decodifica.json"):
+                body = response.json()
+            page_items = self._items(body)
+            if page_items is None:
+                # Non è una lista: la risposta vale come quella di una chiamata singola
+                if prefetched is not None:
+                    _discard(prefetched)
+                    prefetched = None
+                if pages == 1:
+                    return {"success": True, "data": body}
+                break
+
+            items.extend(page_items[:self.limit - len(items)])
+            if next_request is _FROM_BODY:
+                next_request = self._next_from_body(body, request)
+            elif (next_request is not None and request[1] is not None and self.spec.get("limit_param")
+                    and len(page_items) < self.page_size):
+                # Pagina corta senza Link: la collezione è finita
+                next_request = None
+            if not page_items or len(items) >= self.limit or pages >= REST_MAX_PAGES:
+                break
+            request = next_request
+
+        if prefetched is not None:
+            _discard(prefetched)
+        more = next_request is not None and error is None
+        info = {"pages": pages, "items": len(items), "complete": not more and error is None}
+        if more:
+            info["stopped_early" if self.wanted and len(items) >= self.wanted else "truncated"] = True
+        if total is not None:
+            info["total"] = total
+        if error:
+            info["error"] = error
+        METRICS.inc("agent_rest_pages_total", pages)
+        if more:
+            METRICS.inc("agent_rest_early_stops_total", reason="stopped_early" if "stopped_early" in info else "truncated")
+        note = " (arresto anticipato)" if info.get("stopped_early") else " (troncata)" if not info["complete"] else ""
+        print(f"   📄 [PAGINAZIONE] {pages} pagine lette, {len(items)} elementi{note}.")
+        return {"success": True, "data": items, "pagination": info}
+
+
+def plan_pagination(metadata, method, query_params, max_items=None):
+    """
+    Piano di lettura paginata per una chiamata REST, o None se va eseguita come chiamata singola.
+    Gli elementi da leggere sono `max_items` (scelto dall'operativo) o il limit del payload.
+    """
+    spec = metadata.get("pagination")
+    if not REST_PAGINATION or not isinstance(spec, dict) or method != "GET":
+        return None
+    if any(spec.get(name) in query_params for name in ("offset_param", "cursor_param", "page_param") if spec.get(name)):
+        return None
+    limit_param = spec.get("limit_param")
+    requested = _positive_int(query_params.get(limit_param)) if limit_param else None
+    wanted = _positive_int(max_items) or requested
+    page_size = requested or min(REST_PAGE_SIZE, wanted or REST_PAGE_SIZE)
+    if spec.get("max_page_size"):
+        page_size = min(page_size, int(spec["max_page_size"]))
+    return PaginatedRead(spec, query_params, wanted, page_size)
@@ -1,102 +0,0 @@
-# Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
-"""Client and server classes corresponding to protobuf-defined services."""
-import grpc
-import warnings
-
-import agent.tools.user_service_pb2 as user__service__pb2
-
-GRPC_GENERATED_VERSION = '1.73.1'
-GRPC_VERSION = grpc.__version__
-_version_not_supported = False
-
-try:
-    from grpc._utilities import first_version_is_lower
-    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
-except ImportError:
-    _version_not_supported = True
-
-if _version_not_supported:
-    raise RuntimeError(
-        f'The grpc package installed is at version {GRPC_VERSION},'
-        + f' but the generated code in user_service_pb2_grpc.py depends on'
-        + f' grpcio>={GRPC_GENERATED_VERSION}.'
-        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
-        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
-    )
-
-
-class UserServiceStub(object):
-    """Il servizio per gestire gli utenti. Utile per recuperare o creare informazioni sugli utenti.
-    """
-
-    def __init__(self, channel):
-        """Constructor.
-
-        Args:
-            channel: A grpc.Channel.
-        """
-        self.GetUser = channel.unary_unary(
-                '/user.UserService/GetUser',
-                request_serializer=user__service__pb2.GetUserRequest.SerializeToString,
-                response_deserializer=user__service__pb2.UserResponse.FromString,
-                _registered_method=True)
-
-
-class UserServiceServicer(object):
-    """Il servizio per gestire gli utenti. Utile per recuperare o creare informazioni sugli utenti.
-    """
-
-    def GetUser(self, request, context):
-        """Recupera un utente specifico dato il suo ID.
-        Usa questa funzione quando ti viene chiesto di trovare un utente specifico.
-        """
-        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
-        context.set_details('Method not implemented!')
-        raise NotImplementedError('Method not implemented!')
-
-
-def add_UserServiceServicer_to_server(servicer, server):
-    rpc_method_handlers = {
-            'GetUser': grpc.unary_unary_rpc_method_handler(
-                    servicer.GetUser,
-                    request_deserializer=user__service__pb2.GetUserRequest.FromString,
-                    response_serializer=user__service__pb2.UserResponse.SerializeToString,
-            ),
-    }
-    generic_handler = grpc.method_handlers_generic_handler(
-            'user.UserService', rpc_method_handlers)
-    server.add_generic_rpc_handlers((generic_handler,))
-    server.add_registered_method_handlers('user.UserService', rpc_method_handlers)
-
-
- # This class is part of an EXPERIMENTAL API.
-class UserService(object):
-    """Il servizio per gestire gli utenti. Utile per recuperare o creare informazioni sugli utenti.
-    """
-
-    @staticmethod
-    def GetUser(request,
-            target,
-            options=(),
-            channel_credentials=None,
-            call_credentials=None,
-            insecure=False,
-            compression=None,
-            wait_for_ready=None,
-            timeout=None,
-            metadata=None):
-        return grpc.experimental.unary_unary(
-            request,
-            target,
-            '/user.UserService/GetUser',
-            user__service__pb2.GetUserRequest.SerializeToString,
-            user__service__pb2.UserResponse.FromString,
-            options,
-            channel_credentials,
-            insecure,
-            call_credentials,
-            compression,
-            wait_for_ready,
-            timeout,
-            metadata,
-            _registered_method=True)
@@ -1,18 +1,6 @@
-def find_most_relevant_functions(user_query_embedding, conn, top_k=5):
-    """Trova le 'top_k' funzioni più rilevanti nel DB usando la ricerca vettoriale."""
-    with conn.cursor() as cur:
-        cur.execute(
-            """
-            SELECT metadata, source_contract 
-            FROM api_functions 
-            ORDER BY embedding <=> %s::vector 
-            LIMIT %s
-            """,
-            (user_query_embedding, top_k)
-        )
-        results = cur.fetchall()
-    return results
+from utils.profiling import profiled
 
+@profiled("resolve_payload_variables")
 def resolve_payload_variables(payload, context_results):
     """Sostituisce le variabili nel payload con i dati dagli step precedenti."""
     if not isinstance(payload, dict):
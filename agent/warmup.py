@@ -0,0 +1,170 @@
+# FILE: agent/warmup.py
+"""
+Riscaldamento del runtime prima della prima richiesta.
+
+Senza riscaldamento la prima query paga connessione al DB, statement da preparare, indice
+del catalogo, canale gRPC, handshake TCP/TLS verso ogni server REST e verso il gateway LLM,
+import di openai ed embedding degli step. Qui tutto questo avviene all'avvio:
+- catalogo: connessioni al DB con gli statement preparati e indice delle funzioni in memoria
+  (indispensabile: si riprova finché il database non risponde);
+- HTTP: una connessione keep-alive nel pool condiviso verso ogni base_url del catalogo,
+  il server GraphQL e il gateway LLM;
+- gRPC: descrittori, canale connesso e callable dei metodi del catalogo;
+- embedding: la cache pre-riempita con le formulazioni di step più comuni.
+Le fasi facoltative che falliscono vengono segnalate ma non bloccano la readiness.
+"""
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from .catalog import DEFAULT_SCOPE
+from .core.llm_api import LLM_GATEWAY_URL
+from .tools.executors import GRAPHQL_URL
+from utils.embeddings import get_embedding
+from utils.http import get_http_session
+
+AGENT_WARMUP = os.getenv("AGENT_WARMUP", "1") == "1"
+AGENT_WARMUP_PHRASES = os.getenv("AGENT_WARMUP_PHRASES", os.path.join(os.path.dirname(__file__), "warmup_phrases.json"))
+AGENT_WARMUP_DB_CONNECTIONS = int(os.getenv("AGENT_WARMUP_DB_CONNECTIONS", "4"))
+# Timeout di ogni endpoint facoltativo e pausa tra i tentativi sul catalogo (secondi)
+AGENT_WARMUP_TIMEOUT = float(os.getenv("AGENT_WARMUP_TIMEOUT", "5"))
+AGENT_WARMUP_RETRY_INTERVAL = float(os.getenv("AGENT_WARMUP_RETRY_INTERVAL", "2"))
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}" if parts.scheme and parts.netloc else None
+
+
+def http_origins(functions_metadata):
+    """Origini (schema://host:porta) da pre-connettere: server REST del catalogo, GraphQL e gateway LLM."""
+    origins = {_origin(metadata.get("base_url") or "") for metadata in functions_metadata if metadata.get("type") == "rest"}
+    if any(metadata.get("type") == "graphql" for metadata in functions_metadata):
+        origins.add(_origin(GRAPHQL_URL))
+    origins.add(_origin(LLM_GATEWAY_URL))
+    origins.discard(None)
+    return sorted(origins)
+
+
+def load_phrases(path=AGENT_WARMUP_PHRASES):
+    try:
+        with open(path) as f:
+            return [phrase for phrase in json.load(f) if isinstance(phrase, str)]
+    except FileNotFoundError:
+        return []
+
+
+class Warmup:
+    """
+    Esegue il riscaldamento in un thread e ne espone lo stato: `ready` è l'evento di
+    readiness, `report()` l'esito e la durata di ogni fase.
+    """
+    def __init__(self, runtime, scope=None):
+        self.runtime = runtime
+        self.scope = scope or DEFAULT_SCOPE
+        self.ready = threading.Event()
+        self.seconds = None
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.run, name="warmup", daemon=True).start()
+        return self
+
+    def run(self):
+        start = time.perf_counter()
+        print("🔥 Riscaldamento del runtime...")
+        metadata = self._stage_until_ok("catalog", self._warm_catalog)
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix="warmup") as pool:
+            stages = [
+                pool.submit(self._stage, "http", self._warm_http, metadata),
+                pool.submit(self._stage, "grpc", self._warm_grpc, metadata),
+                pool.submit(self._stage, "embeddings", self._warm_embeddings),
+            ]
+            for stage in stages:
+                stage.result()
+        self.seconds = time.perf_counter() - start
+        self.ready.set()
+        print(f"🔥 Runtime pronto in {self.seconds:.2f}s: "
+              + ", ".join(f"{name} {stage['status']}" for name, stage in self.report()["stages"].items()))
+
+    def report(self):
+        with self._lock:
+            stages = {name: dict(stage) for name, stage in self._stages.items()}
+        return {"ready": self.ready.is_set(), "seconds": self.seconds, "stages": stages}
+
+    def _record(self, name, **fields):
+        with self._lock:
+            self._stages.setdefault(name, {}).update(fields)
+
+    def _stage(self, name, warm, *args):
+        self._record(name, status="running")
+        start = time.perf_counter()
+        try:
+            result, detail = warm(*args)
+            self._record(name, status="ok", seconds=round(time.perf_counter() - start, 3), detail=detail)
+            return result
+        except Exception as e:
+            self._record(name, status="error", seconds=round(time.perf_counter() - start, 3), detail=str(e))
+            print(f"   ⚠️ Riscaldamento '{name}' fallito: {e}")
+            return None
+
+    def _stage_until_ok(self, name, warm):
+        attempt = 0
+        while True:
+            attempt += 1
+            result = self._stage(name, warm)
+            if self._stages[name]["status"] == "ok":
+                return result
+            self._record(name, attempts=attempt)
+            time.sleep(AGENT_WARMUP_RETRY_INTERVAL)
+
+    def _warm_catalog(self):
+        metadata = self.runtime.catalog.warm_up(self.scope, AGENT_WARMUP_DB_CONNECTIONS)
+        return metadata, f"{len(metadata)} funzioni"
+
+    def _warm_http(self, metadata):
+        origins = http_origins(metadata)
+        session = get_http_session()
+
+        def connect(origin):
+            # Qualunque risposta va bene: conta la connessione che resta nel pool
+            try:
+                session.head(f"{origin}/", timeout=AGENT_WARMUP_TIMEOUT).close()
+                return origin, "ok"
+            except Exception as e:
+                return origin, f"errore: {e.__class__.__name__}"
+
+        with ThreadPoolExecutor(max_workers=max(len(origins), 1)) as pool:
+            results = dict(pool.map(connect, origins))
+        if origins and all(status != "ok" for status in results.values()):
+            raise ConnectionError(f"nessun endpoint raggiungibile: {results}")
+        return None, results
+
+    def _warm_grpc(self, metadata):
+        methods = {(m.get("service"), m.get("rpc")) for m in metadata if m.get("type") == "grpc"}
+        if not methods:
+            return None, "nessuna funzione gRPC nel catalogo"
+        from .tools.grpc_executor import warm_up as warm_grpc
+        target = warm_grpc(sorted(methods), timeout=AGENT_WARMUP_TIMEOUT)
+        return None, f"{target}: {len(methods)} metodi"
+
+    def _warm_embeddings(self):
+        phrases = load_phrases()
+        if not phrases:
+            return None, "nessuna frase"
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            failures = sum(isinstance(result, Exception) for result in pool.map(_try_embedding, phrases))
+        if failures == len(phrases):
+            raise RuntimeError(f"nessun embedding calcolato su {len(phrases)} frasi")
+        return None, f"{len(phrases) - failures}/{len(phrases)} frasi in cache"
+
+
+def _try_embedding(text):
+    try:
+        return get_embedding(text)
+    except Exception as e:
+        return e
@@ -0,0 +1,70 @@
+# FILE: benchmarks/bench_catalog_queries.py
+"""
+Confronta la latenza per query del retrieval sul catalogo:
+- percorso storico: connessione singola, str(embedding) con cast ::vector, due query per step
+  (miglior match + top_k);
+- percorso nuovo: DatabasePool + PgCatalog, statement preparato, vettore float32, una query.
+
+Uso: python -m benchmarks.bench_catalog_queries --iterations 500
+Richiede il database popolato dall'indexer (usa embedding casuali, nessuna chiamata a OpenAI).
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from dotenv import load_dotenv
+
+# Prima degli import dei moduli, che leggono le variabili d'ambiente (DB_*) al caricamento
+load_dotenv()
+
+from agent.catalog import PgCatalog
+from indexer.db_utils import EMBEDDING_DIMENSIONS
+from utils.database import DatabasePool, get_db_connection
+
+
+def legacy_step_retrieval(conn, embedding, top_k):
+    with conn.cursor() as cur:
+        cur.execute("SELECT metadata, embedding <=> %s::vector AS distance FROM api_functions ORDER BY distance LIMIT 1", (str(embedding),))
+        cur.fetchone()
+    with conn.cursor() as cur:
+        cur.execute("SELECT metadata, source_contract FROM api_functions ORDER BY embedding <=> %s::vector LIMIT %s", (embedding, top_k))
+        return cur.fetchall()
+
+
+def measure(label, fn, embeddings):
+    timings = []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        fn(embedding)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    p95 = timings[int(0.95 * (len(timings) - 1))]
+    print(f"{label:<28} media {statistics.mean(timings):7.3f} ms   p50 {statistics.median(timings):7.3f} ms   p95 {p95:7.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    embeddings = [rng.standard_normal(EMBEDDING_DIMENSIONS).tolist() for _ in range(args.iterations)]
+
+    conn = get_db_connection()
+    catalog = PgCatalog(DatabasePool(maxconn=1))
+
+    # Riscaldamento: prima connessione, PREPARE e cache dei piani
+    legacy_step_retrieval(conn, embeddings[0], args.top_k)
+    catalog.search(embeddings[0], args.top_k)
+
+    print(f"--- {args.iterations} query, top_k={args.top_k} ---")
+    measure("legacy (str + 2 query)", lambda e: legacy_step_retrieval(conn, e, args.top_k), embeddings)
+    measure("pool + prepared (1 query)", lambda e: catalog.search(e, args.top_k), embeddings)
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
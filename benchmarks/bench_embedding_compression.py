@@ -0,0 +1,143 @@
+# FILE: benchmarks/bench_embedding_compression.py
+"""
+Recall e memoria delle rappresentazioni compatte degli embedding, con ricerca in due fasi
+(candidati sulla rappresentazione compatta, riordino esatto sui vettori completi).
+
+Per ogni dimensione del catalogo genera embedding sintetici raggruppati in cluster
+(come le descrizioni di API simili) e confronta con la ricerca esatta float32:
+- float16 (halfvec), prime N componenti (Matryoshka), int8 con scala per componente, binario;
+- byte per vettore e memoria totale della rappresentazione compatta;
+- recall@k della sola fase grossolana e dopo il riordino di --candidates candidati;
+- latenza per query (forza bruta in numpy: misura il costo relativo, non quello di HNSW;
+  numpy non ha BLAS per float16 e int8, quindi quelle due righe sono pessimistiche).
+
+Uso: python -m benchmarks.bench_embedding_compression --sizes 10000 100000 1000000
+Con 1M di vettori a 1536 dimensioni servono ~7 GB di RAM: riduci --dimensions o --sizes.
+"""
+import time
+import argparse
+import statistics
+
+import numpy as np
+
+from utils.embeddings import EMBEDDING_DIMENSIONS
+
+
+def synthetic_catalog(size, dimensions, rng, clusters=256, spread=0.35):
+    """
+    Vettori normalizzati attorno a `clusters` centri: più realistici di rumore isotropo.
+    Non sono addestrati come Matryoshka, quindi le righe "troncato" sottostimano gli embedding OpenAI.
+    """
+    centers = rng.standard_normal((clusters, dimensions), dtype=np.float32)
+    vectors = np.empty((size, dimensions), dtype=np.float32)
+    for start in range(0, size, 50_000):
+        stop = min(start + 50_000, size)
+        labels = rng.integers(0, clusters, stop - start)
+        vectors[start:stop] = centers[labels] + spread * rng.standard_normal((stop - start, dimensions), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, centers
+
+
+def queries_near(centers, count, rng, spread=0.45):
+    labels = rng.integers(0, len(centers), count)
+    queries = centers[labels] + spread * rng.standard_normal((count, centers.shape[1]), dtype=np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+class Float16:
+    name = "halfvec (float16)"
+
+    def __init__(self, vectors):
+        self.data = vectors.astype(np.float16)
+
+    def scores(self, query):
+        return self.data @ query.astype(np.float16)
+
+
+class Truncated:
+    def __init__(self, vectors, dimensions):
+        self.name = f"troncato ({dimensions} dim)"
+        self.dimensions = dimensions
+        prefix = vectors[:, :dimensions]
+        self.data = prefix / np.linalg.norm(prefix, axis=1, keepdims=True)
+
+    def scores(self, query):
+        return self.data @ query[:self.dimensions]
+
+
+class Int8:
+    name = "int8 (scala per componente)"
+
+    def __init__(self, vectors):
+        self.scale = np.abs(vectors).max(axis=0) / 127.0
+        self.scale[self.scale == 0] = 1.0
+        self.data = np.round(vectors / self.scale).astype(np.int8)
+
+    def scores(self, query):
+        # Prodotto scalare con la query riscalata: equivale a dequantizzare il catalogo
+        return self.data @ (query * self.scale).astype(np.float32)
+
+
+class Binary:
+    name = "binario (Hamming)"
+
+    def __init__(self, vectors):
+        self.data = np.packbits(vectors > 0, axis=1)
+
+    def scores(self, query):
+        bits = np.packbits(query > 0)
+        return -np.bitwise_count(np.bitwise_xor(self.data, bits)).sum(axis=1, dtype=np.int32)
+
+
+def top_k(scores, k):
+    candidates = np.argpartition(-scores, k)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def evaluate(index, vectors, queries, truth, k, candidates):
+    coarse_recalls, rerank_recalls, timings = [], [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        coarse = top_k(index.scores(query), max(candidates, k))
+        reranked = coarse[top_k(vectors[coarse] @ query, k)]
+        timings.append((time.perf_counter() - start) * 1000)
+        expected = set(expected.tolist())
+        coarse_recalls.append(len(expected & set(coarse[:k].tolist())) / k)
+        rerank_recalls.append(len(expected & set(reranked.tolist())) / k)
+    return statistics.mean(coarse_recalls), statistics.mean(rerank_recalls), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS)
+    parser.add_argument("--truncate", type=int, nargs="+", default=[256, 512])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=100, help="Candidati riordinati con i vettori completi")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    for size in args.sizes:
+        vectors, centers = synthetic_catalog(size, args.dimensions, rng)
+        queries = queries_near(centers, args.queries, rng)
+
+        start = time.perf_counter()
+        truth = [top_k(vectors @ query, args.k) for query in queries]
+        exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        print(f"\n--- {size:,} funzioni, {args.dimensions} dim, recall@{args.k}, riordino di {args.candidates} candidati ---")
+        print(f"   {'rappresentazione':<28}{'byte/vett':>10}{'memoria MB':>12}{'recall grezza':>15}{'recall riordino':>17}{'ms/query':>10}")
+        print(f"   {'float32 (esatta)':<28}{vectors[0].nbytes:>10}{vectors.nbytes / 2**20:>12.1f}{1.0:>15.3f}{1.0:>17.3f}{exact_ms:>10.2f}")
+
+        indexes = [Float16(vectors)] + [Truncated(vectors, d) for d in args.truncate if d < args.dimensions] + [Int8(vectors), Binary(vectors)]
+        for index in indexes:
+            coarse_recall, rerank_recall, latency = evaluate(index, vectors, queries, truth, args.k, args.candidates)
+            bytes_per_vector = index.data[0].nbytes
+            print(f"   {index.name:<28}{bytes_per_vector:>10}{index.data.nbytes / 2**20:>12.1f}{coarse_recall:>15.3f}{rerank_recall:>17.3f}{latency:>10.2f}")
+        # Libera la memoria prima della dimensione successiva
+        del vectors, indexes
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# FILE: benchmarks/bench_namespaces.py
+"""
+Latenza della ricerca filtrata per namespace mentre crescono i tenant estranei.
+
+Aggiunge al catalogo righe sintetiche di tenant "bench-*" a scaglioni (--noise) e a ogni
+scaglione misura PgCatalog.search nello scope di default (AGENT_TENANTS/ENVIRONMENTS/API_TYPES)
+e, per confronto, la stessa query senza filtro. Con il filtro la latenza deve restare piatta:
+l'indice (tenant, environment, api_type) limita la scansione alle righe dello scope.
+Alla fine le righe sintetiche vengono cancellate.
+
+Uso: python -m benchmarks.bench_namespaces --noise 10000 100000
+Richiede il database popolato dall'indexer (usa embedding casuali, nessuna chiamata a OpenAI).
+"""
+import json
+import argparse
+import statistics
+import time
+
+import numpy as np
+from psycopg2.extras import execute_values
+
+from dotenv import load_dotenv
+
+# Prima degli import dei moduli, che leggono le variabili d'ambiente (DB_*) al caricamento
+load_dotenv()
+
+from agent.catalog import PgCatalog, DEFAULT_SCOPE, as_vector
+from utils.database import DatabasePool
+from utils.embeddings import EMBEDDING_DIMENSIONS
+from utils.embedding_storage import nearest_sql
+
+NOISE_TENANT_PREFIX = "bench-"
+_UNFILTERED_STATEMENT = "bench_unfiltered_search"
+_UNFILTERED_SQL = nearest_sql("metadata, source_contract", "$2")
+
+
+def add_noise(pool, count, rng, tenants=50, batch=5_000):
+    """Inserisce `count` funzioni sintetiche distribuite su `tenants` tenant estranei."""
+    def insert(conn):
+        with conn.cursor() as cur:
+            for start in range(0, count, batch):
+                size = min(batch, count - start)
+                vectors = rng.standard_normal((size, EMBEDDING_DIMENSIONS), dtype=np.float32)
+                rows = [
+                    (as_vector(vector), json.dumps({"name": f"noise_{start + i}", "type": "rest"}), "",
+                     f"{NOISE_TENANT_PREFIX}{(start + i) % tenants}", "default", "rest")
+                    for i, vector in enumerate(vectors)
+                ]
+                execute_values(cur, "INSERT INTO api_functions (embedding, metadata, source_contract, tenant, environment, api_type) "
+                                    "VALUES %s", rows)
+        conn.commit()
+    pool.run(insert)
+
+
+def analyze(pool):
+    def run(conn):
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE api_functions")
+        conn.commit()
+    pool.run(run)
+
+
+def remove_noise(pool):
+    def delete(conn):
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM api_functions WHERE tenant LIKE %s", (NOISE_TENANT_PREFIX + "%",))
+            deleted = cur.rowcount
+        conn.commit()
+        return deleted
+    return pool.run(delete)
+
+
+def measure(fn, embeddings):
+    timings = []
+    for embedding in embeddings:
+        start = time.perf_counter()
+        fn(embedding)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(0.95 * (len(timings) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--noise", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Totale cumulativo di funzioni estranee a ogni scaglione")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    embeddings = [rng.standard_normal(EMBEDDING_DIMENSIONS).tolist() for _ in range(args.iterations)]
+    pool = DatabasePool(maxconn=1)
+    catalog = PgCatalog(pool)
+
+    def unfiltered(embedding):
+        def query(conn):
+            pool.ensure_prepared(conn, _UNFILTERED_STATEMENT, _UNFILTERED_SQL)
+            with conn.cursor() as cur:
+                cur.execute(f"EXECUTE {_UNFILTERED_STATEMENT} (%s, %s)", (as_vector(embedding), args.top_k))
+                return cur.fetchall()
+        return pool.run(query)
+
+    print(f"--- scope {DEFAULT_SCOPE.to_dict()}, {args.iterations} query, top_k={args.top_k} ---")
+    print(f"   {'funzioni estranee':>18}{'filtrata p50':>14}{'p95':>9}{'senza filtro p50':>18}{'p95':>9}")
+    inserted = 0
+    try:
+        for total in [0] + sorted(args.noise):
+            if total > inserted:
+                add_noise(pool, total - inserted, rng)
+                inserted = total
+                analyze(pool)
+            # Riscaldamento: PREPARE e piani dopo l'ANALYZE
+            catalog.search(embeddings[0], args.top_k)
+            unfiltered(embeddings[0])
+            filtered = measure(lambda e: catalog.search(e, args.top_k), embeddings)
+            plain = measure(unfiltered, embeddings)
+            print(f"   {total:>18,}{filtered[0]:>11.3f} ms{filtered[1]:>6.3f} ms{plain[0]:>15.3f} ms{plain[1]:>6.3f} ms")
+    finally:
+        print(f"\n🧹 Rimosse {remove_noise(pool)} funzioni sintetiche.")
+        pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# FILE: benchmarks/bench_servers.py
+"""
+Load test dei server demo REST (ordini, geocoding, recensioni) con dati sintetici.
+
+Avvia i server con DEMO_DATA_ROWS=--rows (o usa quelli già attivi con --no-start) e per
+--duration secondi li interroga da --concurrency thread con un mix di lookup per ID, per
+utente, per prodotto, per indirizzo e pagine della lista completa. Per ogni endpoint riporta
+throughput, errori e latenza p50/p99 lato server (header Server-Timing) e lato client.
+Con un indice la latenza lato server resta piatta al crescere di --rows.
+
+Uso:
+  python -m benchmarks.bench_servers --rows 1000000 --concurrency 16 --duration 20
+  python -m benchmarks.bench_servers --no-start --p99-budget-ms 5
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import threading
+from collections import defaultdict
+
+from .e2e.services import DemoServers
+from servers.demo_data import synthetic_address, synthetic_sizes
+
+ORDERS_URL = os.getenv("BENCH_ORDERS_URL", "http://127.0.0.1:8001")
+GEO_URL = os.getenv("BENCH_GEO_URL", "http://127.0.0.1:8002")
+REVIEWS_URL = os.getenv("BENCH_REVIEWS_URL", "http://127.0.0.1:8003")
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))]
+
+
+def workload(rows):
+    """[(endpoint, peso, funzione rng -> URL)] sui dati sintetici (o su quelli fissi se rows=0)."""
+    sizes = synthetic_sizes(rows)
+
+    def order_id(rng):
+        return f"ord-s{rng.randrange(rows):07d}" if rows else rng.choice(["ord-001", "ord-002"])
+
+    def review_id(rng):
+        return f"rev-s{rng.randrange(rows):07d}" if rows else rng.choice(["rev-01", "rev-02", "rev-03"])
+
+    def address(rng):
+        if rows:
+            return synthetic_address(rng.randrange(sizes["addresses"]))[0]
+        return rng.choice(["Via Roma 1, 10121 Torino TO, Italia", "Piazza Duomo 1, 20121 Milano MI, Italia"])
+
+    return [
+        ("orders/{id}", 3, lambda rng: f"{ORDERS_URL}/orders/{order_id(rng)}"),
+        ("orders?user_id", 2, lambda rng: f"{ORDERS_URL}/orders?user_id={rng.randrange(sizes['users']) + 1}&limit=20"),
+        ("orders?offset", 1, lambda rng: f"{ORDERS_URL}/orders?offset={rng.randrange(max(rows, 1))}&limit=100"),
+        ("geocode", 3, lambda rng: f"{GEO_URL}/geocode?address={address(rng)}"),
+        ("reviews/{id}", 2, lambda rng: f"{REVIEWS_URL}/reviews/{review_id(rng)}"),
+        ("reviews?product_id", 2, lambda rng: f"{REVIEWS_URL}/reviews?product_id={1000 + rng.randrange(sizes['products'])}&limit=20"),
+        ("reviews?user_id", 1, lambda rng: f"{REVIEWS_URL}/reviews?user_id={rng.randrange(sizes['users']) + 1}&limit=20"),
+    ]
+
+
+def _server_ms(response):
+    for metric in response.headers.get("Server-Timing", "").split(","):
+        name, _, params = metric.strip().partition(";")
+        if name == "app" and params.startswith("dur="):
+            return float(params[4:])
+    return None
+
+
+def run_load(rows, concurrency, duration, seed=42):
+    import requests
+
+    endpoints = workload(rows)
+    weights = [weight for _, weight, _ in endpoints]
+    samples = defaultdict(lambda: {"client": [], "server": [], "errors": 0})
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        session = requests.Session()
+        local = defaultdict(lambda: {"client": [], "server": [], "errors": 0})
+        while time.monotonic() < stop_at:
+            name, _, build_url = rng.choices(endpoints, weights)[0]
+            url = build_url(rng)
+            start = time.perf_counter()
+            try:
+                response = session.get(url, timeout=10)
+                ok = response.status_code < 500
+                server_ms = _server_ms(response)
+            except requests.RequestException:
+                ok, server_ms = False, None
+            stats = local[name]
+            stats["client"].append((time.perf_counter() - start) * 1000)
+            if server_ms is not None:
+                stats["server"].append(server_ms)
+            stats["errors"] += not ok
+        with lock:
+            for name, stats in local.items():
+                samples[name]["client"].extend(stats["client"])
+                samples[name]["server"].extend(stats["server"])
+                samples[name]["errors"] += stats["errors"]
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="Righe sintetiche per server (DEMO_DATA_ROWS)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--no-start", action="store_true", help="Usa i server già in esecuzione")
+    parser.add_argument("--startup-timeout", type=float, default=180, help="Con 1M righe la generazione richiede qualche secondo")
+    parser.add_argument("--p99-budget-ms", type=float, help="Esce con codice 1 se il p99 lato server di un endpoint lo supera")
+    args = parser.parse_args()
+
+    if args.no_start:
+        samples, elapsed = run_load(args.rows, args.concurrency, args.duration)
+    else:
+        # I server figli leggono DEMO_DATA_ROWS all'import
+        os.environ["DEMO_DATA_ROWS"] = str(args.rows)
+        with DemoServers(startup_timeout=args.startup_timeout):
+            samples, elapsed = run_load(args.rows, args.concurrency, args.duration)
+
+    total = sum(len(stats["client"]) for stats in samples.values())
+    print(f"\n--- {args.rows:,} righe, {args.concurrency} thread, {elapsed:.1f}s: {total / elapsed:,.0f} req/s ---")
+    print(f"   {'endpoint':<22}{'req/s':>9}{'errori':>8}{'server p50':>12}{'server p99':>12}{'client p50':>12}{'client p99':>12}")
+    over_budget = []
+    for name, stats in sorted(samples.items()):
+        server, client = sorted(stats["server"]), sorted(stats["client"])
+        server_p99 = _percentile(server, 99)
+        print(f"   {name:<22}{len(client) / elapsed:>9,.0f}{stats['errors']:>8}"
+              f"{_percentile(server, 50) or 0:>9.3f} ms{server_p99 or 0:>9.3f} ms"
+              f"{_percentile(client, 50):>9.3f} ms{_percentile(client, 99):>9.3f} ms")
+        if args.p99_budget_ms is not None and server_p99 is not None and server_p99 > args.p99_budget_ms:
+            over_budget.append(f"{name}: {server_p99:.3f} ms")
+    if over_budget:
+        print(f"❌ p99 lato server oltre {args.p99_budget_ms} ms: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
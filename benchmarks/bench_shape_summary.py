@@ -0,0 +1,73 @@
+# FILE: benchmarks/bench_shape_summary.py
+"""
+Riassunto della forma delle risposte per smart_extract: dimensione e coerenza con FieldExtractor.
+
+Per un insieme di risposte tipiche (liste di ordini e recensioni sintetiche, oggetti annidati,
+array di scalari e di array) riporta la dimensione del riassunto rispetto al JSON completo e
+verifica che ogni field path emesso da summarize_response_shape sia risolto da
+FieldExtractor.extract: l'LLM sceglie i path dal riassunto, un path che l'estrattore non
+sa leggere diventa un'estrazione vuota.
+
+Esce con codice 1 se un path non viene risolto.
+
+Uso: python -m benchmarks.bench_shape_summary --rows 1000
+"""
+import sys
+import json
+import argparse
+
+from agent.core.field_extractor import FieldExtractor
+from agent.core.shape_summarizer import summarize_response_shape, format_shape_summary
+from servers.demo_data import synthetic_orders, synthetic_reviews
+
+
+def sample_responses(rows):
+    orders = list(synthetic_orders(rows))
+    reviews = list(synthetic_reviews(rows))
+    return {
+        "ordini (lista)": orders,
+        "recensioni (busta)": {"items": reviews, "next_cursor": "abc"},
+        "oggetto annidato": {
+            "user": {"id": 1, "email": "mario@example.com", "address": {"city": "Torino", "zip": "10121"}},
+            "tags": ["vip", "newsletter"],
+            "scores": [[1, 2], [3]],
+            "orders": [{"id": "ord-001", "items": [{"sku": "A", "qty": 2}], "notes": ["fragile"]}],
+        },
+    }
+
+
+def unresolved_paths(data, summary):
+    """Path del riassunto per cui FieldExtractor non restituisce nulla."""
+    missing = []
+    for field in summary["fields"]:
+        path = field["path"]
+        extracted = FieldExtractor.extract(data, [path])
+        values = extracted if isinstance(extracted, list) else [extracted]
+        if not any(value for value in values):
+            missing.append(path)
+    return missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="Righe sintetiche per le liste di ordini e recensioni")
+    args = parser.parse_args()
+
+    failures = []
+    print(f"   {'risposta':<22}{'JSON':>12}{'riassunto':>12}{'path':>8}{'non risolti':>13}")
+    for name, data in sample_responses(args.rows).items():
+        summary = summarize_response_shape(data)
+        missing = unresolved_paths(data, summary)
+        json_bytes = len(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        summary_bytes = len(format_shape_summary(summary).encode("utf-8"))
+        print(f"   {name:<22}{json_bytes:>10,} B{summary_bytes:>10,} B{len(summary['fields']):>8}{len(missing):>13}")
+        failures.extend(f"{name}: {path}" for path in missing)
+
+    if failures:
+        print(f"❌ Path del riassunto non risolti da FieldExtractor: {', '.join(failures)}")
+        sys.exit(1)
+    print("✅ Tutti i path del riassunto sono risolti da FieldExtractor.")
+
+
+if __name__ == '__main__':
+    main()
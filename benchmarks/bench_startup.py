@@ -0,0 +1,102 @@
+# FILE: benchmarks/bench_startup.py
+"""
+Tempo di avvio dell'agente misurato con `python -X importtime`, con un budget di regressione.
+
+Per ogni modulo (default: agent.main) importa il modulo in un interprete nuovo --runs volte e riporta:
+- tempo cumulativo di import del modulo (mediana) e tempo totale del processo;
+- i pacchetti di terze parti più costosi caricati all'avvio;
+- i moduli che devono restare pigri (openai, grpc, protobuf, graphql, prance, requests, ...)
+  e che invece risultano importati.
+
+Esce con codice 1 se la mediana supera --budget-ms o se un modulo pigro viene caricato
+all'avvio: va lanciato in CI dopo ogni modifica agli import.
+
+Uso: python -m benchmarks.bench_startup --runs 5 --budget-ms 250
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from collections import defaultdict
+
+STARTUP_IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "250"))
+
+# Moduli caricati solo alla prima chiamata che li usa (o in background dopo l'avvio)
+LAZY_MODULES = {
+    "agent.main": ["openai", "grpc", "google.protobuf", "graphql", "prance", "yaml", "requests"],
+    "indexer.parsers": ["graphql", "prance", "yaml"],
+}
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+REPO_ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+
+def import_profile(module):
+    """(righe di -X importtime come (self_us, cumulative_us, nome), secondi di wall clock del processo)."""
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+    rows = []
+    for line in completed.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            rows.append((int(match.group(1)), int(match.group(2)), match.group(4)))
+    return rows, wall
+
+
+def summarize(module, runs, top):
+    cumulative, walls, rows = [], [], []
+    for _ in range(runs):
+        rows, wall = import_profile(module)
+        walls.append(wall * 1000)
+        cumulative.append(next(us for _, us, name in rows if name == module) / 1000)
+
+    # Tempo proprio per pacchetto di primo livello (dell'ultima esecuzione)
+    by_package = defaultdict(int)
+    for self_us, _, name in rows:
+        by_package[name.split(".")[0]] += self_us
+    loaded = {name for _, _, name in rows}
+    eager = [name for name in LAZY_MODULES.get(module, []) if name in loaded]
+    return {
+        "import_ms": statistics.median(cumulative),
+        "process_ms": statistics.median(walls),
+        "packages": sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:top],
+        "eager": eager,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=["agent.main"])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Pacchetti più costosi da mostrare")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_IMPORT_BUDGET_MS,
+                        help="Tempo massimo di import (mediana) prima di segnalare una regressione")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        result = summarize(module, args.runs, args.top)
+        within_budget = result["import_ms"] <= args.budget_ms
+        print(f"\n--- import {module}: {args.runs} esecuzioni ---")
+        print(f"   import {result['import_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)   processo {result['process_ms']:.1f} ms")
+        for package, self_us in result["packages"]:
+            print(f"   {package:<28}{self_us / 1000:>8.1f} ms")
+        if result["eager"]:
+            print(f"❌ Moduli che dovrebbero essere pigri caricati all'avvio: {', '.join(result['eager'])}")
+        if not within_budget:
+            print(f"❌ Avvio oltre il budget: {result['import_ms']:.1f} ms > {args.budget_ms:.0f} ms")
+        if within_budget and not result["eager"]:
+            print("✅ Avvio entro il budget.")
+        failed |= not within_budget or bool(result["eager"])
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
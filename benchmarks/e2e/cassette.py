@@ -0,0 +1,116 @@
+# FILE: benchmarks/e2e/cassette.py
+"""
+Cassette record/replay per call_llm e get_embedding.
+
+In registrazione le chiamate vanno ai servizi reali (gateway Gemini, OpenAI) e le risposte
+vengono salvate; in riproduzione si rileggono dal file, così il benchmark gira offline e
+ogni esecuzione vede esattamente le stesse risposte.
+"""
+import os
+import json
+import hashlib
+import threading
+from collections import defaultdict
+
+from agent.core import llm_api
+from utils import embeddings
+
+
+class CassetteMiss(KeyError):
+    """La cassetta non contiene la risposta richiesta: va registrata di nuovo."""
+
+
+def _key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class Cassette:
+    """
+    Intercetta LLM ed embedding e conta chiamate e byte di prompt per punto di chiamata.
+
+    La chiave delle risposte LLM non include il modello: il router può sceglierne uno
+    diverso tra registrazione e riproduzione senza invalidare la cassetta.
+    """
+    def __init__(self, path, mode="replay"):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Modalità cassetta non valida: {mode}")
+        self.path = path
+        self.mode = mode
+        self.llm = {}
+        self.embeddings = {}
+        self.counters = defaultdict(lambda: {"calls": 0, "prompt_bytes": 0})
+        self._lock = threading.Lock()
+        self._previous = None
+
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.llm = data.get("llm", {})
+            self.embeddings = data.get("embeddings", {})
+        elif mode == "replay":
+            raise FileNotFoundError(f"Cassetta non trovata: {path} (registrala con --mode record)")
+
+    def llm_transport(self, model_name, prompt, is_json_output, call_site, timeout=None):
+        key = _key(call_site, is_json_output, prompt)
+        with self._lock:
+            counter = self.counters[call_site or "sconosciuto"]
+            counter["calls"] += 1
+            counter["prompt_bytes"] += len(prompt.encode("utf-8"))
+            entry = self.llm.get(key)
+
+        if entry is not None:
+            return entry["response"]
+        if self.mode == "replay":
+            raise CassetteMiss(f"Risposta LLM non registrata (call_site={call_site}, prompt={prompt[:80]!r}...)")
+
+        response = self._previous[0](model_name, prompt, is_json_output, call_site, timeout)
+        if response is not None:
+            with self._lock:
+                self.llm[key] = {"call_site": call_site, "model": model_name, "response": response}
+        return response
+
+    def embedding_backend(self, text, model):
+        key = _key(model, text)
+        with self._lock:
+            self.counters["embedding"]["calls"] += 1
+            vector = self.embeddings.get(key)
+
+        if vector is not None:
+            return vector
+        if self.mode == "replay":
+            raise CassetteMiss(f"Embedding non registrato: {text[:80]!r}")
+
+        vector = self._previous[1](text, model)
+        with self._lock:
+            self.embeddings[key] = vector
+        return vector
+
+    def snapshot(self):
+        """Copia dei contatori, da confrontare prima/dopo una query."""
+        with self._lock:
+            return {site: dict(c) for site, c in self.counters.items()}
+
+    def __enter__(self):
+        self._previous = (
+            llm_api.set_llm_transport(self.llm_transport),
+            embeddings.set_embedding_backend(self.embedding_backend),
+        )
+        return self
+
+    def __exit__(self, *exc):
+        llm_api.set_llm_transport(self._previous[0])
+        embeddings.set_embedding_backend(self._previous[1])
+        if self.mode == "record":
+            self.save()
+        return False
+
+    def save(self):
+        with self._lock:
+            data = {"llm": self.llm, "embeddings": self.embeddings}
+        with open(self.path, "w") as f:
+            json.dump(data, f)
+        print(f"📼 Cassetta salvata in {self.path} ({len(self.llm)} risposte LLM, {len(self.embeddings)} embedding)")
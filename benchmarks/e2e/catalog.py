@@ -0,0 +1,72 @@
+# FILE: benchmarks/e2e/catalog.py
+"""Catalogo in memoria con la stessa interfaccia di agent.catalog.PgCatalog."""
+import numpy as np
+
+from agent.catalog import CATALOG_CANDIDATES, CATALOG_HYBRID
+from agent.lexical import LexicalIndex, document_identifiers, document_text, hybrid_matches
+from indexer.parsers import parse_grpc_contracts, parse_graphql_schema, parse_openapi_targets
+from utils.embeddings import get_embedding
+
+
+def collect_functions(rest_urls, contracts_dir="contracts", graphql_schema_path="contracts/schema.graphql"):
+    """Le stesse funzioni che indicizzerebbe indexer/main.py, lette dai server avviati in locale."""
+    functions = parse_grpc_contracts(contracts_dir)
+    functions.extend(parse_graphql_schema(graphql_schema_path))
+    # Senza SpecCache: il benchmark deve misurare sempre lo stesso catalogo, non la cache
+    functions.extend(parse_openapi_targets([{"name": url, "url": url} for url in rest_urls], ready_timeout=30))
+    return functions
+
+
+class InMemoryCatalog:
+    """
+    Ricerca per distanza coseno su una matrice numpy: stesso risultato di `embedding <=> $1`
+    senza Postgres. Gli embedding passano da get_embedding, quindi dalla cassetta.
+    Con un testo la ricerca è ibrida come in PgCatalog (stesso indice BM25 e stessa fusione).
+    """
+    def __init__(self, functions, hybrid=CATALOG_HYBRID):
+        self.functions = functions
+        self.hybrid = hybrid
+        self._lexical = LexicalIndex(
+            (i, document_text(f["metadata"], f["source_contract"]), document_identifiers(f["metadata"]))
+            for i, f in enumerate(functions)
+        )
+        # Stesso testo che indexer/db_utils.insert_api_functions usa per l'embedding
+        vectors = [
+            get_embedding(f"Tipo: {f['type']}, Nome: {f['name']}, Descrizione: {f['description']}")
+            for f in functions
+        ]
+        matrix = np.asarray(vectors, dtype=np.float32)
+        self._matrix = matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+    def _distances(self, embedding):
+        query = np.asarray(embedding, dtype=np.float32)
+        return 1.0 - self._matrix @ (query / np.linalg.norm(query))
+
+    def search(self, embedding, top_k, text=None, scope=None):
+        # I server demo stanno tutti nel namespace di default: lo scope non filtra nulla
+        if text and self.hybrid:
+            matches = self.hybrid_search(embedding, text, top_k)
+            return [(match["metadata"], match["source_contract"], match["distance"]) for match in matches]
+        distances = self._distances(embedding)
+        order = np.argsort(distances)[:top_k]
+        return [
+            (self.functions[i]["metadata"], self.functions[i]["source_contract"], float(distances[i]))
+            for i in order
+        ]
+
+    def hybrid_search(self, embedding, text, top_k, scope=None):
+        distances = self._distances(embedding)
+        vector_ranking = [int(i) for i in np.argsort(distances)[:max(top_k, CATALOG_CANDIDATES)]]
+        lexical_hits = self._lexical.search(text, CATALOG_CANDIDATES)
+        exact_ids = self._lexical.exact_matches(text)
+        candidates = {
+            i: (self.functions[i]["metadata"], self.functions[i]["source_contract"], float(distances[i]))
+            for i in set(vector_ranking) | {doc_id for doc_id, _ in lexical_hits} | set(exact_ids)
+        }
+        return hybrid_matches(candidates, vector_ranking, lexical_hits, exact_ids, top_k)
+
+    def warm_up(self, scope=None, connections=1):
+        return [function["metadata"] for function in self.functions]
+
+    def version(self):
+        return 1
@@ -0,0 +1,106 @@
+# FILE: benchmarks/e2e/retrieval.py
+"""
+Benchmark della selezione degli strumenti: ricerca solo vettoriale contro ricerca ibrida
+(BM25 + vettori con reciprocal rank fusion).
+
+Su un insieme di task etichettati con lo strumento atteso misura accuratezza top-1,
+MRR sui primi --top-k risultati e latenza della ricerca (embedding esclusi, presi dalla
+cassetta). Il catalogo è quello in memoria del benchmark end-to-end, letto dai server demo.
+
+Uso:
+  python -m benchmarks.e2e.retrieval --mode record    # una volta, con la chiave OpenAI
+  python -m benchmarks.e2e.retrieval --verbose        # mostra i punteggi dei task sbagliati
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+
+from .services import DemoServers, REST_OPENAPI_URLS
+
+E2E_DIR = os.path.dirname(__file__)
+DEFAULT_CASSETTE = os.path.join(E2E_DIR, "cassette.json")
+DEFAULT_QUERIES = os.path.join(E2E_DIR, "retrieval_queries.json")
+
+
+def evaluate(catalog, cases, embeddings, top_k, hybrid, repeat):
+    hits, reciprocal_ranks, timings, misses = 0, [], [], []
+    for case, embedding in zip(cases, embeddings):
+        text = case["query"] if hybrid else None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            results = catalog.search(embedding, top_k, text=text)
+            timings.append((time.perf_counter() - start) * 1000)
+        names = [metadata.get("name") for metadata, _, _ in results]
+        rank = names.index(case["expected"]) + 1 if case["expected"] in names else None
+        hits += rank == 1
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        if rank != 1:
+            misses.append({"query": case["query"], "expected": case["expected"], "got": names[:3],
+                           "scores": catalog.hybrid_search(embedding, case["query"], 3) if hybrid else None})
+    timings.sort()
+    return {
+        "top1_accuracy": hits / len(cases),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[int(0.95 * (len(timings) - 1))],
+        "misses": misses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=50, help="Ripetizioni di ogni ricerca per la latenza")
+    parser.add_argument("--output", help="Salva i risultati in JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    if args.mode == "replay" and not os.path.exists(args.cassette):
+        # Prima di avviare i server: senza cassetta la riproduzione fallirebbe alla prima chiamata LLM
+        parser.error(f"cassetta non trovata: {args.cassette}. Registrala una volta con le chiavi reali "
+                     f"(GEMINI_API_KEY e OPENAI_API_KEY nel .env): python -m benchmarks.e2e.retrieval --mode record")
+
+    from dotenv import load_dotenv
+    # OPENAI_API_KEY per la registrazione delle cassette
+    load_dotenv()
+
+    from utils.embeddings import get_embedding
+    from .cassette import Cassette
+    from .catalog import InMemoryCatalog, collect_functions
+
+    with open(args.queries) as f:
+        cases = json.load(f)
+
+    with DemoServers(), Cassette(args.cassette, args.mode):
+        catalog = InMemoryCatalog(collect_functions(REST_OPENAPI_URLS))
+        embeddings = [get_embedding(case["query"]) for case in cases]
+
+    results = {
+        "vettoriale": evaluate(catalog, cases, embeddings, args.top_k, hybrid=False, repeat=args.repeat),
+        "ibrida": evaluate(catalog, cases, embeddings, args.top_k, hybrid=True, repeat=args.repeat),
+    }
+
+    print(f"\n📊 Selezione degli strumenti su {len(cases)} task ({len(catalog.functions)} funzioni, top_k={args.top_k})")
+    print(f"   {'ricerca':<12}{'top-1':>8}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}")
+    for label, result in results.items():
+        print(f"   {label:<12}{result['top1_accuracy']:>8.1%}{result['mrr']:>8.3f}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}")
+
+    if args.verbose:
+        for label, result in results.items():
+            for miss in result["misses"]:
+                print(f"\n❌ [{label}] {miss['query']!r}: atteso {miss['expected']}, trovati {miss['got']}")
+                for match in miss["scores"] or []:
+                    print(f"      {match['metadata'].get('name')}: {json.dumps(match['scores'])}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"\n💾 Risultati salvati in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
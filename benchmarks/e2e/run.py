@@ -0,0 +1,191 @@
+# FILE: benchmarks/e2e/run.py
+"""
+Benchmark end-to-end dell'agente, offline.
+
+Esegue l'intera pipeline di agent/main.py (pianificazione, preparazione degli step, esecuzione
+dei tool sui server demo, sintesi) su un insieme fisso di scenari, con:
+- cassette record/replay per call_llm e get_embedding (nessuna chiamata a Gemini/OpenAI in replay);
+- catalogo in memoria al posto di Postgres;
+- i server di servers/ avviati in locale.
+
+Per ogni query riporta latenza per fase, chiamate LLM e byte di prompt per punto di chiamata,
+tool call eseguite. Con --baseline confronta con un'esecuzione precedente e fallisce se
+una metrica peggiora oltre la tolleranza.
+
+Uso:
+  python -m benchmarks.e2e.run --mode record          # una volta, con le chiavi reali
+  python -m benchmarks.e2e.run --output risultati.json
+  python -m benchmarks.e2e.run --baseline risultati.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+from .services import DemoServers, LOCAL_ENDPOINTS, REST_OPENAPI_URLS
+
+E2E_DIR = os.path.dirname(__file__)
+DEFAULT_CASSETTE = os.path.join(E2E_DIR, "cassette.json")
+DEFAULT_SCENARIOS = os.path.join(E2E_DIR, "scenarios.json")
+STAGES = ["planning", "preparation", "tool_execution", "synthesis"]
+# Metriche confrontate con la baseline
+REGRESSION_METRICS = ["total_seconds", "llm_calls", "prompt_bytes", "tool_calls"]
+
+
+def _counter_delta(before, after):
+    delta = {}
+    for site, counter in after.items():
+        previous = before.get(site, {"calls": 0, "prompt_bytes": 0})
+        calls = counter["calls"] - previous["calls"]
+        if calls:
+            delta[site] = {"calls": calls, "prompt_bytes": counter["prompt_bytes"] - previous["prompt_bytes"]}
+    return delta
+
+
+def run_scenario(runtime, cassette, scenario, quiet):
+    session = runtime.new_session(scenario["name"])
+    answers = list(scenario.get("answers", []))
+    before = cassette.snapshot()
+    start = time.perf_counter()
+    output = open(os.devnull, "w") if quiet else sys.stdout
+    error = None
+    try:
+        with contextlib.redirect_stdout(output):
+            reply = session.handle_message(scenario["query"])
+            while reply["type"] == "question":
+                if not answers:
+                    raise RuntimeError(f"L'agente ha chiesto '{reply['text']}' ma lo scenario non ha altre risposte")
+                reply = session.handle_message(answers.pop(0))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        if quiet:
+            output.close()
+        session.close()
+    total = time.perf_counter() - start
+
+    llm = _counter_delta(before, cassette.snapshot())
+    embedding = llm.pop("embedding", {"calls": 0})
+    stats = session.last_query_stats or {}
+    return {
+        "name": scenario["name"],
+        "error": error,
+        "success": error is None and stats.get("success", False),
+        "total_seconds": total,
+        "stages": {stage: stats.get("stages", {}).get(stage, 0.0) for stage in STAGES},
+        "steps": stats.get("steps", 0),
+        "tool_calls": stats.get("tool_calls", 0),
+        "plan_from_cache": stats.get("plan_from_cache", False),
+        "llm_calls": sum(c["calls"] for c in llm.values()),
+        "prompt_bytes": sum(c["prompt_bytes"] for c in llm.values()),
+        "llm_by_call_site": llm,
+        "embedding_calls": embedding["calls"],
+    }
+
+
+def print_report(results):
+    header = f"{'scenario':<32}{'totale':>8}" + "".join(f"{s[:9]:>10}" for s in STAGES) + f"{'LLM':>5}{'prompt KB':>10}{'tool':>6}  esito"
+    print("\n" + header)
+    print("-" * len(header))
+    for r in results:
+        stages = "".join(f"{r['stages'][s]:>10.3f}" for s in STAGES)
+        outcome = "ok" if r["success"] else (r["error"] or "fallito")
+        print(f"{r['name'][:31]:<32}{r['total_seconds']:>8.3f}{stages}{r['llm_calls']:>5}"
+              f"{r['prompt_bytes'] / 1024:>10.1f}{r['tool_calls']:>6}  {outcome}")
+
+    by_site = {}
+    for r in results:
+        for site, c in r["llm_by_call_site"].items():
+            agg = by_site.setdefault(site, {"calls": 0, "prompt_bytes": 0})
+            agg["calls"] += c["calls"]
+            agg["prompt_bytes"] += c["prompt_bytes"]
+    print("\nChiamate LLM per punto di chiamata:")
+    for site, c in sorted(by_site.items()):
+        print(f"  {site:<16}{c['calls']:>5} chiamate {c['prompt_bytes'] / 1024:>10.1f} KB di prompt")
+
+
+def compare_with_baseline(results, baseline_path, tolerance):
+    """Restituisce l'elenco delle regressioni rispetto alla baseline."""
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+
+    regressions = []
+    for r in results:
+        old = baseline.get(r["name"])
+        if old is None:
+            continue
+        if old["success"] and not r["success"]:
+            regressions.append(f"{r['name']}: ora fallisce ({r['error'] or 'esito negativo'})")
+        for metric in REGRESSION_METRICS:
+            before, after = old[metric], r[metric]
+            # I conteggi sono deterministici in replay: qualsiasi aumento è una regressione
+            allowed = before * (1 + tolerance) if metric == "total_seconds" else before
+            if after > allowed:
+                regressions.append(f"{r['name']}: {metric} {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--cassette", default=DEFAULT_CASSETTE)
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS)
+    parser.add_argument("--only", nargs="*", help="Esegue solo gli scenari con questi nomi")
+    parser.add_argument("--output", help="Salva i risultati in JSON")
+    parser.add_argument("--baseline", help="Risultati JSON di un'esecuzione precedente da confrontare")
+    parser.add_argument("--tolerance", type=float, default=0.20, help="Peggioramento di latenza ammesso rispetto alla baseline")
+    parser.add_argument("--verbose", action="store_true", help="Mostra l'output dell'agente")
+    args = parser.parse_args()
+    if args.mode == "replay" and not os.path.exists(args.cassette):
+        # Prima di avviare i server: senza cassetta la riproduzione fallirebbe alla prima chiamata LLM
+        parser.error(f"cassetta non trovata: {args.cassette}. Registrala una volta con le chiavi reali "
+                     f"(GEMINI_API_KEY e OPENAI_API_KEY nel .env): python -m benchmarks.e2e.run --mode record")
+
+    from dotenv import load_dotenv
+    # OPENAI_API_KEY per la registrazione delle cassette
+    load_dotenv()
+
+    # Gli endpoint e il router vanno configurati prima di importare l'agente
+    os.environ.update(LOCAL_ENDPOINTS)
+    os.environ["MODEL_ROUTER_EXPLORATION"] = "0"
+    from agent.session import AgentRuntime
+    from .cassette import Cassette
+    from .catalog import InMemoryCatalog, collect_functions
+
+    with open(args.scenarios) as f:
+        scenarios = json.load(f)
+    if args.only:
+        scenarios = [s for s in scenarios if s["name"] in args.only]
+
+    results = []
+    with DemoServers(), Cassette(args.cassette, args.mode) as cassette:
+        catalog = InMemoryCatalog(collect_functions(REST_OPENAPI_URLS))
+        runtime = AgentRuntime(catalog=catalog)
+        try:
+            for scenario in scenarios:
+                print(f"▶️  {scenario['name']}")
+                results.append(run_scenario(runtime, cassette, scenario, quiet=not args.verbose))
+        finally:
+            runtime.close()
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"mode": args.mode, "results": results}, f, indent=2)
+        print(f"\n💾 Risultati salvati in {args.output}")
+
+    if args.baseline:
+        regressions = compare_with_baseline(results, args.baseline, args.tolerance)
+        if regressions:
+            print("\n❌ Regressioni rispetto alla baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("\n✅ Nessuna regressione rispetto alla baseline.")
+
+
+if __name__ == '__main__':
+    main()
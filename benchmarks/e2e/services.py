@@ -0,0 +1,73 @@
+# FILE: benchmarks/e2e/services.py
+"""Avvia in locale i server demo di servers/ e attende che accettino connessioni."""
+import os
+import sys
+import time
+import socket
+import subprocess
+
+SERVERS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "servers")
+
+# (nome, comando, porta): gli stessi CMD dei Dockerfile
+DEMO_SERVERS = [
+    ("graphql", ["-m", "uvicorn", "graphql_server:app", "--host", "127.0.0.1", "--port", "8000"], 8000),
+    ("orders", ["-m", "uvicorn", "rest_server:app", "--host", "127.0.0.1", "--port", "8001"], 8001),
+    ("geo", ["-m", "uvicorn", "geo_server:app", "--host", "127.0.0.1", "--port", "8002"], 8002),
+    ("reviews", ["-m", "uvicorn", "reviews_server:app", "--host", "127.0.0.1", "--port", "8003"], 8003),
+    ("grpc", ["grpc_server.py"], 50051),
+]
+
+# Variabili da impostare PRIMA di importare l'agente, perché gli URL sono letti all'import
+LOCAL_ENDPOINTS = {
+    "GRPC_TARGET": "127.0.0.1:50051",
+    "GRAPHQL_URL": "http://127.0.0.1:8000/graphql",
+}
+REST_OPENAPI_URLS = [
+    "http://127.0.0.1:8001/openapi.json",
+    "http://127.0.0.1:8002/openapi.json",
+    "http://127.0.0.1:8003/openapi.json",
+]
+
+
+def _wait_for_port(port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class DemoServers:
+    """Context manager: avvia tutti i server demo e li termina all'uscita."""
+    def __init__(self, startup_timeout=20):
+        self.startup_timeout = startup_timeout
+        self.processes = []
+
+    def __enter__(self):
+        for name, args, port in DEMO_SERVERS:
+            process = subprocess.Popen(
+                [sys.executable, *args], cwd=SERVERS_DIR,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            self.processes.append((name, process))
+
+        for name, _, port in DEMO_SERVERS:
+            if not _wait_for_port(port, self.startup_timeout):
+                self.__exit__(None, None, None)
+                raise RuntimeError(f"Il server demo '{name}' non risponde sulla porta {port}")
+        print(f"🚀 Server demo pronti: {', '.join(name for name, _, _ in DEMO_SERVERS)}")
+        return self
+
+    def __exit__(self, *exc):
+        for _, process in self.processes:
+            process.terminate()
+        for _, process in self.processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = []
+        return False
@@ -5,6 +5,36 @@ const app = express();
 // Middleware per leggere il corpo della richiesta come testo
 app.use(express.text({ type: 'text/plain' }));
 
+// Stessi nomi di tipo usati dall'agente (utils/proto_descriptors.py)
+const SCALAR_TYPES = {
+    int32: 'integer', sint32: 'integer', sfixed32: 'integer', uint32: 'integer', fixed32: 'integer',
+    int64: 'integer', sint64: 'integer', sfixed64: 'integer', uint64: 'integer', fixed64: 'integer',
+    double: 'number', float: 'number', bool: 'boolean', string: 'string', bytes: 'bytes',
+};
+
+// Contratto JSON di un messaggio: {campo: tipo}, messaggi annidati come oggetti,
+// campi repeated come [tipo], enum come "enum(A|B)"
+function describeMessage(type, seen = new Set()) {
+    if (seen.has(type.fullName)) {
+        return type.name; // Messaggio ricorsivo
+    }
+    const nextSeen = new Set(seen).add(type.fullName);
+    const contract = {};
+    type.fieldsArray.forEach((field) => {
+        field.resolve();
+        let fieldType;
+        if (field.resolvedType instanceof protobuf.Type) {
+            fieldType = describeMessage(field.resolvedType, nextSeen);
+        } else if (field.resolvedType instanceof protobuf.Enum) {
+            fieldType = `enum(${Object.keys(field.resolvedType.values).join('|')})`;
+        } else {
+            fieldType = SCALAR_TYPES[field.type] || 'string';
+        }
+        contract[field.name] = field.repeated ? [fieldType] : fieldType;
+    });
+    return contract;
+}
+
 app.post('/parse', (req, res) => {
     const protoContent = req.body;
     if (!protoContent) {
@@ -13,12 +43,15 @@ app.post('/parse', (req, res) => {
 
     try {
         const { root } = protobuf.parse(protoContent, { keepCase: true });
+        root.resolveAll();
         const functions = [];
            function findServices(namespace) {
             if (namespace instanceof protobuf.Service) {
                 const serviceName = namespace.name;
                 namespace.methodsArray.forEach((method) => {
                     const rpcName = method.name;
+                    method.resolve();
+                    const requestContract = JSON.stringify(describeMessage(method.resolvedRequestType));
                     functions.push({
                         type: "grpc",
                         name: rpcName,
@@ -29,7 +62,7 @@ app.post('/parse', (req, res) => {
                             service: serviceName,
                             rpc: rpcName,
                         },
-                        source_contract: `rpc ${rpcName}(${method.requestType}) returns (${method.responseType}); Contratto del messaggio di richiesta (${method.requestType}): { "id": "integer" }`
+                        source_contract: `rpc ${rpcName}(${method.requestType}) returns (${method.responseType}); Contratto del messaggio di richiesta (${method.requestType}): ${requestContract}`
                     });
                 });
             }
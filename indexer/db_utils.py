@@ -1,6 +1,20 @@
+import os
 import json
+import hashlib
+from collections import defaultdict
 
-EMBEDDING_DIMENSIONS = 1536
+from utils.embeddings import EMBEDDING_DIMENSIONS
+from utils.embedding_storage import coarse_index_sql
+from utils.profiling import profile_stage
+
+# Namespace (tenant, ambiente) delle funzioni indicizzate da questo indexer; i target
+# REST possono indicarne uno diverso con le chiavi "tenant" ed "environment"
+INDEXER_TENANT = os.getenv("INDEXER_TENANT", "default")
+INDEXER_ENVIRONMENT = os.getenv("INDEXER_ENVIRONMENT", "default")
+DEFAULT_NAMESPACE = (INDEXER_TENANT, INDEXER_ENVIRONMENT)
+
+# Canale su cui l'indexer annuncia una nuova versione del catalogo (payload: la versione)
+CATALOG_CHANNEL = "catalog_changed"
 
 def create_table_if_not_exists(conn):
     """Crea la tabella per le funzioni API se non esiste già."""
@@ -14,20 +28,170 @@ def create_table_if_not_exists(conn):
                 source_contract TEXT
             );
         """)
+        # Colonne per l'indicizzazione incrementale (assenti nelle tabelle create da versioni precedenti)
+        cur.execute("""
+            ALTER TABLE api_functions
+                ADD COLUMN IF NOT EXISTS source TEXT,
+                ADD COLUMN IF NOT EXISTS content_hash TEXT,
+                ADD COLUMN IF NOT EXISTS embedding_hash TEXT;
+        """)
+        # Namespace del catalogo: la ricerca filtra su questi tre campi tramite l'indice composto,
+        # così il costo dipende dalle funzioni dei namespace ammessi e non dagli altri tenant
+        cur.execute("""
+            ALTER TABLE api_functions
+                ADD COLUMN IF NOT EXISTS tenant TEXT NOT NULL DEFAULT 'default',
+                ADD COLUMN IF NOT EXISTS environment TEXT NOT NULL DEFAULT 'default',
+                ADD COLUMN IF NOT EXISTS api_type TEXT;
+        """)
+        cur.execute("UPDATE api_functions SET api_type = metadata->>'type' WHERE api_type IS NULL;")
+        cur.execute("CREATE INDEX IF NOT EXISTS api_functions_namespace_idx ON api_functions (tenant, environment, api_type);")
+        cur.execute("CREATE INDEX IF NOT EXISTS api_functions_source_idx ON api_functions (source);")
+        cur.execute("CREATE INDEX IF NOT EXISTS api_functions_embedding_hash_idx ON api_functions (embedding_hash);")
+        # Indice HNSW sulla rappresentazione compatta scelta con EMBEDDING_STORAGE (prima fase della ricerca)
+        index_sql = coarse_index_sql()
+        if index_sql:
+            cur.execute(index_sql)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS catalog_version (
+                id INT PRIMARY KEY DEFAULT 1,
+                version BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            );
+        """)
+        cur.execute("INSERT INTO catalog_version (id, version) VALUES (1, 0) ON CONFLICT (id) DO NOTHING;")
         print("Tabella 'api_functions' pronta.")
     conn.commit()
 
-def insert_api_functions(conn, all_api_functions, get_embedding_func):
-    """Calcola gli embedding e inserisce le funzioni nel database."""
+def function_namespace(func):
+    """(tenant, ambiente) di una funzione parsata: quelli del suo target o quelli dell'indexer."""
+    return func.get('tenant', INDEXER_TENANT), func.get('environment', INDEXER_ENVIRONMENT)
+
+def embedding_text(func):
+    """Il testo da cui si calcola l'embedding di una funzione."""
+    return f"Tipo: {func['type']}, Nome: {func['name']}, Descrizione: {func['description']}"
+
+def function_hashes(func):
+    """(embedding_hash, content_hash): il primo cambia solo se cambia il testo dell'embedding."""
+    text = embedding_text(func)
+    embedding_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    content = json.dumps([text, func.get('metadata', {}), func.get('source_contract', '')], sort_keys=True)
+    return embedding_hash, hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def insert_api_functions(conn, all_api_functions, get_embedding_func, known_embeddings=None):
+    """
+    Calcola gli embedding e inserisce le funzioni nel database.
+    `known_embeddings` ({embedding_hash: embedding}) evita di ricalcolare quelli già noti.
+    """
+    known = {} if known_embeddings is None else known_embeddings
     with conn.cursor() as cur:
         print("Inizio calcolo embeddings e inserimento nel database...")
         for func in all_api_functions:
-            text_to_embed = f"Tipo: {func['type']}, Nome: {func['name']}, Descrizione: {func['description']}"
-            embedding = get_embedding_func(text_to_embed) # Usa la funzione passata come argomento
-            print(f"  -> Calcolato embedding per '{func['name']}'")
+            embedding_hash, content_hash = function_hashes(func)
+            embedding = known.get(embedding_hash)
+            if embedding is None:
+                embedding = known[embedding_hash] = get_embedding_func(embedding_text(func)) # Usa la funzione passata come argomento
+                print(f"  -> Calcolato embedding per '{func['name']}'")
+            else:
+                print(f"  -> Riuso l'embedding di '{func['name']}'")
+            tenant, environment = function_namespace(func)
+            with profile_stage("db.insert"):
+                cur.execute(
+                    "INSERT INTO api_functions (embedding, metadata, source_contract, source, content_hash, embedding_hash, "
+                    "tenant, environment, api_type) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    (embedding, json.dumps(func.get('metadata', {})), func.get('source_contract', ''),
+                     func.get('source'), content_hash, embedding_hash, tenant, environment, func['type'])
+                )
+        print(f"Inserite {len(all_api_functions)} funzioni nel database.")
+    conn.commit()
+
+def sync_source(conn, source, functions, get_embedding_func, allow_empty=False, namespace=DEFAULT_NAMESPACE):
+    """
+    Allinea le righe di una sorgente (un .proto, lo schema GraphQL, una specifica OpenAPI)
+    in un namespace (tenant, ambiente) alle funzioni appena parsate: le funzioni invariate restano, quelle sparite si cancellano
+    e per quelle nuove o modificate l'embedding si ricalcola solo se ne è cambiato il testo.
+    Una lista vuota viene ignorata (probabile errore di parsing) a meno di `allow_empty`.
+    Restituisce il numero di righe inserite più quelle cancellate.
+    """
+    if not functions and not allow_empty:
+        print(f"   ⚠️ Nessuna funzione da {source}: mantengo quelle già indicizzate.")
+        return 0
+
+    tenant, environment = namespace
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, content_hash FROM api_functions WHERE source = %s AND tenant = %s AND environment = %s",
+            (source, tenant, environment)
+        )
+        existing = defaultdict(list)
+        for row_id, content_hash in cur.fetchall():
+            existing[content_hash].append(row_id)
+
+        to_insert = []
+        for func in functions:
+            _, content_hash = function_hashes(func)
+            if existing.get(content_hash):
+                existing[content_hash].pop()  # Invariata: la riga resta com'è
+            else:
+                to_insert.append({**func, 'tenant': tenant, 'environment': environment})
+        to_delete = [row_id for row_ids in existing.values() for row_id in row_ids]
+
+        # Embedding riutilizzabili da qualunque riga del catalogo, prima di cancellare quelle vecchie
+        known_embeddings = {}
+        if to_insert:
             cur.execute(
-                "INSERT INTO api_functions (embedding, metadata, source_contract) VALUES (%s, %s, %s)",
-                (embedding, json.dumps(func.get('metadata', {})), func.get('source_contract', ''))
+                "SELECT DISTINCT ON (embedding_hash) embedding_hash, embedding FROM api_functions WHERE embedding_hash = ANY(%s)",
+                ([function_hashes(func)[0] for func in to_insert],)
             )
-        print(f"Inserite {len(all_api_functions)} funzioni nel database.")
-    conn.commit()
\ No newline at end of file
+            known_embeddings = dict(cur.fetchall())
+        if to_delete:
+            cur.execute("DELETE FROM api_functions WHERE id = ANY(%s)", (to_delete,))
+
+    if to_insert:
+        insert_api_functions(conn, to_insert, get_embedding_func, known_embeddings)  # Fa il commit di tutto
+    else:
+        conn.commit()
+    if to_insert or to_delete:
+        print(f"   🔄 {source} ({tenant}/{environment}): {len(to_insert)} funzioni aggiornate, {len(to_delete)} rimosse.")
+    return len(to_insert) + len(to_delete)
+
+def sync_catalog(conn, all_api_functions, get_embedding_func, known_sources):
+    """
+    Sincronizza tutte le sorgenti e, nei namespace gestiti da questo indexer, cancella le righe
+    delle sorgenti non più presenti (file rimossi, target non più configurati, righe di versioni
+    precedenti senza sorgente). `known_sources`: insieme di (tenant, ambiente, sorgente).
+    Restituisce il numero di righe cambiate.
+    """
+    by_source = defaultdict(list)
+    for func in all_api_functions:
+        by_source[(*function_namespace(func), func['source'])].append(func)
+
+    changed = 0
+    for (tenant, environment, source), functions in by_source.items():
+        changed += sync_source(conn, source, functions, get_embedding_func, namespace=(tenant, environment))
+
+    keep = defaultdict(set)
+    for tenant, environment, source in set(known_sources) | set(by_source):
+        keep[(tenant, environment)].add(source)
+    with conn.cursor() as cur:
+        for (tenant, environment), sources in keep.items():
+            cur.execute(
+                "DELETE FROM api_functions WHERE tenant = %s AND environment = %s "
+                "AND (source IS NULL OR NOT (source = ANY(%s)))",
+                (tenant, environment, sorted(sources))
+            )
+            if cur.rowcount:
+                print(f"   🗑️ Rimosse {cur.rowcount} funzioni di sorgenti non più presenti ({tenant}/{environment}).")
+            changed += cur.rowcount
+    conn.commit()
+    return changed
+
+def bump_catalog_version(conn):
+    """Incrementa la versione del catalogo, così gli agenti invalidano le proprie cache."""
+    with conn.cursor() as cur:
+        cur.execute("UPDATE catalog_version SET version = version + 1, updated_at = now() WHERE id = 1 RETURNING version")
+        version = cur.fetchone()[0]
+        # Gli agenti in ascolto ricevono la notifica al commit e invalidano le cache senza riavvio
+        cur.execute("SELECT pg_notify(%s, %s)", (CATALOG_CHANNEL, str(version)))
+    conn.commit()
+    print(f"Versione del catalogo aggiornata a {version}.")
+    return version
@@ -1,80 +1,145 @@
 import os
-import json
+import glob
 import time
+import argparse
 from dotenv import load_dotenv
 
-from indexer.parsers import parse_grpc_contracts_via_service, parse_graphql_schema, parse_openapi_schema
-from indexer.db_utils import create_table_if_not_exists, insert_api_functions
+# Carica le variabili d'ambiente dal file .env, prima dei moduli che le leggono all'import
+load_dotenv()
+
+from indexer.parsers import grpc_source, parse_grpc_contracts, parse_graphql_schema, parse_openapi_targets
+from indexer.spec_cache import SpecCache
+from indexer.watch import ContractsWatcher
+from indexer.db_utils import (
+    DEFAULT_NAMESPACE, create_table_if_not_exists, function_namespace, sync_catalog, bump_catalog_version
+)
 from utils.database import get_db_connection
 from utils.embeddings import get_embedding
+from utils.profiling import enable_profiling, profile_query, profile_stage, print_profile_summary
 
-# Carica le variabili d'ambiente dal file .env
-load_dotenv()
+# Tempo massimo di attesa per ogni server REST prima di saltarlo
+INDEXER_READY_TIMEOUT = float(os.getenv("INDEXER_READY_TIMEOUT", "60"))
+
+CONTRACTS_DIR = "contracts"
+GRAPHQL_SCHEMA_PATH = os.path.join(CONTRACTS_DIR, "schema.graphql")
+
+# Ogni target può indicare "tenant" ed "environment" (default: INDEXER_TENANT / INDEXER_ENVIRONMENT)
+REST_API_TARGETS = [
+    {"name": "Orders", "url": "http://rest_server:8001/openapi.json"},
+    {"name": "Geolocation", "url": "http://geo_server:8002/openapi.json"},
+    {"name": "Reviews", "url": "http://reviews_server:8003/openapi.json"},
+]
+
+# API Pokemon per testing
+POKEMON_APIS = [
+    {
+        "type": "rest",
+        "name": "get_pokemon_details",
+        "description": "Ottieni dettagli completi di un Pokemon inclusi tipo, abilità, statistiche, peso e altezza. Usa il nome (es: 'pikachu') o l'ID numerico.",
+        "source": "static:pokemon",
+        "metadata": {
+            "name": "get_pokemon_details",
+            "type": "rest",
+            "base_url": "https://pokeapi.co",
+            "path_template": "/api/v2/pokemon/{name_or_id}",
+            "method": "GET"
+        },
+        "source_contract": "GET /api/v2/pokemon/{name_or_id} - Returns: name, types[], abilities[], stats[], weight, height"
+    }
+]
+
+def profiled_embedding(text):
+    with profile_stage("embedding"):
+        return get_embedding(text)
 
 def main():
     """Orchestra il processo di indicizzazione delle API."""
-    conn = get_db_connection()
+    parser = argparse.ArgumentParser(description="Indicizza le API nel catalogo.")
+    parser.add_argument("--profile", action="store_true", help="Profila l'indicizzazione (equivale ad AGENT_PROFILE=1)")
+    parser.add_argument("--cprofile", action="store_true", help="Con --profile, salva anche un profilo cProfile")
+    parser.add_argument("--tracemalloc", action="store_true", help="Con --profile, traccia anche le allocazioni di memoria")
+    parser.add_argument("--watch", action="store_true", help="Dopo l'indicizzazione resta attivo e reindicizza i contratti modificati")
+    args = parser.parse_args()
+    if args.profile:
+        enable_profiling(cprofile=args.cprofile or None, tracemalloc_enabled=args.tracemalloc or None)
+    try:
+        with profile_query("indexer"):
+            run_indexing(watch=args.watch)
+    except KeyboardInterrupt:
+        print("\n👋 Indexer fermato.")
+    print_profile_summary()
+
+def connect_when_ready(timeout):
+    """Riprova la connessione finché Postgres non accetta connessioni (al massimo `timeout` secondi)."""
+    deadline = time.monotonic() + timeout
+    interval = 0.5
+    while True:
+        conn = get_db_connection()
+        if conn or time.monotonic() >= deadline:
+            return conn
+        time.sleep(interval)
+        interval = min(interval * 2, 5)
+
+def collect_functions(cache=None):
+    """Parsa tutte le sorgenti configurate: restituisce (funzioni, sorgenti note)."""
+    all_api_functions = []
+    print("--- Inizio Parsing delle API ---")
+
+    with profile_stage("parsing.grpc"):
+        all_api_functions.extend(parse_grpc_contracts(CONTRACTS_DIR))
+    with profile_stage("parsing.graphql"):
+        all_api_functions.extend(parse_graphql_schema(GRAPHQL_SCHEMA_PATH))
+
+    # Parsing in parallelo; le specifiche invariate dall'ultima esecuzione vengono dalla cache
+    with profile_stage("parsing.openapi"):
+        all_api_functions.extend(parse_openapi_targets(REST_API_TARGETS, INDEXER_READY_TIMEOUT, cache=cache))
+
+    print("--- Aggiunta API Pokemon per testing ---")
+    all_api_functions.extend(POKEMON_APIS)
+    return all_api_functions, known_sources()
+
+def known_sources():
+    """
+    Le sorgenti che il catalogo deve contenere, come (tenant, ambiente, sorgente): le righe di
+    qualunque altra sorgente in quei namespace vengono cancellate. Un server REST non pronto
+    resta tra le note, così le sue funzioni non si perdono.
+    """
+    sources = {(*DEFAULT_NAMESPACE, grpc_source(path)) for path in glob.glob(os.path.join(CONTRACTS_DIR, "*.proto"))}
+    sources.add((*DEFAULT_NAMESPACE, f"graphql:{GRAPHQL_SCHEMA_PATH}"))
+    sources.update((*function_namespace(api), f"openapi:{api['url']}") for api in REST_API_TARGETS)
+    sources.update((*function_namespace(func), func["source"]) for func in POKEMON_APIS)
+    return sources
+
+def run_indexing(watch=False):
+    conn = connect_when_ready(INDEXER_READY_TIMEOUT)
     if not conn:
         return
 
     # 1. Prepara il Database
     create_table_if_not_exists(conn)
-    with conn.cursor() as cur:
-        cur.execute("TRUNCATE api_functions RESTART IDENTITY;")
-        print("Tabella pulita.")
-    conn.commit()
 
     # 2. Raccogli le Definizioni delle API da tutte le fonti
-    all_api_functions = []
-    print("--- Inizio Parsing delle API ---")
+    cache = SpecCache()
+    all_api_functions, sources = collect_functions(cache)
 
-     # Pausa per dare tempo ai servizi Docker di avviarsi
-    print("⏳ In attesa del servizio di parsing gRPC...")
-    time.sleep(5)
-    all_api_functions.extend(parse_grpc_contracts_via_service('contracts/user_service.proto'))
-    all_api_functions.extend(parse_graphql_schema('contracts/schema.graphql'))
-
-    print("⏳ In attesa dei server REST...")
-    time.sleep(3)
-    rest_api_targets = [
-        {"name": "Orders", "url": "http://rest_server:8001/openapi.json"},
-        {"name": "Geolocation", "url": "http://geo_server:8002/openapi.json"},
-        {"name": "Reviews", "url": "http://reviews_server:8003/openapi.json"},
-    ]
-    
-    for api in rest_api_targets:
-        print(f"--- Scansione API REST: {api['name']} ---")
-        all_api_functions.extend(parse_openapi_schema(api["url"]))
-
-    print("--- Aggiunta API Pokemon per testing ---")
-    pokemon_apis = [
-        {
-            "type": "rest",
-            "name": "get_pokemon_details",
-            "description": "Ottieni dettagli completi di un Pokemon inclusi tipo, abilità, statistiche, peso e altezza. Usa il nome (es: 'pikachu') o l'ID numerico.",
-            "metadata": {
-                "name": "get_pokemon_details",
-                "type": "rest",
-                "base_url": "https://pokeapi.co",
-                "path_template": "/api/v2/pokemon/{name_or_id}",
-                "method": "GET"
-            },
-            "source_contract": "GET /api/v2/pokemon/{name_or_id} - Returns: name, types[], abilities[], stats[], weight, height"
-        }
-    ]
-    all_api_functions.extend(pokemon_apis)
-    
-     # 3. Indicizza le funzioni nel Database
+    # 3. Indicizza le funzioni nel Database: solo quelle nuove o cambiate dall'ultima esecuzione
     if not all_api_functions:
         print("❌ Nessuna funzione da indicizzare. Termino.")
         conn.close()
         return
 
     print(f"\n✅ Trovate in totale {len(all_api_functions)} funzioni API da indicizzare.")
-    insert_api_functions(conn, all_api_functions, get_embedding) # Passiamo la funzione get_embedding
+    with profile_stage("indicizzazione"):
+        changed = sync_catalog(conn, all_api_functions, profiled_embedding, sources) # Passiamo la funzione get_embedding
+    if changed:
+        bump_catalog_version(conn)
+    else:
+        print("Catalogo già aggiornato, nessuna modifica.")
+    print("\n🎉 Indicizzazione completata con successo!")
 
+    if watch:
+        ContractsWatcher(conn, cache, profiled_embedding, CONTRACTS_DIR, GRAPHQL_SCHEMA_PATH, REST_API_TARGETS).run()
     conn.close()
-    print("\n🎉 Indicizzazione completata con successo!")
 
 
 if __name__ == '__main__':
@@ -1,16 +1,135 @@
 import json
 import requests
 import os
+import glob
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse, unquote
 
-# --- Import delle nuove librerie robuste ---
-from graphql import parse, visit, Visitor, print_ast
-from prance import ResolvingParser
+# graphql, prance e yaml si importano dentro i parser che li usano: i processi che compilano
+# i .proto e le esecuzioni senza schema GraphQL o $ref esterni non ne pagano il caricamento
+from google.protobuf import descriptor_pb2
+from utils.proto_descriptors import ProtoRegistry, compile_proto_files, describe_message
+from utils.http import get_http_session, wait_until_ready
+from utils.profiling import profile_stage
+from indexer.spec_cache import content_hash
 
 GRPC_PARSER_URL = os.getenv("GRPC_PARSER_URL", "http://grpc_parser:3000")
+# Server REST parsati in parallelo e timeout del download di ogni specifica
+OPENAPI_MAX_WORKERS = int(os.getenv("OPENAPI_MAX_WORKERS", "4"))
+OPENAPI_FETCH_TIMEOUT = float(os.getenv("OPENAPI_FETCH_TIMEOUT", "10"))
+
+def _compile_proto(proto_path, contracts_dir):
+    """Compila un singolo .proto (gira in un processo separato): restituisce il FileDescriptorSet serializzato."""
+    return compile_proto_files([proto_path], include_dirs=[contracts_dir], include_source_info=True).SerializeToString()
+
+
+def _method_comments(file_proto):
+    """Commenti che precedono ogni rpc: {(servizio, metodo): testo}."""
+    comments = {}
+    for location in file_proto.source_code_info.location:
+        path = list(location.path)
+        # 6 = service, 2 = method (numeri dei campi in descriptor.proto)
+        if len(path) == 4 and path[0] == 6 and path[2] == 2:
+            service = file_proto.service[path[1]]
+            method = service.method[path[3]]
+            text = "\n".join(line.strip() for line in location.leading_comments.strip().splitlines())
+            comments[(service.name, method.name)] = text
+    return comments
+
+
+def _split_batch_tag(comment):
+    """
+    Separa dal commento di una rpc la riga `@batch {...}` (JSON con rpc, key_param, param,
+    results, key_field) che dichiara la sua variante batch: (descrizione, dichiarazione o None).
+    """
+    lines, batch = [], None
+    for line in comment.splitlines():
+        if line.startswith("@batch "):
+            try:
+                batch = json.loads(line[len("@batch "):])
+            except ValueError:
+                print(f"  -> ⚠️ Dichiarazione @batch non valida: {line}")
+        else:
+            lines.append(line)
+    return "\n".join(lines).strip(), batch
+
+
+def grpc_source(proto_path):
+    """Sorgente nel catalogo delle funzioni definite in un file .proto."""
+    return f"grpc:{proto_path}"
+
+
+def parse_grpc_contracts(contracts_dir="contracts"):
+    """
+    Parsa in-process tutti i .proto di `contracts_dir` (in parallelo) con protoc di grpc_tools.
+    Per ogni rpc produce lo stesso formato del vecchio servizio Node, con i contratti reali
+    del messaggio di richiesta e di risposta ricavati dai descrittori.
+    """
+    proto_paths = sorted(glob.glob(os.path.join(contracts_dir, "*.proto")))
+    print(f"📡 Parsing di {len(proto_paths)} file .proto da {contracts_dir}...")
+    if not proto_paths:
+        return []
+
+    try:
+        if len(proto_paths) == 1:
+            compiled = [_compile_proto(proto_paths[0], contracts_dir)]
+        else:
+            with ProcessPoolExecutor(max_workers=min(len(proto_paths), os.cpu_count() or 1)) as pool:
+                compiled = list(pool.map(_compile_proto, proto_paths, [contracts_dir] * len(proto_paths)))
+    except Exception as e:
+        print(f"❌ Errore durante la compilazione dei .proto: {e}")
+        return []
+
+    registry = ProtoRegistry()
+    own_files = []
+    for proto_path, serialized in zip(proto_paths, compiled):
+        descriptor_set = descriptor_pb2.FileDescriptorSet.FromString(serialized)
+        registry.add_descriptor_set(descriptor_set)
+        # Solo i servizi definiti nel file stesso, non quelli degli import
+        own_files.extend((proto_path, f) for f in descriptor_set.file if f.name == os.path.basename(proto_path))
+
+    functions = []
+    for proto_path, file_proto in own_files:
+        comments = _method_comments(file_proto)
+        for service_proto in file_proto.service:
+            package = f"{file_proto.package}." if file_proto.package else ""
+            service = registry.pool.FindServiceByName(package + service_proto.name)
+            for method in service.methods:
+                if method.client_streaming or method.server_streaming:
+                    print(f"  -> ⏭️ {service.name}.{method.name} è in streaming: l'executor supporta solo rpc unarie, la salto.")
+                    continue
+                request, response = method.input_type, method.output_type
+                description, batch = _split_batch_tag(comments.get((service.name, method.name), ""))
+                metadata = {
+                    "name": method.name,
+                    "type": "grpc",
+                    "service": service.name,
+                    "rpc": method.name,
+                }
+                if batch:
+                    metadata["batch"] = {"operation": batch.get("rpc"), **batch}
+                functions.append({
+                    "type": "grpc",
+                    "name": method.name,
+                    "description": description,
+                    "source": grpc_source(proto_path),
+                    "metadata": metadata,
+                    # Il contratto di richiesta resta in fondo: il fast binder lo legge da lì
+                    "source_contract": (
+                        f"rpc {method.name}({request.name}) returns ({response.name}); "
+                        f"Contratto della risposta ({response.name}): {json.dumps(describe_message(response))}; "
+                        f"Contratto del messaggio di richiesta ({request.name}): {json.dumps(describe_message(request))}"
+                    ),
+                })
+
+    print(f"  -> ✅ Trovate {len(functions)} funzioni gRPC.")
+    return functions
+
 
 def parse_grpc_contracts_via_service(proto_file_path):
     """
-    NUOVO: Chiama il microservizio Node.js per parsare i file .proto.
+    Alternativa: chiama il microservizio Node.js grpc_parser per parsare un file .proto.
+    L'indexer usa parse_grpc_contracts, che non richiede il servizio.
     """
     print(f"📡 Invio {proto_file_path} al servizio di parsing gRPC...")
     try:
@@ -45,6 +164,8 @@ def parse_graphql_schema(schema_file_path):
         with open(schema_file_path, 'r') as f:
             schema_string = f.read()
 
+        from graphql import parse, visit, Visitor, print_ast
+
         ast = parse(schema_string) # Crea l'Abstract Syntax Tree
 
         # CORREZIONE: La classe deve ereditare da graphql.Visitor
@@ -61,16 +182,30 @@ def parse_graphql_schema(schema_file_path):
                     # Usiamo print_ast per ottenere una rappresentazione testuale pulita del contratto
                     source_contract = print_ast(field)
 
+                    metadata = {
+                        "name": operation_name,
+                        "type": "graphql",
+                        "operation_type": node_name,
+                        "operation_name": operation_name
+                    }
+                    # @batch(operation, keyParam, param, keyField): variante batch del campo
+                    for directive in field.directives or []:
+                        if directive.name.value == "batch":
+                            args = {arg.name.value: arg.value.value for arg in directive.arguments}
+                            metadata["batch"] = {
+                                "operation": args.get("operation"),
+                                "operation_name": args.get("operation"),
+                                "key_param": args.get("keyParam"),
+                                "param": args.get("param"),
+                                "key_field": args.get("keyField"),
+                            }
+
                     functions.append({
                         "type": "graphql",
                         "name": operation_name,
                         "description": description,
-                        "metadata": {
-                            "name": operation_name,
-                            "type": "graphql",
-                            "operation_type": node_name,
-                            "operation_name": operation_name
-                        },
+                        "source": f"graphql:{schema_file_path}",
+                        "metadata": metadata,
                         "source_contract": source_contract
                     })
         
@@ -85,45 +220,215 @@ def parse_graphql_schema(schema_file_path):
         return []
 
 
-def parse_openapi_schema(schema_url):
+class _RemoteRefError(Exception):
+    """La specifica usa $ref verso altri documenti: serve la risoluzione completa di prance."""
+
+
+class _LazyRefResolver:
     """
-    RIFATTO: Ora capisce il base_url dinamicamente.
+    Risolve solo i $ref locali ("#/components/...") dei nodi che gli vengono passati,
+    memorizzando ogni riferimento già risolto. I riferimenti ricorsivi restano come $ref.
     """
-    print(f"   Download e parsing da {schema_url}...")
-    functions = []
+    def __init__(self, spec):
+        self.spec = spec
+        self._resolved = {}
+
+    def resolve(self, node, _stack=()):
+        if isinstance(node, dict):
+            ref = node.get("$ref")
+            if isinstance(ref, str):
+                return self._resolve_ref(ref, _stack)
+            return {key: self.resolve(value, _stack) for key, value in node.items()}
+        if isinstance(node, list):
+            return [self.resolve(item, _stack) for item in node]
+        return node
+
+    def _resolve_ref(self, ref, stack):
+        if not ref.startswith("#/"):
+            raise _RemoteRefError(ref)
+        if ref in stack:
+            return {"$ref": ref}
+        if ref not in self._resolved:
+            self._resolved[ref] = self.resolve(self._lookup(ref), stack + (ref,))
+        return self._resolved[ref]
+
+    def _lookup(self, ref):
+        node = self.spec
+        for token in ref[2:].split("/"):
+            token = unquote(token).replace("~1", "/").replace("~0", "~")
+            node = node[int(token)] if isinstance(node, list) else node[token]
+        return node
+
+
+def _load_spec(body):
     try:
-        parser = ResolvingParser(schema_url, strict=False)
-        schema = parser.specification
-    except Exception as e:
-        print(f"   ❌ Impossibile scaricare o parsare lo schema: {e}")
-        return []
+        return json.loads(body)
+    except ValueError:
+        import yaml
+        return yaml.safe_load(body)
 
-    # --- LOGICA DINAMICA PER IL BASE URL ---
-    # Estrae lo schema (http/https), l'host (es. 'rest_server') e la porta (es. 8001) dall'URL
-    from urllib.parse import urlparse
-    parsed_url = urlparse(schema_url)
-    base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-    print(f"   -> Base URL rilevato: {base_url}")
-    
+
+_LIMIT_PARAMS = ("limit", "page_size", "pageSize", "per_page", "perPage", "size")
+_OFFSET_PARAMS = ("offset", "skip", "start")
+_PAGE_PARAMS = ("page", "page_number", "pageNumber")
+_CURSOR_PARAMS = ("cursor", "page_token", "pageToken", "after", "starting_after")
+
+
+def _openapi_pagination(details):
+    """
+    Paginazione di un'operazione GET: dall'estensione x-pagination o, in mancanza, dai nomi
+    dei parametri in query (limit/offset, page/per_page, cursor). None se non è paginata.
+    """
+    params = {param.get('name'): param for param in details.get('parameters', [])
+              if isinstance(param, dict) and param.get('in') == 'query'}
+    declared = details.get('x-pagination')
+    limit = next((name for name in _LIMIT_PARAMS if name in params), None)
+    if isinstance(declared, dict):
+        pagination = dict(declared)
+    elif limit and any(name in params for name in _OFFSET_PARAMS):
+        offset = next(name for name in _OFFSET_PARAMS if name in params)
+        pagination = {"style": "offset", "limit_param": limit, "offset_param": offset}
+    elif any(name in params for name in _PAGE_PARAMS):
+        page = next(name for name in _PAGE_PARAMS if name in params)
+        pagination = {"style": "page", "page_param": page, "limit_param": limit}
+    elif any(name in params for name in _CURSOR_PARAMS):
+        cursor = next(name for name in _CURSOR_PARAMS if name in params)
+        pagination = {"style": "cursor", "cursor_param": cursor, "limit_param": limit}
+    else:
+        return None
+    # Il massimo dichiarato per il parametro limit è la pagina più grande che il server accetta
+    maximum = ((params.get(pagination.get("limit_param")) or {}).get('schema') or {}).get('maximum')
+    if maximum and "max_page_size" not in pagination:
+        pagination["max_page_size"] = int(maximum)
+    return {name: value for name, value in pagination.items() if value is not None}
+
+
+def _extract_openapi_functions(schema, base_url, source, resolver=None):
+    functions = []
     for path, methods in schema.get('paths', {}).items():
+        if resolver is not None and "$ref" in methods:
+            methods = resolver.resolve(methods)
         for method, details in methods.items():
             if not isinstance(details, dict): continue
+            if resolver is not None:
+                # Risolviamo i $ref solo delle operazioni che finiscono nel catalogo
+                details = resolver.resolve(details)
 
             description = details.get('description') or details.get('summary', '')
             function_name = details.get('operationId') or details.get('summary', f"{method.upper()} {path}")
+            metadata = {
+                "name": function_name,
+                "type": "rest",
+                "base_url": base_url, # <-- Usa il base_url dinamico
+                "path_template": path,
+                "method": method.upper()
+            }
+            # Estensione x-batch: variante batch dell'operazione sullo stesso server
+            batch = details.get('x-batch')
+            if isinstance(batch, dict) and batch.get('path'):
+                batch_method = batch.get('method', 'GET').upper()
+                metadata["batch"] = {
+                    "operation": f"{batch_method} {batch['path']}",
+                    "path_template": batch['path'],
+                    "method": batch_method,
+                    "key_param": batch.get('key_param'),
+                    "param": batch.get('param'),
+                    "key_field": batch.get('key_field'),
+                }
+            # Liste paginate: l'executor legge le pagine finché servono elementi
+            pagination = _openapi_pagination(details) if method.upper() == "GET" else None
+            if pagination:
+                metadata["pagination"] = pagination
             functions.append({
                 "type": "rest",
-                "name": details.get('operationId') or details.get('summary', f"{method.upper()} {path}"),
+                "name": function_name,
                 "description": description,
-                "metadata": {
-                    "name": function_name, 
-                    "type": "rest",
-                    "base_url": base_url, # <-- Usa il base_url dinamico
-                    "path_template": path,
-                    "method": method.upper()
-                },
-                "source_contract": json.dumps({path: {method: details}}, indent=2) 
+                "source": source,
+                "metadata": metadata,
+                "source_contract": json.dumps({path: {method: details}}, indent=2)
             })
-            
+    return functions
+
+
+def parse_openapi_schema(schema_url, cache=None):
+    """
+    Scarica la specifica OpenAPI e ne estrae un endpoint per operazione, con il base_url
+    ricavato dall'URL. Con una SpecCache usa richieste condizionali: se la specifica
+    non è cambiata (304 o stesso hash) restituisce le funzioni già estratte.
+    """
+    print(f"   Download e parsing da {schema_url}...")
+    headers = cache.conditional_headers(schema_url) if cache is not None else {}
+    try:
+        with profile_stage("rete.openapi"):
+            response = get_http_session().get(schema_url, headers=headers, timeout=OPENAPI_FETCH_TIMEOUT)
+        cached = cache.get(schema_url) if cache is not None else None
+        if response.status_code == 304 and cached is not None:
+            print(f"   -> ♻️ {schema_url} non modificato (304), riuso {len(cached['functions'])} endpoint dalla cache.")
+            return cached["functions"]
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        print(f"   ❌ Impossibile scaricare lo schema: {e}")
+        return []
+
+    body_hash = content_hash(response.content)
+    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    if cached is not None and cached["content_hash"] == body_hash:
+        print(f"   -> ♻️ {schema_url} invariato (stesso hash), riuso {len(cached['functions'])} endpoint dalla cache.")
+        cache.put(schema_url, etag, last_modified, body_hash, cached["functions"])
+        return cached["functions"]
+
+    # --- LOGICA DINAMICA PER IL BASE URL ---
+    # Estrae lo schema (http/https), l'host (es. 'rest_server') e la porta (es. 8001) dall'URL
+    parsed_url = urlparse(schema_url)
+    base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    print(f"   -> Base URL rilevato: {base_url}")
+
+    try:
+        with profile_stage("parsing.openapi_refs"):
+            schema = _load_spec(response.content)
+            functions = _extract_openapi_functions(schema, base_url, f"openapi:{schema_url}", _LazyRefResolver(schema))
+    except _RemoteRefError as e:
+        # $ref verso file esterni: ripieghiamo sulla risoluzione completa di prance
+        print(f"   -> Riferimento esterno {e}, uso la risoluzione completa.")
+        try:
+            from prance import ResolvingParser
+            with profile_stage("parsing.openapi_refs"):
+                schema = ResolvingParser(schema_url, strict=False).specification
+                functions = _extract_openapi_functions(schema, base_url, f"openapi:{schema_url}")
+        except Exception as e:
+            print(f"   ❌ Impossibile parsare lo schema: {e}")
+            return []
+    except Exception as e:
+        print(f"   ❌ Impossibile parsare lo schema: {e}")
+        return []
+
+    if cache is not None:
+        cache.put(schema_url, etag, last_modified, body_hash, functions)
     print(f"   -> ✅ Trovati {len(functions)} endpoint.")
     return functions
+
+
+def parse_openapi_targets(targets, ready_timeout, max_workers=OPENAPI_MAX_WORKERS, cache=None):
+    """
+    Attende e parsa i server REST in parallelo (al massimo `max_workers` alla volta).
+    Le funzioni sono restituite nell'ordine dei target; i server non pronti sono saltati.
+    Un target può avere "tenant" ed "environment" propri, copiati sulle sue funzioni.
+    """
+    def parse_target(api):
+        print(f"--- Scansione API REST: {api['name']} ---")
+        # Attendiamo che il server sia davvero pronto invece di una pausa fissa
+        if not wait_until_ready(api["url"], ready_timeout):
+            print(f"   ❌ {api['name']} non pronto dopo {ready_timeout:.0f}s, lo salto.")
+            return []
+        functions = parse_openapi_schema(api["url"], cache)
+        # Namespace del target, se diverso da quello dell'indexer (copie: le funzioni in cache restano intatte)
+        namespace = {key: api[key] for key in ("tenant", "environment") if key in api}
+        return [{**function, **namespace} for function in functions] if namespace else functions
+
+    if not targets:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(targets)))) as pool:
+        results = list(pool.map(parse_target, targets))
+    if cache is not None:
+        cache.save()
+    return [function for functions in results for function in functions]
@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import threading
+
+# Cache delle specifiche OpenAPI già indicizzate: validatori HTTP, hash del contenuto e funzioni estratte
+OPENAPI_CACHE_PATH = os.getenv("OPENAPI_CACHE_PATH", ".cache/openapi_specs.json")
+
+# Da incrementare quando cambia il formato delle funzioni estratte: invalida la cache esistente
+_CACHE_FORMAT = 2
+
+
+def content_hash(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+class SpecCache:
+    """
+    Cache su file delle specifiche OpenAPI, per URL. Permette richieste condizionali
+    (ETag / Last-Modified) e, se il server non le supporta, di riconoscere dal hash
+    una specifica invariata senza rifarne la risoluzione.
+    """
+    def __init__(self, path=OPENAPI_CACHE_PATH):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                if data.get("format") == _CACHE_FORMAT:
+                    self._entries = data.get("specs", {})
+            except (OSError, ValueError) as e:
+                print(f"   ⚠️ Cache OpenAPI illeggibile ({e}), la ignoro.")
+
+    def get(self, url):
+        with self._lock:
+            return self._entries.get(url)
+
+    def conditional_headers(self, url):
+        entry = self.get(url)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, etag, last_modified, body_hash, functions):
+        with self._lock:
+            self._entries[url] = {
+                "etag": etag,
+                "last_modified": last_modified,
+                "content_hash": body_hash,
+                "functions": functions,
+            }
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Scrittura atomica: un indexer interrotto non lascia un file a metà
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"format": _CACHE_FORMAT, "specs": self._entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
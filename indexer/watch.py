@@ -0,0 +1,132 @@
+import os
+import glob
+import time
+
+import psycopg2
+
+from indexer.parsers import grpc_source, parse_grpc_contracts, parse_graphql_schema, parse_openapi_schema
+from indexer.db_utils import function_namespace, sync_source, bump_catalog_version
+from utils.database import get_db_connection
+
+# Ogni quanto si controlla contracts/, quanto attendere che le modifiche si fermino
+# e ogni quanto si interrogano (con richieste condizionali) le specifiche OpenAPI
+WATCH_POLL_INTERVAL = float(os.getenv("INDEXER_WATCH_INTERVAL", "1"))
+WATCH_DEBOUNCE = float(os.getenv("INDEXER_WATCH_DEBOUNCE", "2"))
+WATCH_OPENAPI_INTERVAL = float(os.getenv("INDEXER_WATCH_OPENAPI_INTERVAL", "30"))
+
+
+class ContractsWatcher:
+    """
+    Indicizzazione continua: osserva i file di contracts/ e interroga periodicamente i server REST.
+    Le modifiche ravvicinate (un editor che salva più volte) vengono raggruppate e solo le
+    sorgenti toccate vengono risincronizzate; a ogni cambiamento la versione del catalogo
+    sale e gli agenti in ascolto aggiornano le proprie cache.
+    """
+    def __init__(self, conn, spec_cache, get_embedding_func, contracts_dir, graphql_schema_path, rest_targets):
+        self.conn = conn
+        self.spec_cache = spec_cache
+        self.get_embedding_func = get_embedding_func
+        self.contracts_dir = contracts_dir
+        self.graphql_schema_path = graphql_schema_path
+        self.rest_targets = rest_targets
+        self._snapshot = self._scan()
+        self._pending = set()
+        self._last_change = None
+
+    def _scan(self):
+        """{percorso: (mtime, dimensione)} dei file osservati."""
+        paths = glob.glob(os.path.join(self.contracts_dir, "*.proto")) + [self.graphql_schema_path]
+        snapshot = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def run(self):
+        print(f"\n👀 Modalità watch: osservo {self.contracts_dir}/ e {len(self.rest_targets)} specifiche OpenAPI (Ctrl+C per uscire).")
+        next_openapi_check = time.monotonic() + WATCH_OPENAPI_INTERVAL
+        while True:
+            time.sleep(WATCH_POLL_INTERVAL)
+            now = time.monotonic()
+
+            snapshot = self._scan()
+            changed = {path for path in snapshot.keys() | self._snapshot.keys() if snapshot.get(path) != self._snapshot.get(path)}
+            if changed:
+                self._snapshot = snapshot
+                self._pending |= changed
+                self._last_change = now
+
+            if self._pending and now - self._last_change >= WATCH_DEBOUNCE:
+                pending, self._pending = self._pending, set()
+                print(f"\n📝 Contratti modificati: {', '.join(sorted(pending))}")
+                if not self._reindex(lambda: self._sync_contracts(pending)):
+                    # Si riprova dopo un altro intervallo di debounce, insieme alle modifiche nel frattempo
+                    self._pending |= pending
+                    self._last_change = now
+
+            if now >= next_openapi_check:
+                self._reindex(self._sync_openapi)
+                next_openapi_check = time.monotonic() + WATCH_OPENAPI_INTERVAL
+
+    def _reindex(self, sync):
+        """Esegue una sincronizzazione; restituisce False se è fallita e va ripetuta."""
+        try:
+            changed = sync()
+            if changed:
+                bump_catalog_version(self.conn)
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            print(f"   ♻️ Connessione al database persa ({e}), mi riconnetto.")
+            self._reconnect()
+        except Exception as e:
+            # Un contratto malformato o un server irraggiungibile non devono fermare il watch
+            print(f"   ❌ Reindicizzazione fallita: {e}")
+            if not self.conn.closed:
+                try:
+                    self.conn.rollback()
+                except psycopg2.Error:
+                    self._reconnect()
+        return False
+
+    def _reconnect(self):
+        # Se il database non risponde ancora si tiene la connessione vecchia e si riprova al giro dopo
+        conn = get_db_connection()
+        if conn is None or conn.closed:
+            return
+        try:
+            self.conn.close()
+        except psycopg2.Error:
+            pass
+        self.conn = conn
+
+    def _sync_contracts(self, pending):
+        changed = 0
+        if any(path.endswith(".proto") for path in pending):
+            # Un .proto può importarne altri: si riparsano tutti, gli hash limitano le scritture ai soli cambiati
+            by_source = {}
+            for func in parse_grpc_contracts(self.contracts_dir):
+                by_source.setdefault(func["source"], []).append(func)
+            proto_paths = {path for path in self._snapshot if path.endswith(".proto")}
+            for path in proto_paths | {path for path in pending if path.endswith(".proto")}:
+                source = grpc_source(path)
+                changed += sync_source(self.conn, source, by_source.get(source, []), self.get_embedding_func,
+                                       allow_empty=path not in proto_paths)
+        if self.graphql_schema_path in pending:
+            exists = self.graphql_schema_path in self._snapshot
+            functions = parse_graphql_schema(self.graphql_schema_path) if exists else []
+            changed += sync_source(self.conn, f"graphql:{self.graphql_schema_path}", functions,
+                                   self.get_embedding_func, allow_empty=not exists)
+        return changed
+
+    def _sync_openapi(self):
+        changed = 0
+        for api in self.rest_targets:
+            # Con la SpecCache una specifica invariata costa una richiesta condizionale
+            functions = parse_openapi_schema(api["url"], self.spec_cache)
+            changed += sync_source(self.conn, f"openapi:{api['url']}", functions, self.get_embedding_func,
+                                   namespace=function_namespace(api))
+        self.spec_cache.save()
+        return changed
@@ -0,0 +1,136 @@
+# servers/demo_data.py
+"""
+Dati sintetici e utility condivise dai server demo REST (ordini, recensioni, geocoding).
+
+Con DEMO_DATA_ROWS=N ogni server aggiunge ai suoi dati fissi N righe generate in modo
+deterministico (DEMO_DATA_SEED): gli stessi ID e indirizzi in tutti i server, così ordini,
+recensioni e coordinate restano collegati. Scala fino a 1M righe per server.
+
+Uso da riga di comando (anteprima e tempo di generazione):
+  python demo_data.py --rows 1000000
+"""
+import os
+import time
+import random
+import argparse
+
+DEMO_DATA_ROWS = int(os.getenv("DEMO_DATA_ROWS", "0"))
+DEMO_DATA_SEED = int(os.getenv("DEMO_DATA_SEED", "42"))
+DEFAULT_PAGE_SIZE = int(os.getenv("DEMO_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("DEMO_MAX_PAGE_SIZE", "1000"))
+
+_STREETS = ["Via Roma", "Corso Italia", "Via Garibaldi", "Via Mazzini", "Piazza Duomo", "Via Verdi",
+            "Viale Europa", "Via Dante", "Corso Vittorio Emanuele", "Via Cavour"]
+# (CAP, città, provincia, latitudine, longitudine)
+_CITIES = [
+    ("10121", "Torino", "TO", 45.0703, 7.6869),
+    ("20121", "Milano", "MI", 45.4642, 9.1895),
+    ("00184", "Roma", "RM", 41.8902, 12.4922),
+    ("40121", "Bologna", "BO", 44.4949, 11.3426),
+    ("50122", "Firenze", "FI", 43.7696, 11.2558),
+    ("80132", "Napoli", "NA", 40.8518, 14.2681),
+]
+_STATUSES = ["Processing", "Shipped", "Delivered", "Cancelled"]
+_COMMENTS = ["Fantastico!", "Non mi è piaciuto.", "Buon prodotto, consigliato.", "Nella media.",
+             "Spedizione lenta ma prodotto ok.", "Pessimo, da evitare."]
+
+
+def normalize_address(address):
+    """Chiave dell'indice degli indirizzi: maiuscole e spazi non contano."""
+    return " ".join(address.casefold().split())
+
+
+def synthetic_sizes(rows=DEMO_DATA_ROWS):
+    """Quanti utenti, prodotti e indirizzi distinti servono per `rows` righe."""
+    return {"users": max(rows // 10, 1), "products": max(rows // 100, 1), "addresses": max(rows // 10, 1)}
+
+
+def synthetic_address(index):
+    """Indirizzo sintetico `index` con le sue coordinate: lo stesso per ordini e geocoding."""
+    cap, city, province, lat, lon = _CITIES[index % len(_CITIES)]
+    street = _STREETS[(index // len(_CITIES)) % len(_STREETS)]
+    number = index // (len(_CITIES) * len(_STREETS)) + 2
+    # Piccolo spostamento deterministico attorno al centro città
+    offset = ((index * 7919) % 1000) / 100000
+    return f"{street} {number}, {cap} {city} {province}, Italia", round(lat + offset, 6), round(lon - offset, 6)
+
+
+def synthetic_orders(rows=DEMO_DATA_ROWS, seed=DEMO_DATA_SEED):
+    sizes = synthetic_sizes(rows)
+    rng = random.Random(seed)
+    addresses = [synthetic_address(i)[0] for i in range(sizes["addresses"])]
+    for i in range(rows):
+        yield {
+            "orderId": f"ord-s{i:07d}",
+            "userId": rng.randrange(sizes["users"]) + 1,
+            "productIds": [str(1000 + rng.randrange(sizes["products"])) for _ in range(rng.randint(1, 3))],
+            "shippingAddress": addresses[rng.randrange(len(addresses))],
+            "status": _STATUSES[rng.randrange(len(_STATUSES))],
+        }
+
+
+def synthetic_reviews(rows=DEMO_DATA_ROWS, seed=DEMO_DATA_SEED):
+    sizes = synthetic_sizes(rows)
+    rng = random.Random(seed + 1)
+    for i in range(rows):
+        yield {
+            "reviewId": f"rev-s{i:07d}",
+            "productId": str(1000 + rng.randrange(sizes["products"])),
+            "userId": rng.randrange(sizes["users"]) + 1,
+            "rating": rng.randint(1, 5),
+            "comment": _COMMENTS[rng.randrange(len(_COMMENTS))],
+        }
+
+
+def synthetic_addresses(rows=DEMO_DATA_ROWS):
+    for i in range(synthetic_sizes(rows)["addresses"] if rows else 0):
+        yield synthetic_address(i)
+
+
+# Estensione x-pagination delle liste paginate: l'executor dell'agente legge le pagine in sequenza
+PAGINATION = {"style": "offset", "limit_param": "limit", "offset_param": "offset", "total_header": "X-Total-Count"}
+
+
+def paginate(keys, limit, offset, request, response):
+    """
+    Pagina limit/offset su una lista di chiavi già ordinata (un indice). Imposta X-Total-Count
+    e, se ci sono altre pagine, l'header Link rel="next" con l'URL della pagina successiva.
+    """
+    total = len(keys)
+    page = keys[offset:offset + limit]
+    response.headers["X-Total-Count"] = str(total)
+    if offset + limit < total:
+        next_url = request.url.include_query_params(offset=offset + limit, limit=limit)
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return page
+
+
+def add_server_timing(app):
+    """Header Server-Timing (app;dur=ms) su ogni risposta: il load test misura il tempo lato server."""
+    @app.middleware("http")
+    async def server_timing(request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        response.headers["Server-Timing"] = f"app;dur={(time.perf_counter() - start) * 1000:.3f}"
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=DEMO_DATA_SEED)
+    args = parser.parse_args()
+
+    for name, generator in [("ordini", synthetic_orders(args.rows, args.seed)),
+                            ("recensioni", synthetic_reviews(args.rows, args.seed)),
+                            ("indirizzi", synthetic_addresses(args.rows))]:
+        start = time.perf_counter()
+        first, count = None, 0
+        for row in generator:
+            first = first or row
+            count += 1
+        print(f"{name:<12}{count:>10,} righe in {time.perf_counter() - start:.2f}s   es. {first}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,20 @@
 # servers/geo_server.py
-from fastapi import FastAPI
+from typing import List
+
+from fastapi import FastAPI, HTTPException, Query
 from pydantic import BaseModel
 
+from demo_data import add_server_timing, normalize_address, synthetic_addresses
+
 class Coordinates(BaseModel):
     latitude: float
     longitude: float
 
+class GeocodedAddress(Coordinates):
+    address: str
+
 app = FastAPI(title="Geolocation Utility API")
+add_server_timing(app)
 
 # Nota: questi indirizzi corrispondono a quelli nel server degli ordini
 ADDRESS_COORDINATES = {
@@ -14,10 +22,36 @@ ADDRESS_COORDINATES = {
     "Piazza Duomo 1, 20121 Milano MI, Italia": Coordinates(latitude=45.4642, longitude=9.1895),
 }
 
-@app.get("/geocode", response_model=Coordinates, summary="Converte un indirizzo stradale in coordinate GPS")
+# Variante batch dichiarata nella specifica OpenAPI: più geocodifiche singole diventano una chiamata a /geocode/batch
+GEOCODE_BATCH = {"path": "/geocode/batch", "method": "GET", "key_param": "address", "param": "addresses", "key_field": "address"}
+
+# Indice per indirizzo normalizzato (maiuscole e spazi non contano), con gli indirizzi sintetici di DEMO_DATA_ROWS
+COORDINATES_BY_ADDRESS = {normalize_address(addr): coords for addr, coords in ADDRESS_COORDINATES.items()}
+COORDINATES_BY_ADDRESS.update(
+    (normalize_address(addr), Coordinates(latitude=lat, longitude=lon)) for addr, lat, lon in synthetic_addresses()
+)
+
+def _lookup(address):
+    return COORDINATES_BY_ADDRESS.get(normalize_address(address))
+
+@app.get("/geocode", response_model=Coordinates, summary="Converte un indirizzo stradale in coordinate GPS",
+         openapi_extra={"x-batch": GEOCODE_BATCH})
 def geocode_address(address: str):
     """Prende un indirizzo stradale completo e restituisce le sue coordinate geografiche (latitudine e longitudine)."""
-    for addr, coords in ADDRESS_COORDINATES.items():
-        if address.lower() == addr.lower():
-            return coords
-    return None
\ No newline at end of file
+    coords = _lookup(address)
+    if coords is None:
+        raise HTTPException(status_code=404, detail="Indirizzo non trovato.")
+    return coords
+
+@app.get("/geocode/batch", response_model=List[GeocodedAddress], summary="Converte più indirizzi stradali in coordinate GPS")
+def geocode_addresses(addresses: List[str] = Query(...)):
+    """
+    Geocodifica più indirizzi in una sola chiamata ('addresses' ripetuto). Ogni risultato riporta l'indirizzo
+    come è stato richiesto; gli indirizzi sconosciuti vengono omessi.
+    """
+    results = []
+    for address in dict.fromkeys(addresses):
+        coords = _lookup(address)
+        if coords is not None:
+            results.append(GeocodedAddress(address=address, **coords.model_dump()))
+    return results
\ No newline at end of file
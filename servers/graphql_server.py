@@ -26,6 +26,11 @@ class Query:
             return Product(**product_data)
         return None
 
+    @strawberry.field
+    def getProducts(self, productIds: list[strawberry.ID]) -> list[Product]:
+        print(f"Richiesta GraphQL batch ricevuta per {len(productIds)} prodotti: {productIds}")
+        return [Product(**FAKE_PRODUCTS[product_id]) for product_id in dict.fromkeys(productIds) if product_id in FAKE_PRODUCTS]
+
 @strawberry.type
 class Mutation:
     @strawberry.mutation
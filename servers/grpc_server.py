@@ -6,6 +6,12 @@ import time
 import user_service_pb2
 import user_service_pb2_grpc
 
+# Server reflection: permette all'agente di leggere i descrittori senza i file .proto
+try:
+    from grpc_reflection.v1alpha import reflection
+except ImportError:
+    reflection = None
+
 # Dati finti per il nostro server
 FAKE_USERS = {
     1: {"id": 1, "name": "Mario Rossi", "email": "mario.rossi@example.com", "is_active": True},
@@ -25,9 +31,26 @@ class UserServiceServicer(user_service_pb2_grpc.UserServiceServicer):
             context.set_details(f"Utente con ID {request.id} non trovato.")
             return user_service_pb2.UserResponse()
 
+    def BatchGetUsers(self, request, context):
+        print(f"Richiesta gRPC batch ricevuta per {len(request.ids)} utenti: {list(request.ids)}")
+        users, missing_ids = [], []
+        for user_id in dict.fromkeys(request.ids):
+            user_data = FAKE_USERS.get(user_id)
+            if user_data:
+                users.append(user_service_pb2.UserResponse(**user_data))
+            else:
+                missing_ids.append(user_id)
+        return user_service_pb2.BatchGetUsersResponse(users=users, missing_ids=missing_ids)
+
 def serve():
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
     user_service_pb2_grpc.add_UserServiceServicer_to_server(UserServiceServicer(), server)
+    if reflection is not None:
+        service_names = (
+            user_service_pb2.DESCRIPTOR.services_by_name["UserService"].full_name,
+            reflection.SERVICE_NAME,
+        )
+        reflection.enable_server_reflection(service_names, server)
     server.add_insecure_port('[::]:50051')
     print("Avvio del server gRPC sulla porta 50051...")
     server.start()
@@ -1,8 +1,12 @@
 # File: servers/rest_server.py
-from fastapi import FastAPI, HTTPException
+from collections import defaultdict
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
 
+from demo_data import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PAGINATION, add_server_timing, paginate, synthetic_orders
+
 class Order(BaseModel):
     orderId: str
     userId: int # Usiamo userId per coerenza
@@ -11,6 +15,7 @@ class Order(BaseModel):
     status: str
 
 app = FastAPI(title="Orders API")
+add_server_timing(app)
 
 FAKE_ORDERS_DB = {
     "ord-001": Order(
@@ -29,14 +34,44 @@ FAKE_ORDERS_DB = {
     ),
 }
 
-@app.get("/orders/{order_id}", response_model=Order, summary="Recupera i dettagli di un singolo ordine")
+# Indici: ordini per ID (in ordine di inserimento) e ID degli ordini di ogni utente.
+# Con DEMO_DATA_ROWS si aggiungono gli ordini sintetici per i load test.
+ORDERS_BY_ID = {order_id: order.model_dump() for order_id, order in FAKE_ORDERS_DB.items()}
+ORDERS_BY_ID.update((order["orderId"], order) for order in synthetic_orders())
+ORDER_IDS = list(ORDERS_BY_ID)
+ORDER_IDS_BY_USER = defaultdict(list)
+for order in ORDERS_BY_ID.values():
+    ORDER_IDS_BY_USER[order["userId"]].append(order["orderId"])
+
+# Variante batch dichiarata nella specifica OpenAPI: l'agente può unire più lookup singoli in una chiamata a /orders?ids=
+ORDER_BATCH = {"path": "/orders", "method": "GET", "key_param": "order_id", "param": "ids", "key_field": "orderId"}
+
+@app.get("/orders/{order_id}", response_model=Order, summary="Recupera i dettagli di un singolo ordine",
+         openapi_extra={"x-batch": ORDER_BATCH})
 def get_order_details(order_id: str):
     """Ottiene i dati completi di un ordine, inclusi l'ID utente, i prodotti e l'indirizzo di spedizione."""
-    return FAKE_ORDERS_DB.get(order_id)
-
-@app.get("/orders", response_model=List[Order], summary="Elenca gli ordini, filtrabili per utente")
-def list_orders_for_user(user_id: Optional[int] = None):
-    """Restituisce una lista di ordini. Se viene fornito un 'user_id' numerico, filtra gli ordini per quel cliente."""
-    if user_id:
-        return [order for order in FAKE_ORDERS_DB.values() if order.userId == user_id]
-    return list(FAKE_ORDERS_DB.values())
\ No newline at end of file
+    order = ORDERS_BY_ID.get(order_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Ordine non trovato.")
+    return order
+
+@app.get("/orders", response_model=List[Order], summary="Elenca gli ordini, filtrabili per utente o per ID",
+         openapi_extra={"x-pagination": PAGINATION})
+def list_orders_for_user(request: Request, response: Response, user_id: Optional[int] = None,
+                         ids: Optional[List[str]] = Query(None),
+                         limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0)):
+    """
+    Restituisce una lista di ordini. Se viene fornito un 'user_id' numerico, filtra gli ordini per quel cliente.
+    Con 'ids' (ripetuto, es. ?ids=ord-001&ids=ord-002) restituisce quegli ordini in una sola chiamata; gli ID inesistenti vengono ignorati.
+    I risultati sono paginati con 'limit' e 'offset': X-Total-Count riporta il totale e l'header Link la pagina successiva.
+    """
+    if ids:
+        # Accettiamo anche la forma separata da virgole (?ids=ord-001,ord-002)
+        wanted = dict.fromkeys(order_id.strip() for value in ids for order_id in value.split(","))
+        keys = [order_id for order_id in wanted
+                if order_id in ORDERS_BY_ID and (not user_id or ORDERS_BY_ID[order_id]["userId"] == user_id)]
+    elif user_id:
+        keys = ORDER_IDS_BY_USER.get(user_id, [])
+    else:
+        keys = ORDER_IDS
+    return [ORDERS_BY_ID[order_id] for order_id in paginate(keys, limit, offset, request, response)]
\ No newline at end of file
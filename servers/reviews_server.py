@@ -1,8 +1,12 @@
 # servers/reviews_server.py
-from fastapi import FastAPI, HTTPException
+from collections import defaultdict
+
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from pydantic import BaseModel
 from typing import List, Optional
 
+from demo_data import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, PAGINATION, add_server_timing, paginate, synthetic_reviews
+
 class Review(BaseModel):
     reviewId: str
     productId: str
@@ -17,6 +21,7 @@ class CreateReviewRequest(BaseModel):
     comment: str
 
 app = FastAPI(title="Product Reviews API")
+add_server_timing(app)
 
 FAKE_REVIEWS_DB = [
     Review(reviewId="rev-01", productId="prod-123", userId=1, rating=5, comment="Fantastico!"),
@@ -24,32 +29,53 @@ FAKE_REVIEWS_DB = [
     Review(reviewId="rev-03", productId="prod-123", userId=2, rating=4, comment="Buon prodotto, consigliato."),
 ]
 
-# In servers/reviews_server.py
+# Indici: recensioni per ID (in ordine di inserimento) e ID delle recensioni per prodotto e per utente.
+# Con DEMO_DATA_ROWS si aggiungono le recensioni sintetiche per i load test.
+REVIEWS_BY_ID = {}
+REVIEW_IDS = []
+REVIEW_IDS_BY_PRODUCT = defaultdict(list)
+REVIEW_IDS_BY_USER = defaultdict(list)
+
+def _index_review(review):
+    REVIEWS_BY_ID[review["reviewId"]] = review
+    REVIEW_IDS.append(review["reviewId"])
+    REVIEW_IDS_BY_PRODUCT[review["productId"]].append(review["reviewId"])
+    REVIEW_IDS_BY_USER[review["userId"]].append(review["reviewId"])
 
-@app.get("/reviews", response_model=List[Review], summary="Ottiene recensioni, filtrabili per prodotto O per utente")
-def get_reviews(product_id: Optional[str] = None, user_id: Optional[int] = None):
+for review in FAKE_REVIEWS_DB:
+    _index_review(review.model_dump())
+for review in synthetic_reviews():
+    _index_review(review)
+
+@app.get("/reviews", response_model=List[Review], summary="Ottiene recensioni, filtrabili per prodotto O per utente",
+         openapi_extra={"x-pagination": PAGINATION})
+def get_reviews(request: Request, response: Response, product_id: Optional[str] = None, user_id: Optional[int] = None,
+                limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), offset: int = Query(0, ge=0)):
     """
     Restituisce una lista di recensioni.
     Eventualmente puoi filtrare o per 'product_id' o per 'user_id'.
+    I risultati sono paginati con 'limit' e 'offset': X-Total-Count riporta il totale e l'header Link la pagina successiva.
     """
-    if product_id:
-        return [r for r in FAKE_REVIEWS_DB if r.productId == product_id]
-    if user_id:
-        return [r for r in FAKE_REVIEWS_DB if r.userId == user_id]
-    
-    return FAKE_REVIEWS_DB
-    
-    # Se nessuno dei due è fornito, restituisci un errore
-    raise HTTPException(status_code=400, detail="Devi fornire o 'product_id' o 'user_id'.")
+    if product_id and user_id:
+        # Scorriamo l'indice più piccolo e filtriamo sull'altro campo
+        keys = [review_id for review_id in REVIEW_IDS_BY_PRODUCT.get(product_id, [])
+                if REVIEWS_BY_ID[review_id]["userId"] == user_id]
+    elif product_id:
+        keys = REVIEW_IDS_BY_PRODUCT.get(product_id, [])
+    elif user_id:
+        keys = REVIEW_IDS_BY_USER.get(user_id, [])
+    else:
+        keys = REVIEW_IDS
+    return [REVIEWS_BY_ID[review_id] for review_id in paginate(keys, limit, offset, request, response)]
 
 # Aggiungiamo l'endpoint che mancava!
 @app.get("/reviews/{review_id}", response_model=Review, summary="Ottiene una singola recensione dal suo ID")
 def get_review_by_id(review_id: str):
     """Restituisce i dettagli di una singola recensione dato il suo 'review_id' (es. 'rev-02')."""
-    for review in FAKE_REVIEWS_DB:
-        if review.reviewId == review_id:
-            return review
-    raise HTTPException(status_code=404, detail="Recensione non trovata.")
+    review = REVIEWS_BY_ID.get(review_id)
+    if review is None:
+        raise HTTPException(status_code=404, detail="Recensione non trovata.")
+    return review
 
 @app.post("/reviews", response_model=Review, summary="Crea una nuova recensione")
 def create_review(review_data: CreateReviewRequest):
@@ -68,6 +94,9 @@ def create_review(review_data: CreateReviewRequest):
     # In produzione useresti un UUID o un ID dal database
     next_review_number = len(FAKE_REVIEWS_DB) + 1
     new_review_id = f"rev-{next_review_number:02d}"
+    while new_review_id in REVIEWS_BY_ID:
+        next_review_number += 1
+        new_review_id = f"rev-{next_review_number:02d}"
     
     # Crea la nuova recensione
     new_review = Review(
@@ -78,7 +107,8 @@ def create_review(review_data: CreateReviewRequest):
         comment=review_data.comment
     )
     
-    # Aggiungi al "database" fake
+    # Aggiungi al "database" fake e agli indici
     FAKE_REVIEWS_DB.append(new_review)
+    _index_review(new_review.model_dump())
     
     return new_review
\ No newline at end of file
@@ -40,6 +40,11 @@ class UserServiceStub(object):
                 request_serializer=user__service__pb2.GetUserRequest.SerializeToString,
                 response_deserializer=user__service__pb2.UserResponse.FromString,
                 _registered_method=True)
+        self.BatchGetUsers = channel.unary_unary(
+                '/user.UserService/BatchGetUsers',
+                request_serializer=user__service__pb2.BatchGetUsersRequest.SerializeToString,
+                response_deserializer=user__service__pb2.BatchGetUsersResponse.FromString,
+                _registered_method=True)
 
 
 class UserServiceServicer(object):
@@ -49,6 +54,15 @@ class UserServiceServicer(object):
     def GetUser(self, request, context):
         """Recupera un utente specifico dato il suo ID.
         Usa questa funzione quando ti viene chiesto di trovare un utente specifico.
+        @batch {"rpc": "BatchGetUsers", "key_param": "id", "param": "ids", "results": "users", "key_field": "id"}
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchGetUsers(self, request, context):
+        """Recupera più utenti in una sola chiamata dati i loro ID.
+        Usa questa funzione quando servono i dettagli di più utenti insieme.
         """
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
@@ -62,6 +76,11 @@ def add_UserServiceServicer_to_server(servicer, server):
                     request_deserializer=user__service__pb2.GetUserRequest.FromString,
                     response_serializer=user__service__pb2.UserResponse.SerializeToString,
             ),
+            'BatchGetUsers': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchGetUsers,
+                    request_deserializer=user__service__pb2.BatchGetUsersRequest.FromString,
+                    response_serializer=user__service__pb2.BatchGetUsersResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'user.UserService', rpc_method_handlers)
@@ -100,3 +119,30 @@ class UserService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def BatchGetUsers(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/user.UserService/BatchGetUsers',
+            user__service__pb2.BatchGetUsersRequest.SerializeToString,
+            user__service__pb2.BatchGetUsersResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
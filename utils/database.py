@@ -1,5 +1,11 @@
 import os
+import time
+import weakref
+import threading
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
 from pgvector.psycopg2 import register_vector
 
 DB_NAME = os.getenv("DB_NAME")
@@ -7,6 +13,8 @@ DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_HEALTHCHECK_INTERVAL = float(os.getenv("DB_HEALTHCHECK_INTERVAL", "30"))
 
 def get_db_connection():
     """Stabilisce la connessione al database PostgreSQL."""
@@ -19,4 +27,186 @@ def get_db_connection():
         return conn
     except psycopg2.OperationalError as e:
         print(f"Errore di connessione al database: {e}")
-        return None
\ No newline at end of file
+        return None
+
+class DatabasePool:
+    """
+    Pool di connessioni condiviso tra le sessioni dell'agente.
+
+    - Le connessioni si aprono alla prima richiesta che le trova tutte occupate e, restituite,
+      restano aperte tra quelle libere (al più `maxconn` in tutto), con i loro statement preparati.
+    - Quando il pool è esaurito `connection()` attende che se ne liberi una.
+    - Prima di consegnare una connessione rimasta inattiva più di DB_HEALTHCHECK_INTERVAL
+      secondi la verifica con un SELECT 1; quelle rotte vengono chiuse e sostituite.
+    - `run()` riesegue l'operazione una volta su una connessione nuova se quella usata
+      cade a metà (riavvio del DB, timeout di rete), così l'agente non muore con lei.
+    - Tiene traccia degli statement preparati lato server per ogni connessione.
+    """
+    def __init__(self, maxconn=DB_POOL_SIZE):
+        # Nessuna connessione all'avvio: il pool si crea anche se il DB non è ancora raggiungibile
+        self.maxconn = maxconn
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._idle = []  # connessioni libere, l'ultima restituita esce per prima
+        # Stato per connessione (statement preparati, ultimo uso), legato all'oggetto e non al suo id
+        self._state = weakref.WeakKeyDictionary()
+        print(f"Pool di connessioni al database pronto (max {maxconn}).")
+
+    def _connect(self):
+        conn = psycopg2.connect(dbname=DB_NAME, user=DB_USER, password=DB_PASSWORD, host=DB_HOST, port=DB_PORT)
+        register_vector(conn)
+        with self._lock:
+            self._state[conn] = {"prepared": set(), "last_used": time.monotonic()}
+        return conn
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                return self._connect()
+            idle = time.monotonic() - self._state[conn]["last_used"]
+            if not conn.closed and (idle < DB_HEALTHCHECK_INTERVAL or self._is_alive(conn)):
+                return conn
+            print("   ♻️ Connessione al database non valida, la sostituisco.")
+            self._discard(conn)
+
+    @staticmethod
+    def _is_alive(conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        with self._lock:
+            self._state.pop(conn, None)
+        if not conn.closed:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def _release(self, conn):
+        """Rimette la connessione tra quelle libere, o la chiude se è caduta."""
+        if conn.closed:
+            self._discard(conn)
+            return
+        if conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            # Transazione lasciata aperta (es. init di prefill fallito): non passa alla prossima richiesta
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                self._discard(conn)
+                return
+        with self._lock:
+            if len(self._idle) < self.maxconn:
+                self._state[conn]["last_used"] = time.monotonic()
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    def idle_connections(self):
+        """Connessioni aperte e libere, pronte per la prossima richiesta."""
+        with self._lock:
+            return len(self._idle)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            if conn is not None:
+                self._discard(conn)
+                conn = None
+            raise
+        except Exception:
+            if conn is not None and not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            if conn is not None:
+                self._release(conn)
+            self._slots.release()
+
+    def run(self, operation, retries=1):
+        """Esegue operation(conn) riprovando su una connessione nuova se quella corrente cade."""
+        for attempt in range(retries + 1):
+            try:
+                with self.connection() as conn:
+                    return operation(conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if attempt == retries:
+                    raise
+                print(f"   ♻️ Connessione al database persa ({e}), riprovo...")
+
+    def prefill(self, count, init=None):
+        """
+        Apre fino a `count` connessioni insieme e le lascia libere nel pool già pronte, eseguendo
+        `init(conn)` su ciascuna (statement preparati, impostazioni di sessione).
+        Restituisce quante connessioni sono state preparate.
+        """
+        count = min(count, self.maxconn)
+        held = []
+        try:
+            for _ in range(count):
+                self._slots.acquire()
+                try:
+                    conn = self._checkout()
+                except Exception:
+                    self._slots.release()
+                    raise
+                held.append(conn)
+                if init is not None:
+                    init(conn)
+                conn.commit()
+        finally:
+            for conn in held:
+                self._release(conn)
+                self._slots.release()
+        return len(held)
+
+    def ensure_prepared(self, conn, name, sql):
+        """Prepara lo statement lato server la prima volta che questa connessione lo usa."""
+        self.ensure_session(conn, name, f"PREPARE {name} AS {sql}")
+
+    def ensure_session(self, conn, key, sql, commit=False):
+        """
+        Esegue `sql` (PREPARE, SET, ...) una sola volta per connessione. Le SET sono
+        transazionali: con `commit` vengono confermate prima di segnarle come eseguite, così un
+        rollback successivo (es. una PREPARE fallita) non le annulla lasciando la chiave segnata.
+        Va chiamato all'inizio della transazione, prima di altri statement.
+        """
+        with self._lock:
+            prepared = self._state.setdefault(conn, {"prepared": set(), "last_used": time.monotonic()})["prepared"]
+        if key not in prepared:
+            with conn.cursor() as cur:
+                cur.execute(sql)
+            if commit:
+                conn.commit()
+            prepared.add(key)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+def get_catalog_version(conn):
+    """Legge la versione corrente del catalogo API (incrementata a ogni indicizzazione)."""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version FROM catalog_version WHERE id = 1")
+            row = cur.fetchone()
+        return row[0] if row else 0
+    except psycopg2.Error:
+        # Tabella non ancora creata dall'indexer
+        conn.rollback()
+        return 0
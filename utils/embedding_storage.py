@@ -0,0 +1,78 @@
+import os
+
+from utils.embeddings import EMBEDDING_DIMENSIONS
+
+# Rappresentazione compatta per la prima fase della ricerca; i vettori completi restano
+# nella colonna `embedding` e servono al riordino esatto dei candidati.
+#   full      -> nessuna fase grossolana, distanza coseno sui vettori completi
+#   halfvec   -> float16 (metà memoria, recall quasi identica)
+#   truncated -> prime EMBEDDING_COARSE_DIMENSIONS componenti (Matryoshka)
+#   binary    -> 1 bit per componente con distanza di Hamming (32x più compatto)
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "full")
+EMBEDDING_COARSE_DIMENSIONS = int(os.getenv("EMBEDDING_COARSE_DIMENSIONS", "512"))
+EMBEDDING_RERANK_CANDIDATES = int(os.getenv("EMBEDDING_RERANK_CANDIDATES", "100"))
+
+_DIMS = EMBEDDING_DIMENSIONS
+_COARSE = EMBEDDING_COARSE_DIMENSIONS
+
+# (espressione sulla colonna, espressione sul parametro $1, operatore, operator class dell'indice)
+_COARSE_SEARCH = {
+    "halfvec": (f"embedding::halfvec({_DIMS})", f"$1::vector::halfvec({_DIMS})", "<=>", "halfvec_cosine_ops"),
+    "truncated": (f"subvector(embedding, 1, {_COARSE})::vector({_COARSE})",
+                  f"subvector($1::vector, 1, {_COARSE})::vector({_COARSE})", "<=>", "vector_cosine_ops"),
+    "binary": (f"binary_quantize(embedding)::bit({_DIMS})", "binary_quantize($1::vector)", "<~>", "bit_hamming_ops"),
+}
+
+if EMBEDDING_STORAGE != "full" and EMBEDDING_STORAGE not in _COARSE_SEARCH:
+    raise ValueError(f"EMBEDDING_STORAGE non valido: {EMBEDDING_STORAGE} (full, halfvec, truncated, binary)")
+
+
+def nearest_sql(columns, limit_param, where="TRUE", storage=EMBEDDING_STORAGE):
+    """
+    SELECT delle funzioni più vicine a $1 (un vector completo) tra quelle che soddisfano
+    `where`, con `columns` più la distanza coseno esatta come ultima colonna. Con una
+    rappresentazione compatta la ricerca avviene in due fasi: i candidati per distanza
+    grossolana (sull'indice HNSW dell'espressione) e poi il riordino esatto sui vettori completi.
+    """
+    if storage == "full":
+        return f"""
+            SELECT {columns}, embedding <=> $1::vector AS distance
+            FROM api_functions
+            WHERE {where}
+            ORDER BY embedding <=> $1::vector
+            LIMIT {limit_param}
+        """
+    column_expr, param_expr, operator, _ = _COARSE_SEARCH[storage]
+    return f"""
+        SELECT {columns}, embedding <=> $1::vector AS distance
+        FROM (
+            SELECT id FROM api_functions
+            WHERE {where}
+            ORDER BY {column_expr} {operator} {param_expr}
+            LIMIT GREATEST({limit_param}, {EMBEDDING_RERANK_CANDIDATES})
+        ) AS coarse
+        JOIN api_functions USING (id)
+        ORDER BY distance
+        LIMIT {limit_param}
+    """
+
+
+def coarse_index_sql(storage=EMBEDDING_STORAGE):
+    """CREATE INDEX dell'indice HNSW sull'espressione compatta (None per `full`)."""
+    if storage == "full":
+        return None
+    column_expr, _, _, opclass = _COARSE_SEARCH[storage]
+    return (f"CREATE INDEX IF NOT EXISTS api_functions_coarse_{storage}_idx "
+            f"ON api_functions USING hnsw (({column_expr}) {opclass})")
+
+
+def search_session_sql(storage=EMBEDDING_STORAGE):
+    """
+    Impostazioni di sessione per la ricerca: l'indice HNSW restituisce al più ef_search
+    risultati, che devono coprire tutti i candidati da riordinare. Con il filtro sui
+    namespace la scansione iterativa (pgvector >= 0.8) continua finché non li trova.
+    """
+    if storage == "full":
+        return None
+    return (f"SET hnsw.ef_search = {max(EMBEDDING_RERANK_CANDIDATES, 40)}; "
+            "SET hnsw.iterative_scan = relaxed_order")
@@ -1,13 +1,61 @@
 import os
-import openai
-from dotenv import load_dotenv
+import threading
+from collections import OrderedDict
 
-load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
+# openai (centinaia di ms di import) si carica alla prima richiesta di embedding; il client
+# legge OPENAI_API_KEY dall'ambiente, che gli entry point popolano con load_dotenv()
 EMBEDDING_MODEL = "text-embedding-3-small"
+# text-embedding-3-* può restituire vettori accorciati (Matryoshka): cambiarlo richiede di ricreare la tabella
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "1536"))
+# Timeout di una richiesta di embedding (secondi): il default del client OpenAI è di minuti
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "10"))
+# Embedding in memoria (LRU per testo): gli step dei piani si ripetono spesso parola per parola
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _openai_embedding(text, model):
+   import openai
+   if EMBEDDING_DIMENSIONS != 1536:
+      response = openai.embeddings.create(input=[text], model=model, dimensions=EMBEDDING_DIMENSIONS,
+                                          timeout=EMBEDDING_TIMEOUT)
+   else:
+      response = openai.embeddings.create(input=[text], model=model, timeout=EMBEDDING_TIMEOUT)
+   return response.data[0].embedding
+
+_backend = _openai_embedding
+
+def set_embedding_backend(backend):
+   """
+   Sostituisce il backend degli embedding (es. le cassette record/replay dei benchmark).
+   `backend(text, model)` restituisce il vettore. Con None ripristina OpenAI.
+   """
+   global _backend
+   previous = _backend
+   _backend = backend or _openai_embedding
+   # Vettori di un altro backend non sono confrontabili
+   with _cache_lock:
+      _cache.clear()
+   return previous
 
 def get_embedding(text, model=EMBEDDING_MODEL):
-   """Funzione helper per chiamare l'API di embedding di OpenAI."""
+   """Funzione helper per chiamare l'API di embedding di OpenAI (con cache LRU per testo)."""
    text = text.replace("\n", " ")
-   response = openai.embeddings.create(input=[text], model=model)
-   return response.data[0].embedding
\ No newline at end of file
+   key = (model, text)
+   with _cache_lock:
+      vector = _cache.get(key)
+      if vector is not None:
+         _cache.move_to_end(key)
+         return vector
+   vector = _backend(text, model)
+   if EMBEDDING_CACHE_SIZE > 0:
+      with _cache_lock:
+         _cache[key] = vector
+         while len(_cache) > EMBEDDING_CACHE_SIZE:
+            _cache.popitem(last=False)
+   return vector
+
+def embedding_cache_size():
+   with _cache_lock:
+      return len(_cache)
@@ -0,0 +1,48 @@
+import os
+import time
+import threading
+
+# requests (~100 ms di import tra urllib3, ssl e charset) si carica alla prima sessione
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "50"))
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Sessione HTTP condivisa dal processo: riusa le connessioni keep-alive verso
+    gateway LLM e server REST/GraphQL invece di aprirne una nuova a ogni chiamata.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def wait_until_ready(url, timeout, interval=0.25, max_interval=2.0):
+    """
+    Interroga `url` finché non risponde con uno status < 500, con backoff esponenziale.
+    Restituisce True appena il servizio è pronto, False allo scadere di `timeout` secondi.
+    """
+    import requests
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if requests.get(url, timeout=min(interval * 4, 5)).status_code < 500:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max_interval)
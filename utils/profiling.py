@@ -0,0 +1,203 @@
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+import functools
+from collections import defaultdict
+
+# Profilazione opzionale di agente e indexer (o il flag --profile dei due entrypoint)
+PROFILE_ENABLED = os.getenv("AGENT_PROFILE", "0") == "1"
+PROFILE_DIR = os.getenv("AGENT_PROFILE_DIR", "profiles")
+PROFILE_CPROFILE = os.getenv("AGENT_PROFILE_CPROFILE", "0") == "1"
+PROFILE_TRACEMALLOC = os.getenv("AGENT_PROFILE_TRACEMALLOC", "0") == "1"
+PROFILE_TOP = 25
+
+_config = {"enabled": PROFILE_ENABLED, "cprofile": PROFILE_CPROFILE, "tracemalloc": PROFILE_TRACEMALLOC}
+_local = threading.local()
+_totals = defaultdict(lambda: {"calls": 0, "wall": 0.0, "cpu": 0.0})
+_totals_lock = threading.Lock()
+
+
+def enable_profiling(cprofile=None, tracemalloc_enabled=None):
+    """Attiva la profilazione a runtime (flag --profile); None lascia il valore dell'ambiente."""
+    _config["enabled"] = True
+    if cprofile is not None:
+        _config["cprofile"] = cprofile
+    if tracemalloc_enabled is not None:
+        _config["tracemalloc"] = tracemalloc_enabled
+    if _config["tracemalloc"] and not tracemalloc.is_tracing():
+        tracemalloc.start(10)
+    print(f"🔬 Profilazione attiva (cProfile: {_config['cprofile']}, tracemalloc: {_config['tracemalloc']}) -> {PROFILE_DIR}/")
+
+
+def profiling_enabled():
+    return _config["enabled"]
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _StageTimer:
+    """
+    Tempo reale e tempo CPU del thread per una fase. La differenza è il tempo passato
+    in attesa (rete, database, lock), il tempo CPU è quello speso in Python/C.
+    """
+    __slots__ = ("name", "_wall", "_cpu")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        query = getattr(_local, "query", None)
+        if query is not None:
+            _add(query.stages, self.name, wall, cpu)
+        with _totals_lock:
+            _add(_totals, self.name, wall, cpu)
+        return False
+
+
+def _add(table, name, wall, cpu):
+    entry = table[name]
+    entry["calls"] += 1
+    entry["wall"] += wall
+    entry["cpu"] += cpu
+
+
+def profile_stage(name):
+    """
+    Context manager che misura una fase. A profilazione spenta restituisce un
+    oggetto vuoto condiviso: nessuna misura e nessuna allocazione.
+    """
+    if not _config["enabled"]:
+        return _NULL_STAGE
+    return _StageTimer(name)
+
+
+def profiled(name):
+    """Decoratore equivalente a `with profile_stage(name)` sull'intera funzione."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _config["enabled"]:
+                return fn(*args, **kwargs)
+            with _StageTimer(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class _QueryProfile:
+    """Profilo di una singola query (o di un'esecuzione dell'indexer) nel thread corrente."""
+    def __init__(self, label):
+        self.label = label
+        self.stages = defaultdict(lambda: {"calls": 0, "wall": 0.0, "cpu": 0.0})
+        self.profiler = cProfile.Profile() if _config["cprofile"] else None
+        self.snapshot = None
+
+    def __enter__(self):
+        self._previous = getattr(_local, "query", None)
+        _local.query = self
+        if _config["tracemalloc"] and tracemalloc.is_tracing():
+            # Con più query concorrenti (server) le allocazioni si mescolano: è un indicatore, non una misura esatta
+            tracemalloc.reset_peak()
+            self.snapshot = tracemalloc.take_snapshot()
+        if self.profiler is not None:
+            self.profiler.enable()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        if self.profiler is not None:
+            self.profiler.disable()
+        _local.query = self._previous
+        _add(self.stages, "totale", wall, cpu)
+        with _totals_lock:
+            _add(_totals, "totale", wall, cpu)
+        self._write_artifacts()
+        print_profile_table(self.stages, f"Profilo di '{self.label}'")
+        return False
+
+    def _write_artifacts(self):
+        directory = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{_safe_name(self.label)}-{threading.get_ident()}")
+        os.makedirs(directory, exist_ok=True)
+
+        with open(os.path.join(directory, "stages.json"), "w") as f:
+            json.dump({"label": self.label, "stages": self.stages}, f, indent=2, ensure_ascii=False)
+
+        if self.profiler is not None:
+            self.profiler.dump_stats(os.path.join(directory, "profile.prof"))
+            text = io.StringIO()
+            pstats.Stats(self.profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            with open(os.path.join(directory, "profile_cumulative.txt"), "w") as f:
+                f.write(text.getvalue())
+
+        if self.snapshot is not None:
+            _, peak = tracemalloc.get_traced_memory()
+            diff = tracemalloc.take_snapshot().compare_to(self.snapshot, "lineno")
+            with open(os.path.join(directory, "allocations.txt"), "w") as f:
+                f.write(f"Picco di memoria tracciata: {peak / 1024:.1f} KB\n\n")
+                for stat in diff[:PROFILE_TOP]:
+                    f.write(f"{stat}\n")
+
+        print(f"🔬 Artefatti di profilazione salvati in {directory}")
+
+
+def _safe_name(label):
+    cleaned = "".join(c if c.isalnum() else "_" for c in label)[:40].strip("_")
+    return cleaned or "query"
+
+
+def profile_query(label):
+    """Raccoglie fasi, cProfile e tracemalloc per una query e ne salva gli artefatti."""
+    if not _config["enabled"]:
+        return _NULL_STAGE
+    return _QueryProfile(label)
+
+
+def print_profile_table(stages, title):
+    print(f"\n🔬 {title}")
+    print(f"   {'fase':<26}{'chiamate':>9}{'reale s':>10}{'CPU s':>10}{'attesa %':>10}")
+    for name, entry in sorted(stages.items(), key=lambda item: item[1]["wall"], reverse=True):
+        wall, cpu = entry["wall"], entry["cpu"]
+        waiting = max(wall - cpu, 0.0) / wall * 100 if wall else 0.0
+        print(f"   {name[:25]:<26}{entry['calls']:>9}{wall:>10.3f}{cpu:>10.3f}{waiting:>9.1f}%")
+
+
+def print_profile_summary():
+    """Tabella riassuntiva di tutte le fasi misurate dall'avvio del processo."""
+    if not _config["enabled"]:
+        return
+    with _totals_lock:
+        totals = {name: dict(entry) for name, entry in _totals.items()}
+    print_profile_table(totals, "Riepilogo profilazione (tutte le query)")
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, "summary.json"), "w") as f:
+        json.dump(totals, f, indent=2, ensure_ascii=False)
+
+
+if _config["enabled"] and _config["tracemalloc"]:
+    tracemalloc.start(10)
@@ -0,0 +1,156 @@
+import os
+import glob
+import tempfile
+import threading
+
+from google.protobuf import descriptor_pb2, descriptor_pool
+from google.protobuf.descriptor import FieldDescriptor
+
+try:
+    from google.protobuf.message_factory import GetMessageClass
+except ImportError:  # protobuf < 4.21
+    from google.protobuf.message_factory import MessageFactory
+    _factory = MessageFactory()
+    GetMessageClass = _factory.GetPrototype
+
+GRPC_CONTRACTS_DIR = os.getenv("GRPC_CONTRACTS_DIR", "contracts")
+
+# Tipi scalari protobuf -> nomi usati nei contratti del catalogo (come il parser Node)
+_SCALAR_TYPES = {
+    FieldDescriptor.TYPE_INT32: "integer",
+    FieldDescriptor.TYPE_SINT32: "integer",
+    FieldDescriptor.TYPE_SFIXED32: "integer",
+    FieldDescriptor.TYPE_UINT32: "integer",
+    FieldDescriptor.TYPE_FIXED32: "integer",
+    FieldDescriptor.TYPE_INT64: "integer",
+    FieldDescriptor.TYPE_SINT64: "integer",
+    FieldDescriptor.TYPE_SFIXED64: "integer",
+    FieldDescriptor.TYPE_UINT64: "integer",
+    FieldDescriptor.TYPE_FIXED64: "integer",
+    FieldDescriptor.TYPE_DOUBLE: "number",
+    FieldDescriptor.TYPE_FLOAT: "number",
+    FieldDescriptor.TYPE_BOOL: "boolean",
+    FieldDescriptor.TYPE_STRING: "string",
+    FieldDescriptor.TYPE_BYTES: "bytes",
+}
+
+
+def compile_proto_files(proto_paths, include_dirs=(), include_source_info=False):
+    """
+    Compila i .proto in un FileDescriptorSet usando protoc di grpc_tools, in memoria:
+    nessun file _pb2 generato, nessun import di moduli.
+    Con include_source_info il set contiene anche i commenti del sorgente.
+    """
+    from grpc_tools import protoc
+
+    well_known = os.path.join(os.path.dirname(protoc.__file__), "_proto")
+    includes = {os.path.dirname(os.path.abspath(p)) for p in proto_paths} | set(include_dirs)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "descriptors.pb")
+        args = ["protoc", f"-I{well_known}", *[f"-I{d}" for d in sorted(includes)],
+                "--include_imports", f"--descriptor_set_out={output}", *[os.path.abspath(p) for p in proto_paths]]
+        if include_source_info:
+            args.insert(-len(proto_paths), "--include_source_info")
+        if protoc.main(args) != 0:
+            raise ValueError(f"protoc non è riuscito a compilare {proto_paths}")
+        descriptor_set = descriptor_pb2.FileDescriptorSet()
+        with open(output, "rb") as f:
+            descriptor_set.ParseFromString(f.read())
+    return descriptor_set
+
+
+def describe_message(message_descriptor, _seen=None):
+    """
+    Contratto JSON di un messaggio: {campo: tipo}, con i messaggi annidati come dizionari,
+    i campi repeated come [tipo] e gli enum come "enum(A|B)".
+    """
+    seen = _seen or set()
+    if message_descriptor.full_name in seen:
+        return message_descriptor.name  # Messaggio ricorsivo
+    seen = seen | {message_descriptor.full_name}
+
+    contract = {}
+    for field in message_descriptor.fields:
+        if field.type == FieldDescriptor.TYPE_MESSAGE:
+            field_type = describe_message(field.message_type, seen)
+        elif field.type == FieldDescriptor.TYPE_ENUM:
+            field_type = "enum(" + "|".join(v.name for v in field.enum_type.values) + ")"
+        else:
+            field_type = _SCALAR_TYPES.get(field.type, "string")
+        if hasattr(field, "is_repeated"):  # protobuf >= 6: label è deprecato
+            is_repeated = field.is_repeated
+        else:
+            is_repeated = field.label == FieldDescriptor.LABEL_REPEATED
+        contract[field.name] = [field_type] if is_repeated else field_type
+    return contract
+
+
+class ProtoRegistry:
+    """
+    Descrittori di servizi e messaggi gRPC caricati a runtime, da contracts/*.proto
+    oppure dalla reflection di un server. Le classi dei messaggi sono create una sola volta.
+    """
+    def __init__(self, pool=None):
+        self.pool = pool or descriptor_pool.DescriptorPool()
+        self._services = {}
+        self._message_classes = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_directory(cls, contracts_dir=GRPC_CONTRACTS_DIR):
+        registry = cls()
+        proto_paths = sorted(glob.glob(os.path.join(contracts_dir, "*.proto")))
+        if proto_paths:
+            registry.add_descriptor_set(compile_proto_files(proto_paths, include_dirs=[contracts_dir]))
+        print(f"📜 Descrittori gRPC caricati da {len(proto_paths)} file .proto: {sorted(registry._services)}")
+        return registry
+
+    @classmethod
+    def from_reflection(cls, channel):
+        """Descrittori ottenuti dalla server reflection (richiede grpcio-reflection)."""
+        from grpc_reflection.v1alpha.proto_reflection_descriptor_database import ProtoReflectionDescriptorDatabase
+
+        database = ProtoReflectionDescriptorDatabase(channel)
+        registry = cls(descriptor_pool.DescriptorPool(database))
+        for service_name in database.get_services():
+            if service_name.startswith("grpc.reflection."):
+                continue
+            registry._index_service(registry.pool.FindServiceByName(service_name))
+        print(f"📜 Descrittori gRPC caricati via reflection: {sorted(registry._services)}")
+        return registry
+
+    def add_descriptor_set(self, descriptor_set):
+        for file_proto in descriptor_set.file:
+            try:
+                self.pool.FindFileByName(file_proto.name)
+                continue  # Già caricato, ad esempio come import di un altro .proto
+            except KeyError:
+                self.pool.Add(file_proto)
+        for file_proto in descriptor_set.file:
+            file_descriptor = self.pool.FindFileByName(file_proto.name)
+            for service in file_descriptor.services_by_name.values():
+                self._index_service(service)
+
+    def _index_service(self, service_descriptor):
+        # Indicizziamo sia il nome semplice (come nei metadati del catalogo) sia quello completo
+        self._services[service_descriptor.name] = service_descriptor
+        self._services[service_descriptor.full_name] = service_descriptor
+
+    def services(self):
+        """I servizi caricati, senza duplicati."""
+        return {s.full_name: s for s in self._services.values()}.values()
+
+    def find_method(self, service_name, rpc_name):
+        service = self._services.get(service_name)
+        if service is None:
+            return None
+        return service.methods_by_name.get(rpc_name)
+
+    def message_class(self, message_descriptor):
+        cls = self._message_classes.get(message_descriptor.full_name)
+        if cls is None:
+            with self._lock:
+                cls = self._message_classes.get(message_descriptor.full_name)
+                if cls is None:
+                    cls = self._message_classes[message_descriptor.full_name] = GetMessageClass(message_descriptor)
+        return cls